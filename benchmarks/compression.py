@@ -0,0 +1,55 @@
+"""
+Compares single-threaded gzip with parallel block compression: throughput and ratio at every level.
+
+Usage: python -m benchmarks.compression [--rows 50000] [--block-size 131072] [--threads 4]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.data import synthetic_records
+from src.chunk.infra.compression import BlockGzipCompressor
+from src.chunk.infra.payload import ChunkPayload
+
+logger = logging.getLogger(__name__)
+
+
+async def measure(payload: ChunkPayload, document: str, repeat: int) -> tuple[float, int]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        size = len(await payload.compress(document))
+    return (time.perf_counter() - start) / repeat, size
+
+
+async def main(rows: int, block_size: int, threads: int, repeat: int) -> None:
+    records = synthetic_records(rows)
+    document = await ChunkPayload().build_payload(records)
+    raw_size = len(document.encode("utf-8"))
+    logger.info(f"payload: {rows} rows, {raw_size} bytes")
+    for level in range(1, 10):
+        engines = {
+            "single": ChunkPayload(level=level),
+            "blocks": ChunkPayload(level=level, compressor=BlockGzipCompressor(level, block_size, threads)),
+        }
+        for name, payload in engines.items():
+            try:
+                elapsed, size = await measure(payload, document, repeat)
+            finally:
+                payload.close()
+            logger.info(
+                f"level {level} {name:>6}: {raw_size / elapsed / 2**20:8.1f} MiB/s "
+                f"ratio {raw_size / size:6.2f} {size:12d} bytes"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--block-size", type=int, default=128 * 1024)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(main(args.rows, args.block_size, args.threads, args.repeat))
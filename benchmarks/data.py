@@ -0,0 +1,54 @@
+"""Synthetic facility rows and the table holding them, shared by the benchmarks and the tests."""
+
+from faker import Faker
+
+from src.chunk.infra.payload import ChunkPayload
+
+
+def synthetic_rows(count: int) -> list[tuple]:
+    fake = Faker()
+    Faker.seed(0)
+    return [
+        (
+            index,
+            fake.company(),
+            fake.phone_number(),
+            fake.url(),
+            float(fake.latitude()),
+            float(fake.longitude()),
+            fake.country_code(),
+            fake.city(),
+            fake.state_abbr(),
+            fake.postcode(),
+            fake.street_address(),
+        )
+        for index in range(1, count + 1)
+    ]
+
+
+def synthetic_records(count: int) -> list[dict]:
+    """Facility rows as mappings keyed like the rows a fetcher returns."""
+    return [dict(zip(ChunkPayload.columns, row, strict=True)) for row in synthetic_rows(count)]
+
+
+def facility_table(name: str = "facility", *, temporary: bool = True) -> str:
+    """DDL of a facility table the synthetic rows fit, a temporary one goes away with its connection."""
+    return f"""
+CREATE {"TEMPORARY " if temporary else ""}TABLE {name} (
+    id bigint PRIMARY KEY,
+    name text,
+    phone text,
+    url text,
+    latitude double precision,
+    longitude double precision,
+    country text,
+    locality text,
+    region text,
+    postal_code text,
+    street_address text,
+    updated_at timestamptz DEFAULT now()
+)
+"""
+
+
+FACILITY_TABLE = facility_table()
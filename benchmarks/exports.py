@@ -0,0 +1,80 @@
+"""
+Offline exports against the in-process stand-ins, shared by the benchmarks and the tests.
+
+Every shard exports its slice of the given rows into one directory standing in for the bucket,
+the finalize step merges the partial manifests of all shards into the metadata file.
+"""
+
+import gzip
+import json
+from pathlib import Path
+
+from benchmarks.standins import DirectoryStore, MemoryFetcher, MemoryPlanner, StageClock
+from src.chunk.application.services.feed import FeedService
+from src.chunk.infra.manifest import ShardManifests
+from src.chunk.infra.processor import ChunkProcessor
+from src.chunk.main.config import get_limiter, get_payload
+from src.chunk.main.settings import Settings
+
+TABLE = "facility"
+
+
+def shard_service(root: Path, shard: int, shards: int, run: str, overrides: dict[str, str] | None = None):
+    """Settings, stand-in bucket and manifests of one shard."""
+    settings = Settings(
+        _env_file=None,
+        db_user="",
+        db_password="",
+        db_name="",
+        db_table_name=TABLE,
+        shard_index=shard,
+        shard_count=shards,
+        shard_run=run,
+        **(overrides or {}),
+    )
+    store = DirectoryStore(root)
+    manifests = ShardManifests(
+        store=store, table=TABLE, shard=settings.shard, run=run, file_name=settings.shard_manifest_file_name
+    )
+    return settings, store, manifests
+
+
+async def run_shard(  # noqa: PLR0913
+    records: list[dict], root: Path, shard: int, shards: int, run: str, *, overrides: dict[str, str] | None = None
+) -> None:
+    """Export the rows of one shard, the stand-in DB only holds the ids of its slice like the shard filter does."""
+    settings, store, manifests = shard_service(root, shard, shards, run, overrides)
+    records = [record for record in records if record["id"] % shards == shard]
+    payload = get_payload(settings)
+    fetcher = MemoryFetcher(records, StageClock())
+    processor = ChunkProcessor(settings=settings, pool=None, payload=payload, storage=fetcher, saver=store)
+    service = FeedService(
+        settings=settings,
+        pool=None,
+        processor=processor,
+        metadata=store,
+        offset_manager=MemoryPlanner(fetcher.ids),
+        limiter=get_limiter(settings),
+        manifests=manifests,
+    )
+    try:
+        await service.feed()
+    finally:
+        payload.close()
+
+
+async def finalize(root: Path, shards: int, run: str) -> bool:
+    """Merge the manifests of all shards into the metadata file."""
+    settings, store, manifests = shard_service(root, 0, shards, run)
+    service = FeedService(settings=settings, pool=None, processor=None, metadata=store, manifests=manifests)
+    return await service.finalize()
+
+
+def exported_ids(root: Path) -> list[int]:
+    """Entity ids of every file listed by the newest metadata file, in listing order."""
+    metadata = max(root.glob("metadata_*.json"), key=lambda path: path.stat().st_mtime)
+    ids = []
+    for file_name in json.loads(metadata.read_text())["data_file"]:
+        document = json.loads(gzip.decompress((root / file_name).read_bytes()))
+        ids.extend(entity["entity_id"] for entity in document["data"])
+    return ids
@@ -0,0 +1,179 @@
+"""
+Runs the whole feed offline: FeedService -> processor -> payload against in-process DB and S3 stand-ins.
+
+Reports rows/s, cumulative time per stage, bytes out and peak memory, and stores the result under
+benchmarks/results keyed by the current commit, so two commits can be compared.
+
+Usage:
+    python -m benchmarks.feed [--rows 100000] [--fetch-latency 0.005] [--set PIPELINE=true ...]
+    python -m benchmarks.feed --compare benchmarks/results/<a>.json benchmarks/results/<b>.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import resource
+import subprocess
+import time
+from pathlib import Path
+
+from benchmarks.data import synthetic_records
+from benchmarks.standins import MemoryFetcher, MemoryPlanner, MemorySaver, StageClock, TimedPayload
+from src.chunk.application.services.feed import FeedService
+from src.chunk.infra.pipeline import StagedProcessor
+from src.chunk.infra.processor import ChunkProcessor
+from src.chunk.infra.writer import RollingFileWriter
+from src.chunk.main.config import get_budget, get_limiter, get_payload, get_retry_policy, get_spool
+from src.chunk.main.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = Path(__file__).parent / "results"
+COMPARED_METRICS = ("rows_per_second", "seconds", "bytes_out", "peak_rss_delta_mib")
+
+
+def git(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], capture_output=True, text=True, check=False)  # noqa: S603, S607
+
+
+def current_commit() -> str:
+    """Short hash of HEAD, suffixed with `-dirty` when the tree has uncommitted changes."""
+    commit = git("rev-parse", "--short", "HEAD").stdout.strip() or "unknown"
+    return f"{commit}-dirty" if git("diff", "--quiet", "HEAD").returncode else commit
+
+
+def peak_rss_mib() -> float:
+    """Peak resident set size of the process so far, ru_maxrss is in KiB on Linux."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def parse_overrides(pairs: list[str]) -> dict[str, str]:
+    """Turn `KEY=VALUE` pairs into Settings field overrides."""
+    overrides = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        overrides[key.strip().lower()] = value.strip()
+    return overrides
+
+
+async def run_feed(  # noqa: PLR0913
+    rows: int,
+    *,
+    fetch_latency: float = 0.0,
+    upload_latency: float = 0.0,
+    bandwidth: float = 0.0,
+    overrides: dict[str, str] | None = None,
+) -> dict:
+    """Export `rows` synthetic facility rows through the stand-ins and return the measurements."""
+    records = synthetic_records(rows)
+    settings = Settings(
+        _env_file=None, db_user="", db_password="", db_name="", db_table_name="facility", **(overrides or {})
+    )
+    clock = StageClock()
+    payload = TimedPayload(get_payload(settings), clock)
+    fetcher = MemoryFetcher(records, clock, latency=fetch_latency)
+    saver = MemorySaver(clock, latency=upload_latency, bandwidth=bandwidth)
+    # With a spool the chunks are written to disk and the stand-in S3 is only used by the sync phase
+    spool = get_spool(settings, saver, get_retry_policy(settings), "facility")
+    sink = saver if spool is None else spool.spool
+    writer = None
+    if settings.output_file_size:
+        writer = RollingFileWriter(
+            saver=sink, target_size=settings.output_file_size, part_size=settings.multipart_part_size
+        )
+    processor_class = StagedProcessor if settings.pipeline else ChunkProcessor
+    processor = processor_class(
+        settings=settings, pool=None, payload=payload, storage=fetcher, saver=sink, writer=writer
+    )
+    service = FeedService(
+        settings=settings,
+        pool=None,
+        processor=processor,
+        metadata=MemorySaver(clock, stage="metadata"),
+        offset_manager=MemoryPlanner(fetcher.ids, latency=fetch_latency),
+        limiter=get_limiter(settings),
+        budget=get_budget(settings),
+        spool=spool,
+    )
+    baseline_rss = peak_rss_mib()
+    start = time.perf_counter()
+    try:
+        await service.feed()
+    finally:
+        payload.close()
+    seconds = time.perf_counter() - start
+    return {
+        "commit": current_commit(),
+        "timestamp": int(time.time()),
+        "config": {
+            "rows": rows,
+            "fetch_latency": fetch_latency,
+            "upload_latency": upload_latency,
+            "bandwidth": bandwidth,
+            "overrides": overrides or {},
+        },
+        "seconds": seconds,
+        "rows_per_second": rows / seconds,
+        "stages": dict(clock.seconds),
+        "files": len(saver.objects),
+        "bytes_out": saver.bytes_out,
+        "peak_rss_mib": peak_rss_mib(),
+        "peak_rss_delta_mib": peak_rss_mib() - baseline_rss,
+    }
+
+
+def report(result: dict) -> None:
+    logger.info(
+        f"{result['commit']}: {result['rows_per_second']:12.0f} rows/s {result['seconds']:8.3f} s "
+        f"{result['files']:6d} files {result['bytes_out']:12d} bytes peak {result['peak_rss_mib']:8.1f} MiB "
+        f"(+{result['peak_rss_delta_mib']:.1f})"
+    )
+    for stage, seconds in result["stages"].items():
+        logger.info(f"{stage:>10}: {seconds:8.3f} s cumulative")
+
+
+def compare(before_path: Path, after_path: Path) -> None:
+    before, after = (json.loads(path.read_text()) for path in (before_path, after_path))
+    logger.info(f"{'metric':>20} {before['commit']:>14} {after['commit']:>14} {'change':>8}")
+    metrics = [(name, before[name], after[name]) for name in COMPARED_METRICS]
+    metrics += [
+        (f"stage {name}", seconds, after["stages"].get(name, 0.0)) for name, seconds in before["stages"].items()
+    ]
+    for name, old, new in metrics:
+        change = f"{(new - old) / old * 100:+7.1f}%" if old else "-"
+        logger.info(f"{name:>20} {old:14.3f} {new:14.3f} {change:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--fetch-latency", type=float, default=0.0, help="seconds per DB round trip")
+    parser.add_argument("--upload-latency", type=float, default=0.0, help="seconds per S3 request")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="upload bytes/s, 0 is unlimited")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="override a setting")
+    parser.add_argument("--output", type=Path, help="result file, defaults to benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.compare:
+        compare(*args.compare)
+        return
+    result = asyncio.run(
+        run_feed(
+            args.rows,
+            fetch_latency=args.fetch_latency,
+            upload_latency=args.upload_latency,
+            bandwidth=args.bandwidth,
+            overrides=parse_overrides(args.set),
+        )
+    )
+    report(result)
+    output = args.output or RESULTS_DIR / f"{result['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    logger.info(f"Result saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
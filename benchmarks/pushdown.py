@@ -0,0 +1,58 @@
+"""
+Compares the Python payload builder with the Postgres push-down one on the same data.
+
+Usage: BENCH_DSN=postgresql://... python -m benchmarks.pushdown [--rows 100000] [--chunk-size 1000]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+import asyncpg
+
+from benchmarks.data import FACILITY_TABLE, synthetic_rows
+from src.chunk.domain.facility.storage import IdRange
+from src.chunk.infra.payload import ChunkPayload, PushdownPayload
+from src.chunk.infra.storage import PostgresJsonOperator, PostgresOperator
+
+logger = logging.getLogger(__name__)
+
+
+async def measure(fetcher: PostgresOperator, payload: ChunkPayload, ranges: list[IdRange]) -> tuple[float, int]:
+    start = time.perf_counter()
+    size = 0
+    for id_range in ranges:
+        rows = await fetcher.fetch_data(id_range, "facility")
+        size += len(await payload.compress(await payload.build_payload(rows)))
+    return time.perf_counter() - start, size
+
+
+async def main(rows: int, chunk_size: int) -> None:
+    pool = await asyncpg.create_pool(dsn=os.environ["BENCH_DSN"], min_size=1, max_size=1)
+    try:
+        async with pool.acquire() as conn:
+            await conn.execute(FACILITY_TABLE)
+            await conn.executemany(
+                "INSERT INTO facility VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)", synthetic_rows(rows)
+            )
+        ranges = [IdRange(lo, lo + chunk_size) for lo in range(1, rows + 1, chunk_size)]
+        modes = {
+            "python": (PostgresOperator(pool, columns=ChunkPayload.columns), ChunkPayload()),
+            "pushdown": (PostgresJsonOperator(pool), PushdownPayload()),
+        }
+        for name, (fetcher, payload) in modes.items():
+            elapsed, size = await measure(fetcher, payload, ranges)
+            logger.info(f"{name:>8}: {rows / elapsed:12.0f} rows/s {elapsed:8.3f} s {size:12d} bytes")
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(main(args.rows, args.chunk_size))
@@ -0,0 +1,71 @@
+"""
+Runs one offline export split into shards, every shard in a process of its own, then merges their manifests.
+
+Every shard exports its slice of the same synthetic rows, standing in for the DB, into one directory
+standing in for the bucket. The finalize step merges the partial manifests into the metadata file,
+and the published files are checked to hold every row exactly once.
+
+Usage:
+    python -m benchmarks.shards [--rows 100000] [--shards 4] [--root DIR] [--set CHUNK_SIZE=1000 ...]
+"""
+
+import argparse
+import asyncio
+import logging
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.data import synthetic_records
+from benchmarks.exports import exported_ids, finalize, run_shard
+from benchmarks.feed import parse_overrides
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--shard", type=int, help="run a single shard in this process")
+    parser.add_argument("--root", type=Path, help="stand-in bucket directory, a temporary one by default")
+    parser.add_argument("--run", default=f"bench{int(time.time())}", help="label of the export")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="override a setting")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.shard is not None:
+        asyncio.run(
+            run_shard(
+                synthetic_records(args.rows),
+                args.root,
+                args.shard,
+                args.shards,
+                args.run,
+                overrides=parse_overrides(args.set),
+            )
+        )
+        return
+    root = args.root or Path(tempfile.mkdtemp(prefix="chunked-flow-shards-"))
+    command = [sys.executable, "-m", "benchmarks.shards", "--rows", str(args.rows), "--shards", str(args.shards)]
+    command += ["--root", str(root), "--run", args.run, *(f"--set={pair}" for pair in args.set)]
+    start = time.perf_counter()
+    workers = [subprocess.Popen([*command, "--shard", str(shard)]) for shard in range(args.shards)]  # noqa: S603
+    failed = [shard for shard, worker in enumerate(workers) if worker.wait()]
+    seconds = time.perf_counter() - start
+    if failed or not asyncio.run(finalize(root, args.shards, args.run)):
+        logger.error(f"Shards {failed} failed, nothing was published")
+        sys.exit(1)
+    ids = exported_ids(root)
+    complete = sorted(ids) == list(range(1, args.rows + 1))
+    logger.info(
+        f"{args.shards} shards: {args.rows / seconds:12.0f} rows/s {seconds:8.3f} s, "
+        f"{len(ids)} rows published to {root}, every row exactly once: {complete}"
+    )
+    if not complete:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
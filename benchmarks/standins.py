@@ -0,0 +1,179 @@
+"""
+In-process stand-ins for Postgres and S3, so the feed can be benchmarked without credentials.
+
+Every call sleeps for a configurable latency to model the network round trip, and every stage
+records its cumulative time in a shared `StageClock`. `DirectoryStore` keeps the objects in a
+directory instead, so several processes can write to the same stand-in bucket.
+"""
+
+import asyncio
+import bisect
+import os
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator, Iterable
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+
+from src.chunk.domain.facility.payload import Payload
+from src.chunk.domain.facility.storage import Fetcher, IdRange, Store, Uploader
+
+
+class StageClock:
+    """Cumulative seconds spent in every stage, overlapping chunks add up beyond the wall time."""
+
+    def __init__(self):
+        self.seconds: dict[str, float] = defaultdict(float)
+
+    @asynccontextmanager
+    async def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+
+
+class MemoryFetcher(Fetcher):
+    """Serves facility rows sorted by id, like `PostgresOperator` does for a keyset range."""
+
+    def __init__(self, rows: list[dict], clock: StageClock, latency: float = 0.0):
+        self.rows = rows
+        self.ids = [row["id"] for row in rows]
+        self.clock = clock
+        self.latency = latency
+
+    def select(self, id_range: IdRange) -> list[dict]:
+        return self.rows[bisect.bisect_left(self.ids, id_range.lo) : bisect.bisect_left(self.ids, id_range.hi)]
+
+    async def fetch_data(self, id_range: IdRange, table: str) -> list[dict]:
+        async with self.clock.stage("fetch"):
+            await asyncio.sleep(self.latency)
+            return self.select(id_range)
+
+    async def fetch_ids(self, ids: list[int], table: str) -> list[dict]:
+        async with self.clock.stage("fetch"):
+            await asyncio.sleep(self.latency)
+            wanted = set(ids)
+            return [row for row in self.rows if row["id"] in wanted]
+
+    async def stream_data(self, id_range: IdRange, table: str, batch_size: int) -> AsyncIterator[list[dict]]:
+        rows = self.select(id_range)
+        for start in range(0, len(rows), batch_size):
+            async with self.clock.stage("fetch"):
+                await asyncio.sleep(self.latency)
+            yield rows[start : start + batch_size]
+
+    async def hash_data(self, id_range: IdRange, table: str) -> str | None:
+        return None
+
+
+class MemoryPlanner:
+    """Plans ranges of `chunk_size` rows over the in-memory ids, like `OffsetManager` does in Postgres."""
+
+    def __init__(self, ids: list[int], latency: float = 0.0):
+        self.ids = ids
+        self.latency = latency
+
+    async def fetch_offset(self, table: str) -> int:
+        await asyncio.sleep(self.latency)
+        return self.ids[0] - 1 if self.ids else 0
+
+    async def plan_ranges(
+        self, table: str, offset: int, chunk_size: int, since: datetime | None = None
+    ) -> list[IdRange]:
+        await asyncio.sleep(self.latency)
+        ids = self.ids[bisect.bisect_right(self.ids, offset) :]
+        los = ids[::chunk_size]
+        return [IdRange(lo, hi) for lo, hi in zip(los, [*los[1:], ids[-1] + 1] if ids else [], strict=True)]
+
+
+class MemorySaver(Uploader):
+    """Keeps object sizes only, a request costs the latency plus the transfer time at `bandwidth` bytes/s."""
+
+    def __init__(self, clock: StageClock, latency: float = 0.0, bandwidth: float = 0.0, stage: str = "upload"):
+        self.clock = clock
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.stage = stage
+        self.objects: dict[str, int] = {}
+        self.uploads: dict[str, int] = {}
+
+    async def request(self, size: int = 0) -> None:
+        async with self.clock.stage(self.stage):
+            await asyncio.sleep(self.latency + (size / self.bandwidth if self.bandwidth else 0.0))
+
+    async def exists(self, file_name: str) -> bool:
+        await self.request()
+        return file_name in self.objects
+
+    async def save_data(self, data: bytes | str, file_name: str) -> bool:
+        await self.request(len(data))
+        self.objects[file_name] = len(data)
+        return True
+
+    async def create_upload(self, file_name: str) -> str:
+        await self.request()
+        self.uploads[file_name] = 0
+        return file_name
+
+    async def upload_part(self, file_name: str, upload_id: str, part_number: int, data: bytes) -> str:
+        await self.request(len(data))
+        self.uploads[upload_id] += len(data)
+        return f"{upload_id}-{part_number}"
+
+    async def complete_upload(self, file_name: str, upload_id: str, etags: list[str]) -> bool:
+        await self.request()
+        self.objects[file_name] = self.uploads.pop(upload_id)
+        return True
+
+    async def abort_upload(self, file_name: str, upload_id: str) -> None:
+        await self.request()
+        self.uploads.pop(upload_id, None)
+
+    @property
+    def bytes_out(self) -> int:
+        return sum(self.objects.values())
+
+
+class DirectoryStore(Store):
+    """Keeps every object as a file under `root`, written to a temporary file first so readers never see half of it."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def write(self, data: bytes | str, file_name: str) -> None:
+        path = self.root / file_name
+        temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        temporary.write_bytes(data.encode("utf-8") if isinstance(data, str) else data)
+        temporary.replace(path)
+
+    async def save_data(self, data: bytes | str, file_name: str) -> bool:
+        await asyncio.to_thread(self.write, data, file_name)
+        return True
+
+    async def load_data(self, file_name: str) -> str | None:
+        path = self.root / file_name
+        return await asyncio.to_thread(path.read_text) if path.exists() else None
+
+
+class TimedPayload(Payload):
+    """Times the build and compress stages of the wrapped payload engine."""
+
+    def __init__(self, payload: Payload, clock: StageClock):
+        self.payload = payload
+        self.clock = clock
+        self.columns = payload.columns
+
+    async def build_payload(self, data: list) -> str | Iterable[bytes]:
+        async with self.clock.stage("build"):
+            return await self.payload.build_payload(data)
+
+    async def compress(self, data: str | Iterable[bytes]) -> bytes:
+        async with self.clock.stage("compress"):
+            return await self.payload.compress(data)
+
+    def close(self) -> None:
+        self.payload.close()
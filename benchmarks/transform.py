@@ -0,0 +1,75 @@
+"""
+Compares building payloads with the encoder compiled from the entity spec against mapping every
+record to a dict by column name, the way the payload used to.
+
+Usage: python -m benchmarks.transform [--rows 50000] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+from benchmarks.data import synthetic_records, synthetic_rows
+from src.chunk.infra.payload import ChunkPayload
+
+logger = logging.getLogger(__name__)
+
+
+async def by_name(records: list[dict]) -> str:
+    """Maps every record by column name into intermediate dicts."""
+    data = [
+        {
+            "entity_id": rec["id"],
+            "name": rec["name"],
+            "telephone": rec["phone"],
+            "url": rec["url"],
+            "location": {
+                "latitude": f"{rec['latitude']:.6f}",
+                "longitude": f"{rec['longitude']:.6f}",
+                "address": {
+                    "country": rec["country"],
+                    "locality": rec["locality"],
+                    "region": rec["region"],
+                    "postal_code": rec["postal_code"],
+                    "street_address": rec["street_address"],
+                },
+            },
+        }
+        for rec in records
+    ]
+    return json.dumps({"data": data}, ensure_ascii=False)
+
+
+async def measure(build: Callable[[], Awaitable[str]], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await build()
+    return (time.perf_counter() - start) / repeat
+
+
+async def main(rows: int, repeat: int) -> None:
+    records = synthetic_records(rows)
+    tuples = synthetic_rows(rows)
+    payload = ChunkPayload()
+    builds = {
+        "by name": lambda: by_name(records),
+        "compiled, dicts": lambda: payload.build_payload(records),
+        "compiled, tuples": lambda: payload.build_payload(tuples),
+    }
+    if len({await build() for build in builds.values()}) != 1:
+        raise AssertionError("Encoders disagree on the payload")
+    for name, build in builds.items():
+        elapsed = await measure(build, repeat)
+        logger.info(f"{name:>16}: {rows / elapsed:10.0f} rows/s {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(main(args.rows, args.repeat))
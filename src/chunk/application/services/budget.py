@@ -0,0 +1,55 @@
+import asyncio
+import logging
+
+from src.chunk.infra.metrics import MEMORY_RESERVED, MEMORY_WAIT_SECONDS, RAW_BYTES, ROWS
+from src.chunk.main.constants import INITIAL_ROW_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBudget:
+    """
+    Bounds the memory held by chunks in flight.
+
+    A range reserves its estimated footprint before it is fetched and frees it once it is uploaded,
+    a range whose reservation does not fit waits until earlier ranges free enough. The estimate is
+    the rows of a chunk times the payload bytes per row observed so far, times `overhead` for the
+    fetched records, the encoded payload and the compressed buffer alive next to each other.
+    """
+
+    budget: int
+    overhead: float
+    reserved: int
+
+    def __init__(self, budget: int, overhead: float = 4.0):
+        self.budget = budget
+        self.overhead = overhead
+        self.reserved = 0
+        self.condition = asyncio.Condition()
+
+    @staticmethod
+    def row_bytes() -> float:
+        """Average uncompressed payload bytes per row encoded so far in this process."""
+        rows = ROWS.value()
+        return RAW_BYTES.value() / rows if rows else INITIAL_ROW_BYTES
+
+    def estimate(self, rows: int) -> int:
+        """Estimated peak memory of a chunk of `rows` rows, capped at the budget so a huge chunk still runs alone."""
+        return min(self.budget, int(rows * self.row_bytes() * self.overhead))
+
+    async def reserve(self, size: int) -> None:
+        """Waits until `size` bytes fit into the budget and reserves them."""
+        async with self.condition:
+            if self.reserved + size > self.budget:
+                logger.debug(f"MemoryBudget.reserve: Waiting for {size} bytes, {self.reserved} reserved")
+            with MEMORY_WAIT_SECONDS.time():
+                await self.condition.wait_for(lambda: self.reserved + size <= self.budget)
+            self.reserved += size
+            MEMORY_RESERVED.set(self.reserved)
+
+    async def release(self, size: int) -> None:
+        """Frees a reservation and wakes the ranges waiting for memory."""
+        async with self.condition:
+            self.reserved -= size
+            MEMORY_RESERVED.set(self.reserved)
+            self.condition.notify_all()
@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+from src.chunk.application.services.feed import FeedService
+from src.chunk.infra.listener import ChangeListener
+from src.chunk.infra.retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeDaemon:
+    """
+    Exports the changed rows of a table continuously instead of sweeping the whole table.
+
+    Every batch of ids collected by the listener becomes one file and one metadata file of a delta feed.
+    Batches are exported one after another, so a newer version of a row is never published before an older one.
+    """
+
+    service: FeedService
+    listener: ChangeListener
+    window: float
+    max_batch: int
+    backoff: RetryPolicy
+
+    def __init__(  # noqa: PLR0913
+        self,
+        service: FeedService,
+        listener: ChangeListener,
+        window: float,
+        max_batch: int,
+        backoff: RetryPolicy | None = None,
+    ):
+        self.service = service
+        self.listener = listener
+        self.window = window
+        self.max_batch = max_batch
+        self.backoff = backoff or RetryPolicy()
+        # Consecutive failed connections, the reconnect delay grows with them
+        self.failures = 0
+
+    async def serve(self, stop: asyncio.Event) -> None:
+        """
+        Exports batches of changes until `stop` is set. A lost listening connection is opened again after
+        a growing delay, so one feed's connection never stops the daemons of the other feeds.
+        """
+        while not stop.is_set():
+            try:
+                await self.listen(stop)
+            except Exception as e:
+                delay = self.backoff.delay(self.failures)
+                self.failures += 1
+                logger.error(
+                    f"ChangeDaemon.serve: Listening to {self.listener.table} failed: {e}, reconnecting in {delay:.1f}s"
+                )
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(stop.wait(), delay)
+        # Changes taken off the channel are only held in memory, they are exported before the daemon stops
+        ids = self.listener.drain()
+        for start in range(0, len(ids), self.max_batch):
+            await self.export(ids[start : start + self.max_batch])
+
+    async def listen(self, stop: asyncio.Event) -> None:
+        """Exports batches of changes until `stop` is set, the batch in progress is finished first."""
+        async with self.listener:
+            self.failures = 0
+            while not stop.is_set():
+                batch = asyncio.create_task(self.listener.batch(self.window, self.max_batch))
+                stopped = asyncio.create_task(stop.wait())
+                await asyncio.wait({batch, stopped}, return_when=asyncio.FIRST_COMPLETED)
+                stopped.cancel()
+                if not batch.done():
+                    # The ids the batch collected so far are queued again
+                    batch.cancel()
+                    with contextlib.suppress(asyncio.CancelledError):
+                        await batch
+                    break
+                await self.export(batch.result())
+
+    async def export(self, ids: list[int]) -> bool:
+        """Exports a batch of changed ids, the ids of a failed batch are queued again for the next one."""
+        start = time.perf_counter()
+        if not await self.service.feed_ids(ids):
+            logger.error(f"ChangeDaemon.export: Failed to export {len(ids)} changed rows of {self.listener.table}")
+            self.listener.requeue(ids)
+            return False
+        logger.info(
+            f"ChangeDaemon.export: {len(ids)} changed rows of {self.listener.table} exported "
+            f"in {time.perf_counter() - start:.3f}s"
+        )
+        return True
@@ -2,12 +2,20 @@ import asyncio
 import json
 import logging
 import time
+from collections.abc import Iterator
+from datetime import datetime
 
 import asyncpg
 
+from src.chunk.application.services.budget import MemoryBudget
+from src.chunk.application.services.limiter import ConcurrencyLimiter
 from src.chunk.domain.facility.processor import Processor
-from src.chunk.domain.facility.storage import Saver
-from src.chunk.infra.storage import OffsetManager
+from src.chunk.domain.facility.storage import IdRange, Saver
+from src.chunk.infra.journal import JournalRun, ProgressJournal
+from src.chunk.infra.manifest import ShardManifests
+from src.chunk.infra.metrics import RANGES, SEMAPHORE_WAIT_SECONDS
+from src.chunk.infra.spool import SpoolSync
+from src.chunk.infra.storage import OffsetManager, WatermarkManager
 from src.chunk.main.settings import Settings
 
 logger = logging.getLogger(__name__)
@@ -18,56 +26,264 @@ class FeedService:
     processor: Processor
     metadata: Saver
     offset_manager: OffsetManager
+    watermark: WatermarkManager | None
+    journal: ProgressJournal | None
+    limiter: ConcurrencyLimiter
+    budget: MemoryBudget | None
+    manifests: ShardManifests | None
+    spool: SpoolSync | None
     settings: Settings
-    uploaded_files: list = []
+    uploaded_files: list
+    feed_type: str = "full"
 
-    def __init__(self, settings: Settings, pool: asyncpg.Pool, processor: Processor, metadata: Saver):
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        settings: Settings,
+        pool: asyncpg.Pool,
+        processor: Processor,
+        metadata: Saver,
+        watermark: WatermarkManager | None = None,
+        journal: ProgressJournal | None = None,
+        offset_manager: OffsetManager | None = None,
+        limiter: ConcurrencyLimiter | None = None,
+        budget: MemoryBudget | None = None,
+        manifests: ShardManifests | None = None,
+        spool: SpoolSync | None = None,
+    ):
         self.settings = settings
         self.pool = pool
-        self.semaphore = asyncio.Semaphore(settings.concurrency_limit)
+        self.limiter = limiter or ConcurrencyLimiter(settings.concurrency_limit)
+        self.budget = budget
+        self.manifests = manifests
+        self.spool = spool
         self.processor = processor
         self.metadata = metadata
-        self.offset_manager = OffsetManager(pool, settings.offset_initial)
+        self.watermark = watermark
+        self.journal = journal
+        self.run: JournalRun | None = None
+        self.uploaded_files = []
+        # Batches of changed ids published by this process, several can be published within one second
+        self.batches = 0
+        self.offset_manager = offset_manager or OffsetManager(
+            pool,
+            settings.offset_initial,
+            settings.delta_column,
+            manifests.shard if manifests else None,
+            # Cached chunks are looked up by their range, which must not move with every insert
+            aligned=bool(settings.chunk_cache_path),
+        )
 
-    async def feed(self):
+    async def feed(self) -> bool:
         """
-        Fetches data incrementally by executing tasks in chunks and manages concurrency
-        through a semaphore. This method continuously creates and executes an asynchronous
-        task with an increasing offset, determined by the configured chunk size.
+        Plans non-overlapping id ranges of the configured chunk size up front and processes
+        them concurrently. Up to `concurrency_limit` workers pull ranges from the plan, while
+        the limiter bounds how many chunks are in flight at once.
+
+        A tracked high-water mark is saved once the export succeeded. With a progress journal,
+        an interrupted export is resumed: its completed ranges are skipped and the metadata
+        file lists the files of every range recorded in the journal.
+
+        A shard of a split export saves its partial manifest instead, the metadata file and the
+        high-water mark are published by `finalize` once every shard is done. Nothing is published
+        while buffered or spooled files are not uploaded.
+
+        Returns True only when every range was exported and the export was published.
         """
-        offset = await self.offset_manager.fetch_offset(self.settings.db_table_name)
-        while True:
-            logger.debug(f"FeedService.feed: Offset {offset} with size {self.settings.chunk_size}")
-            task = asyncio.create_task(self.semaphore_wrapper(offset))
-            success = await task
+        table = self.settings.db_table_name
+        key = self.manifests.key if self.manifests else table
+        self.run = await self.journal.resume(key) if self.journal else None
+        if self.run is not None:
+            # A delta run without changed ranges has no range to tell its type, the run records it
+            ranges, mark, since = self.run.ranges, self.run.mark, self.run.since
+        else:
+            ranges, mark, since = await self.plan(table)
+            if self.journal:
+                self.run = await self.journal.start(key, ranges, mark, since)
+        self.feed_type = "full" if since is None else "delta"
+        completed = self.run.completed if self.run is not None else set()
+        ranges = [id_range for id_range in ranges if id_range not in completed]
+        pending = iter(ranges)
+        workers = min(self.settings.concurrency_limit, len(ranges))
+        failed = sum(await asyncio.gather(*(self.worker(pending) for _ in range(workers))))
+        logger.info(f"FeedService.feed: Concurrency limit ended at {int(self.limiter.limit)}")
+        finished = await self.finish()
+        if discarded := self.processor.discarded():
+            # Done ranges whose fragments went down with a failed output file. Rolled files are never
+            # journaled, so the whole export runs again.
+            logger.error(f"FeedService.feed: Output of {len(discarded)} completed ranges was discarded")
+            failed += len(discarded)
+        if not finished:
+            # The metadata file would list files that never reached S3, the next run publishes them
+            logger.error(f"FeedService.feed: Output of {table} was not finished, nothing is published")
+            return False
+        if self.run is not None:
+            self.uploaded_files = await self.journal.files(self.run)
+        if failed:
+            logger.error(f"FeedService.feed: {failed} of {len(ranges)} ranges failed")
+        if self.manifests is not None:
+            success = await self.manifests.save(self.feed_type, self.uploaded_files, mark, failed)
             if not success:
-                logger.debug(f"FeedService.feed: Offset: {offset} was finished")
-                break
-            offset += self.settings.chunk_size
+                logger.error(f"FeedService.feed: Failed to save manifest of shard {self.manifests.key}")
+        else:
+            success = await self.publish(table, mark, failed)
+        if not success or failed:
+            return False
+        if self.run is not None:
+            await self.journal.finish(self.run)
+        return True
+
+    async def feed_ids(self, ids: list[int]) -> bool:
+        """
+        Exports the rows of the given ids, e.g. the ones reported changed, as one file of a delta feed
+        and publishes a metadata file listing it. The high-water mark is left to the batch exports.
+        """
+        self.feed_type = "delta"
+        self.uploaded_files = []
+        ids = sorted(ids)
+        try:
+            success = await self.processor.handle_ids(ids, self.uploaded_files)
+            success = await self.finish() and success
+        except Exception as e:
+            logger.error(f"FeedService.feed_ids: Failed to export {len(ids)} changed rows: {e}")
+            success = False
+        if not success or not self.uploaded_files:
+            return success
+        self.batches += 1
+        return await self.save_metadata(self.batches)
+
+    async def finish(self) -> bool:
+        """Completes the buffered output, then uploads the spooled files the metadata file is about to list."""
+        if not await self.processor.finish(self.uploaded_files):
+            logger.error("FeedService.finish: Failed to finish buffered output")
+            return False
+        if self.spool is not None and not await self.spool.sync():
+            logger.error("FeedService.finish: Failed to sync the spool")
+            return False
+        return True
+
+    async def save_metadata(self, batch: int | None = None) -> bool:
+        """Saves the metadata file listing the uploaded files, the number of a `batch` keeps its name unique."""
         timestamp = int(time.time())
         success = await self.metadata.save_data(
             data=self.create_metadata_file(timestamp=timestamp),
-            file_name=self.settings.metadata_file_name.format(timestamp=timestamp),
+            file_name=self.settings.metadata_file_name.format(
+                timestamp=timestamp if batch is None else f"{timestamp}_{batch}"
+            ),
         )
         if not success:
-            logger.error(f"FeedService.feed: Failed to save metadata file {self.settings.metadata_file_name}")
+            logger.error(f"FeedService.save_metadata: Failed to save metadata file {self.settings.metadata_file_name}")
+        return success
+
+    async def publish(self, table: str, mark: datetime | None, failed: int) -> bool:
+        """
+        Saves the metadata file listing the uploaded files, then the high-water mark if no range failed.
+        A high-water mark that could not be saved fails the publication.
+
+        A full feed is not published while ranges failed: consumers treat entities missing from a full feed
+        as deleted. A delta feed is, the high-water mark stays put and the next delta exports the rest again.
+        """
+        if failed and self.feed_type == "full":
+            logger.error(f"FeedService.publish: Full feed of {table} is incomplete, it is not published")
+            return False
+        success = await self.save_metadata()
+        if success and not failed and self.watermark is not None:
+            if not await self.watermark.save(table, mark):
+                # The next delta starts from the old mark again, the run is left open to be retried
+                logger.error(f"FeedService.publish: Failed to move the high-water mark of {table} to {mark}")
+                return False
+            logger.info(f"FeedService.publish: High-water mark of {table} moved to {mark}")
+        return success
+
+    async def finalize(self) -> bool:
+        """
+        Merges the partial manifests of all shards into the metadata file of the export.
+
+        Nothing is published while the manifest of a shard is missing. The high-water mark only moves
+        once every shard succeeded, to the lowest mark any shard planned with, so rows changed while
+        the shards started are exported again by the next delta run.
+        """
+        table = self.settings.db_table_name
+        manifests = await self.manifests.load()
+        if manifests is None:
+            return False
+        self.uploaded_files = [file_name for manifest in manifests for file_name in manifest["data_file"]]
+        self.feed_type = "delta" if any(manifest["type"] == "delta" for manifest in manifests) else "full"
+        failed = sum(manifest["failed"] for manifest in manifests)
+        marks = [manifest["high_water_mark"] for manifest in manifests if manifest["high_water_mark"]]
+        mark = min(map(datetime.fromisoformat, marks), default=None)
+        if failed:
+            logger.error(f"FeedService.finalize: {failed} ranges of {table} failed across shards")
+        if not await self.publish(table, mark, failed):
+            return False
+        logger.info(f"FeedService.finalize: {len(self.uploaded_files)} files of {len(manifests)} shards published")
+        return not failed
+
+    async def plan(self, table: str) -> tuple[list[IdRange], datetime | None, datetime | None]:
+        """
+        Plans the ranges of a new export. When a high-water mark is tracked, the current one is taken
+        before planning, and a delta export only plans the rows changed since the saved mark.
+        """
+        since = mark = None
+        if self.watermark is not None:
+            mark = await self.watermark.fetch_current(table)
+            if self.settings.feed_mode == "delta":
+                since = await self.watermark.load(table)
+        offset = await self.offset_manager.fetch_offset(table)
+        ranges = await self.offset_manager.plan_ranges(table, offset, self.settings.chunk_size, since)
+        logger.debug(f"FeedService.plan: {len(ranges)} ranges planned from offset {offset}")
+        return ranges, mark, since
+
+    async def worker(self, ranges: Iterator[IdRange]) -> int:
+        """
+        Processes ranges from the shared plan until it is exhausted and returns the number of failed ranges.
+        """
+        failed = 0
+        for id_range in ranges:
+            if not await self.semaphore_wrapper(id_range):
+                failed += 1
+        return failed
 
-    async def semaphore_wrapper(self, ofs):
+    async def semaphore_wrapper(self, id_range: IdRange):
         """
-        Executes a function within an asynchronous semaphore context to limit concurrency.
+        Processes a range within a limiter slot, reporting its latency and outcome back to the limiter.
+        With a memory budget, the estimated memory of the chunk is reserved before it is fetched.
         """
-        async with self.semaphore:
+        with SEMAPHORE_WAIT_SECONDS.time():
+            await self.limiter.acquire(self.settings.db_table_name)
+        start = time.perf_counter()
+        success = False
+        reservation = 0
+        try:
+            if self.budget is not None:
+                size = self.budget.estimate(self.settings.chunk_size)
+                await self.budget.reserve(size)
+                reservation = size
+                # Waiting for memory is not latency of the range
+                start = time.perf_counter()
+            files = []
             try:
-                return await self.processor.handle(ofs, self.uploaded_files)
+                success = await self.processor.handle(id_range, files)
             except Exception as e:
-                logger.error(f"Failed to process offset {ofs}: {e}")
+                logger.error(f"Failed to process range {id_range}: {e}")
+                RANGES.inc(outcome="error")
                 return False
+            RANGES.inc(outcome="ok" if success else "failed")
+            if success:
+                self.uploaded_files.extend(files)
+                if self.run is not None:
+                    await self.journal.complete(self.run, id_range, files)
+            return success
+        finally:
+            if reservation:
+                await self.budget.release(reservation)
+            await self.limiter.release(time.perf_counter() - start, success)
 
     def create_metadata_file(self, timestamp: float) -> str:
         """Create a metadata file with the list of uploaded files."""
         metadata = {
             "generation_timestamp": timestamp,
-            "name": "reservewithgoogle.entity",
+            "name": self.settings.feed_name,
+            "type": self.feed_type,
             "data_file": self.uploaded_files,
         }
         logger.debug(f"FeedService.create_metadata_file: Metadata file: {metadata}")
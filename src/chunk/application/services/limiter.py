@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from collections import deque
+from collections.abc import Hashable
+
+from src.chunk.infra.metrics import CONCURRENCY_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimiter:
+    """
+    Bounds how many ranges are processed at once. Every finished range reports its latency and
+    outcome, which a fixed limiter ignores.
+
+    Ranges of several feeds share the limiter fairly: free slots are handed to the waiting feeds
+    in turn, so a feed with many ranges cannot starve one with few.
+    """
+
+    limit: float
+    in_flight: int
+    waiting: dict[Hashable, deque[asyncio.Future]]
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = {}
+        CONCURRENCY_LIMIT.set(limit)
+
+    async def acquire(self, feed: Hashable = None) -> None:
+        """Waits until the feed is granted a slot below the current limit."""
+        if not self.waiting and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+        granted = asyncio.get_running_loop().create_future()
+        self.waiting.setdefault(feed, deque()).append(granted)
+        try:
+            await granted
+        except asyncio.CancelledError:
+            if granted.done() and not granted.cancelled():
+                # The slot was granted just before the cancellation, hand it on
+                self.in_flight -= 1
+                self.grant()
+            else:
+                self.withdraw(feed, granted)
+            raise
+
+    async def release(self, latency: float, success: bool) -> None:
+        """Frees the slot of a finished range and adapts the limit to its latency and outcome."""
+        self.in_flight -= 1
+        self.update(latency, success)
+        self.grant()
+
+    def grant(self) -> None:
+        """Hands free slots to the waiting feeds round-robin, the served feed moves to the back."""
+        while self.waiting and self.in_flight < int(self.limit):
+            feed, queue = next(iter(self.waiting.items()))
+            del self.waiting[feed]
+            queue.popleft().set_result(None)
+            self.in_flight += 1
+            if queue:
+                self.waiting[feed] = queue
+
+    def withdraw(self, feed: Hashable, granted: asyncio.Future) -> None:
+        queue = self.waiting.get(feed)
+        if queue is not None and granted in queue:
+            queue.remove(granted)
+            if not queue:
+                del self.waiting[feed]
+
+    def update(self, latency: float, success: bool) -> None:
+        """Keeps the limit fixed."""
+
+
+class AdaptiveLimiter(ConcurrencyLimiter):
+    """
+    Finds the concurrency the DB and S3 sustain with additive increase, multiplicative decrease.
+
+    The limit starts at `min_limit` and grows by one per successful range until the first sign
+    of congestion (slow start), then by one per window of `limit` ranges. A failed range or a
+    latency above `tolerance` times the baseline cuts the limit by `backoff`, at most once per
+    window, so one burst of slow ranges counts as a single congestion event. The baseline is the
+    lowest latency seen, drifting up slowly so it follows data that got heavier over the run.
+    """
+
+    min_limit: int
+    max_limit: int
+    backoff: float
+    tolerance: float
+    baseline: float | None
+    baseline_drift: float = 0.01
+
+    def __init__(self, max_limit: int, min_limit: int = 1, backoff: float = 0.5, tolerance: float = 2.0):
+        super().__init__(min(min_limit, max_limit))
+        self.min_limit = self.limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.baseline = None
+        self.slow_start = True
+        self.completed = 0
+        self.last_decrease = 0
+
+    def update(self, latency: float, success: bool) -> None:
+        """Grows the limit while ranges stay fast and cuts it on failures or latency spikes."""
+        self.completed += 1
+        previous = int(self.limit)
+        if success:
+            drifted = self.baseline * (1 + self.baseline_drift) if self.baseline is not None else latency
+            self.baseline = min(latency, drifted)
+        if not success or latency > self.tolerance * self.baseline:
+            if self.completed - self.last_decrease >= self.limit:
+                self.slow_start = False
+                self.last_decrease = self.completed
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                reason = "failure" if not success else f"latency {latency:.3f}s, baseline {self.baseline:.3f}s"
+                logger.info(f"AdaptiveLimiter.update: Limit cut from {previous} to {int(self.limit)} ({reason})")
+        elif self.in_flight + 1 >= previous:
+            # Only a limit that was fully used has proven it can grow
+            self.limit = min(self.max_limit, self.limit + (1 if self.slow_start else 1 / self.limit))
+            if int(self.limit) != previous:
+                logger.info(f"AdaptiveLimiter.update: Limit raised from {previous} to {int(self.limit)}")
+        CONCURRENCY_LIMIT.set(int(self.limit))
@@ -1,7 +1,8 @@
+from collections.abc import Iterable
 from typing import Protocol
 
 
 class Payload(Protocol):
-    async def build_payload(self, data: list[dict]) -> str: ...
+    async def build_payload(self, data: list[dict]) -> str | Iterable[bytes]: ...
 
-    async def compress(self, data: str) -> bytes: ...
+    async def compress(self, data: str | Iterable[bytes]) -> bytes: ...
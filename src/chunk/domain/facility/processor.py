@@ -1,5 +1,13 @@
 from typing import Protocol
 
+from src.chunk.domain.facility.storage import IdRange
+
 
 class Processor(Protocol):
-    async def handle(self, offset: int, uploaded_files: list) -> bool: ...
+    async def handle(self, id_range: IdRange, uploaded_files: list) -> bool: ...
+
+    async def handle_ids(self, ids: list[int], uploaded_files: list) -> bool: ...
+
+    async def finish(self, uploaded_files: list) -> bool: ...
+
+    def discarded(self) -> set[IdRange]: ...
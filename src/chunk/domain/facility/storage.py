@@ -1,9 +1,58 @@
-from typing import Protocol
+from collections.abc import AsyncIterator
+from datetime import datetime
+from typing import NamedTuple, Protocol
+
+
+class IdRange(NamedTuple):
+    """
+    Half-open `[lo, hi)` interval of primary keys processed as one chunk.
+    Delta ranges only cover the rows changed after the `since` high-water mark.
+    """
+
+    lo: int
+    hi: int
+    since: datetime | None = None
+
+
+class Shard(NamedTuple):
+    """
+    Slice `index` of `count` disjoint slices of the id space, a row belongs to the slice `id % count`.
+    """
+
+    index: int = 0
+    count: int = 1
 
 
 class Fetcher(Protocol):
-    async def fetch_data(self, offset: int, limit: int, table: str) -> list[dict]: ...
+    async def fetch_data(self, id_range: IdRange, table: str) -> list: ...
+
+    async def fetch_ids(self, ids: list[int], table: str) -> list: ...
+
+    def stream_data(self, id_range: IdRange, table: str, batch_size: int) -> AsyncIterator[list]: ...
+
+    async def hash_data(self, id_range: IdRange, table: str) -> str | None: ...
 
 
 class Saver(Protocol):
     async def save_data(self, data: bytes | str, file_name: str) -> bool: ...
+
+
+class Loader(Protocol):
+    async def load_data(self, file_name: str) -> str | None: ...
+
+
+class Store(Saver, Loader, Protocol): ...
+
+
+class MultipartSaver(Protocol):
+    async def create_upload(self, file_name: str) -> str: ...
+
+    async def upload_part(self, file_name: str, upload_id: str, part_number: int, data: bytes) -> str: ...
+
+    async def complete_upload(self, file_name: str, upload_id: str, etags: list[str]) -> bool: ...
+
+    async def abort_upload(self, file_name: str, upload_id: str) -> None: ...
+
+
+class Uploader(Saver, MultipartSaver, Protocol):
+    async def exists(self, file_name: str) -> bool: ...
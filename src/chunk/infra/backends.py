@@ -0,0 +1,36 @@
+import asyncio
+import importlib
+import logging
+from functools import cache
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Storage backends by name, as "module:attribute". They are imported on first use, so code that never
+# touches S3 (the benchmark stand-ins, the CLI parsing its arguments) never imports aioboto3 and botocore,
+# the slowest imports of the exporter. An export run always uses them, a spool is synced to S3.
+BACKENDS = {
+    "s3_session": "aioboto3.session:Session",
+    "s3_client": "src.chunk.infra.s3:S3Client",
+    "s3_saver": "src.chunk.infra.s3:AWSOperator",
+    "s3_metadata": "src.chunk.infra.s3:MetadataOperator",
+}
+
+
+@cache
+def backend(name: str) -> Any:
+    """Imports and returns the backend registered under `name`."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend: {name}")
+    module, attribute = BACKENDS[name].split(":")
+    return getattr(importlib.import_module(module), attribute)
+
+
+async def preload(*names: str) -> None:
+    """
+    Imports backends in a thread, so their import overlaps the I/O the event loop waits on meanwhile,
+    e.g. opening the DB pool.
+    """
+    for name in names:
+        await asyncio.to_thread(backend, name)
+    logger.debug(f"backends.preload: Loaded {', '.join(names)}")
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+
+from src.chunk.domain.facility.storage import IdRange
+from src.chunk.infra.sqlite import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    namespace TEXT NOT NULL,
+    lo INTEGER NOT NULL,
+    hi INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    uploaded REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (namespace, lo, hi)
+);
+"""
+
+
+class ChunkCache(SQLiteStore):
+    """
+    Remembers the object uploaded for every id range together with a content hash of the range.
+
+    When the hash of a range is unchanged since an earlier run, the earlier object is reused
+    instead of encoding and uploading the chunk again. Ranges are only found again when they are
+    planned with the same bounds, so the feed plans aligned ranges while the cache is on.
+
+    Entries not used for `ttl` seconds are evicted. Eviction only forgets the entries, their objects are left
+    in the bucket for a lifecycle rule to expire. Such a rule expires objects by their age, not by their last
+    use, so an object uploaded more than `max_age` seconds ago is not reused but uploaded again:
+    `max_age` must stay below the expiration of the lifecycle rule.
+    """
+
+    schema = SCHEMA
+    namespace: str
+    ttl: float
+    max_age: float
+
+    def __init__(self, path: str, namespace: str, ttl: float, max_age: float):
+        """`namespace` separates entries of different tables, shards and payload formats."""
+        super().__init__(path)
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_age = max_age
+        if "uploaded" not in {column[1] for column in self._execute("PRAGMA table_info(chunks)")}:
+            # Entries of a cache file without upload times cannot be aged, they are dropped
+            self._execute("DROP TABLE chunks")
+            self.conn.executescript(self.schema)
+
+    async def get(self, id_range: IdRange, digest: str) -> str | None:
+        """Returns the object stored for the range if its content hash is unchanged."""
+        return await asyncio.to_thread(self._get, id_range, digest)
+
+    async def put(self, id_range: IdRange, digest: str, file_name: str) -> None:
+        """Records the object uploaded for the range."""
+        now = time.time()
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?)",
+            self.namespace,
+            id_range.lo,
+            id_range.hi,
+            digest,
+            file_name,
+            now,
+            now,
+        )
+
+    async def evict(self) -> int:
+        """
+        Drops the entries that were not used within the cache TTL or whose objects are too old to be reused,
+        and returns their number. Their objects stay in the bucket until its lifecycle rule expires them.
+        """
+        now = time.time()
+        rows = await asyncio.to_thread(
+            self._execute,
+            "DELETE FROM chunks WHERE last_used < ? OR uploaded < ? RETURNING file_name",
+            now - self.ttl,
+            now - self.max_age,
+        )
+        logger.debug(f"ChunkCache.evict: {len(rows)} entries evicted")
+        return len(rows)
+
+    def _get(self, id_range: IdRange, digest: str) -> str | None:
+        now = time.time()
+        key = (self.namespace, id_range.lo, id_range.hi)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT file_name, uploaded FROM chunks WHERE namespace = ? AND lo = ? AND hi = ? AND digest = ?",
+                (*key, digest),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now - self.max_age:
+                # The lifecycle rule may expire the object soon, the chunk is uploaded again
+                self.conn.execute("DELETE FROM chunks WHERE namespace = ? AND lo = ? AND hi = ?", key)
+                return None
+            self.conn.execute("UPDATE chunks SET last_used = ? WHERE namespace = ? AND lo = ? AND hi = ?", (now, *key))
+        return row[0]
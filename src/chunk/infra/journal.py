@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from src.chunk.domain.facility.storage import IdRange
+from src.chunk.infra.sqlite import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    since TEXT,
+    mark TEXT,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS ranges (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    lo INTEGER NOT NULL,
+    hi INTEGER NOT NULL,
+    files TEXT,
+    PRIMARY KEY (run_id, lo)
+);
+"""
+
+
+@dataclass
+class JournalRun:
+    id: int
+    ranges: list[IdRange]
+    mark: datetime | None = None
+    # High-water mark a delta run exports the changes since, None for a full run
+    since: datetime | None = None
+    completed: set[IdRange] = field(default_factory=set)
+
+
+def _to_text(value: datetime | None) -> str | None:
+    return value.isoformat() if value else None
+
+
+def _from_text(value: str | None) -> datetime | None:
+    return datetime.fromisoformat(value) if value else None
+
+
+class ProgressJournal(SQLiteStore):
+    """
+    Durable record of an export's planned ranges and of the files every completed range produced.
+
+    An export interrupted midway is resumed by the next run: completed ranges are skipped and
+    the metadata file is rebuilt from the journal. SQLite commits every completed range before
+    the range counts as done, so the journal survives a crash of the process.
+    """
+
+    schema = SCHEMA
+
+    async def resume(self, table: str) -> JournalRun | None:
+        """Returns the unfinished run of the table, if any."""
+        return await asyncio.to_thread(self._resume, table)
+
+    async def start(
+        self, table: str, ranges: list[IdRange], mark: datetime | None, since: datetime | None = None
+    ) -> JournalRun:
+        """Records a new run with its planned ranges, `since` is the high-water mark a delta run starts from."""
+        return await asyncio.to_thread(self._start, table, ranges, mark, since)
+
+    async def complete(self, run: JournalRun, id_range: IdRange, files: list[str]) -> None:
+        """Records a completed range together with the files it produced."""
+        await asyncio.to_thread(self._complete, run, id_range, files)
+
+    async def files(self, run: JournalRun) -> list[str]:
+        """Returns the files produced by the run, ordered by range."""
+        return await asyncio.to_thread(self._files, run)
+
+    async def finish(self, run: JournalRun) -> None:
+        """Marks the run as finished, so the next run plans a new export."""
+        await asyncio.to_thread(self._execute, "UPDATE runs SET finished_at = ? WHERE id = ?", time.time(), run.id)
+        logger.debug(f"ProgressJournal.finish: Run {run.id} finished")
+
+    def _resume(self, table: str) -> JournalRun | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, since, mark FROM runs WHERE table_name = ? AND finished_at IS NULL ORDER BY id DESC",
+                (table,),
+            ).fetchone()
+            if row is None:
+                return None
+            run_id, since, mark = row
+            ranges = self.conn.execute(
+                "SELECT lo, hi, files FROM ranges WHERE run_id = ? ORDER BY lo", (run_id,)
+            ).fetchall()
+        run = JournalRun(
+            id=run_id,
+            ranges=[IdRange(lo, hi, _from_text(since)) for lo, hi, _ in ranges],
+            mark=_from_text(mark),
+            since=_from_text(since),
+            completed={IdRange(lo, hi, _from_text(since)) for lo, hi, files in ranges if files is not None},
+        )
+        logger.info(f"ProgressJournal.resume: Resuming run {run_id}, {len(run.completed)} of {len(ranges)} ranges done")
+        return run
+
+    def _start(self, table: str, ranges: list[IdRange], mark: datetime | None, since: datetime | None) -> JournalRun:
+        with self.lock:
+            self.conn.execute("BEGIN")
+            cursor = self.conn.execute(
+                "INSERT INTO runs (table_name, since, mark, started_at) VALUES (?, ?, ?, ?)",
+                (table, _to_text(since), _to_text(mark), time.time()),
+            )
+            run_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO ranges (run_id, lo, hi) VALUES (?, ?, ?)",
+                [(run_id, id_range.lo, id_range.hi) for id_range in ranges],
+            )
+            self.conn.execute("COMMIT")
+        logger.debug(f"ProgressJournal.start: Run {run_id} started with {len(ranges)} ranges")
+        return JournalRun(id=run_id, ranges=ranges, mark=mark, since=since)
+
+    def _complete(self, run: JournalRun, id_range: IdRange, files: list[str]) -> None:
+        self._execute("UPDATE ranges SET files = ? WHERE run_id = ? AND lo = ?", json.dumps(files), run.id, id_range.lo)
+        run.completed.add(id_range)
+
+    def _files(self, run: JournalRun) -> list[str]:
+        rows = self._execute("SELECT files FROM ranges WHERE run_id = ? AND files IS NOT NULL ORDER BY lo", run.id)
+        return [file_name for (files,) in rows for file_name in json.loads(files)]
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Notifies the id of every inserted or updated row on the channel of the table
+NOTIFY_TRIGGER = """
+CREATE OR REPLACE FUNCTION {channel}() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{channel}', NEW.id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+CREATE OR REPLACE TRIGGER {channel} AFTER INSERT OR UPDATE ON {table}
+    FOR EACH ROW EXECUTE FUNCTION {channel}();
+"""
+
+
+class ChangeListener:
+    """
+    Receives the ids of changed rows of a table through Postgres LISTEN/NOTIFY.
+
+    A trigger installed with `install` notifies the id of every inserted or updated row. The listener holds
+    one pool connection subscribed to the channel and queues the notified ids, `batch` collects them.
+    Notifications sent while no listener is connected are lost, a batch export still catches up on those rows.
+    """
+
+    pool: asyncpg.Pool
+    table: str
+    channel: str
+
+    def __init__(self, pool: asyncpg.Pool, table: str):
+        self.pool = pool
+        self.table = table
+        self.channel = f"chunked_flow_{table}_changed"
+        self.changes: asyncio.Queue[int | None] = asyncio.Queue()
+        self.stack = AsyncExitStack()
+
+    async def install(self) -> None:
+        """Creates or replaces the trigger notifying the changes of the table."""
+        async with self.pool.acquire() as conn:
+            await conn.execute(NOTIFY_TRIGGER.format(channel=self.channel, table=self.table))
+        logger.info(f"ChangeListener.install: Changes of {self.table} are notified on {self.channel}")
+
+    async def __aenter__(self) -> "ChangeListener":
+        conn = await self.stack.enter_async_context(self.pool.acquire())
+        conn.add_termination_listener(self.terminated)
+        await conn.add_listener(self.channel, self.notified)
+        self.stack.push_async_callback(conn.remove_listener, self.channel, self.notified)
+        self.stack.callback(conn.remove_termination_listener, self.terminated)
+        logger.info(f"ChangeListener: Listening on {self.channel}")
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stack.aclose()
+
+    def notified(self, conn: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        self.changes.put_nowait(int(payload))
+
+    def requeue(self, ids: list[int]) -> None:
+        """Queues ids again, e.g. the ones of a batch that failed to export."""
+        for row_id in ids:
+            self.changes.put_nowait(row_id)
+
+    def terminated(self, conn: asyncpg.Connection) -> None:
+        # Wakes up a waiting `batch`, the changes of the table are no longer received
+        self.changes.put_nowait(None)
+
+    async def batch(self, window: float, max_ids: int) -> list[int]:
+        """
+        Waits for the next change, then collects changed ids for up to `window` seconds or until
+        `max_ids` distinct ids arrived. Raises ConnectionError once the listening connection is lost,
+        the ids collected until then are queued again.
+        """
+        ids = set()
+        try:
+            ids.add(await self.next())
+            deadline = asyncio.get_running_loop().time() + window
+            while len(ids) < max_ids:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    ids.add(await asyncio.wait_for(self.next(), timeout))
+                except TimeoutError:
+                    break
+        except BaseException:
+            # A cancelled or failed batch leaves the ids it collected to the next one
+            self.requeue(sorted(ids))
+            raise
+        return sorted(ids)
+
+    def drain(self) -> list[int]:
+        """Takes the queued ids without waiting, e.g. the ones left when the daemon stops."""
+        ids = set()
+        while not self.changes.empty():
+            change = self.changes.get_nowait()
+            if change is not None:
+                ids.add(change)
+        return sorted(ids)
+
+    async def next(self) -> int:
+        change = await self.changes.get()
+        if change is None:
+            raise ConnectionError(f"Connection listening on {self.channel} was lost")
+        return change
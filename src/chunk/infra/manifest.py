@@ -0,0 +1,70 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+
+from src.chunk.domain.facility.storage import Shard, Store
+
+logger = logging.getLogger(__name__)
+
+
+class ShardManifests:
+    """
+    Partial manifests of an export split into shards.
+
+    Every shard saves the files it uploaded next to the metadata file instead of publishing the metadata
+    itself, the finalize step loads the manifests of all shards and merges them. Manifests are named
+    after the `run` label shared by the shards of one export, so manifests of an earlier export are never merged.
+    """
+
+    store: Store
+    table: str
+    shard: Shard
+    run: str
+    file_name: str
+
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        store: Store,
+        table: str,
+        shard: Shard,
+        run: str,
+        file_name: str = "manifest_{table}_{run}_{index}_of_{count}.json",
+    ):
+        self.store = store
+        self.table = table
+        self.shard = shard
+        self.run = run
+        self.file_name = file_name
+
+    @property
+    def key(self) -> str:
+        """Identifies this shard of the table, e.g. in the progress journal."""
+        return f"{self.table}:{self.shard.index}/{self.shard.count}"
+
+    def name(self, index: int) -> str:
+        return self.file_name.format(table=self.table, run=self.run, index=index, count=self.shard.count)
+
+    async def save(self, feed_type: str, files: list[str], mark: datetime | None, failed: int) -> bool:
+        """Saves the manifest of this shard: its uploaded files, its high-water mark and its failed ranges."""
+        data = {
+            "table": self.table,
+            "run": self.run,
+            "shard": self.shard.index,
+            "shards": self.shard.count,
+            "type": feed_type,
+            "high_water_mark": mark.isoformat() if mark else None,
+            "failed": failed,
+            "data_file": files,
+        }
+        return await self.store.save_data(data=json.dumps(data), file_name=self.name(self.shard.index))
+
+    async def load(self) -> list[dict] | None:
+        """Loads the manifests of all shards in shard order, None while any of them is missing."""
+        names = [self.name(index) for index in range(self.shard.count)]
+        loaded = await asyncio.gather(*(self.store.load_data(name) for name in names))
+        missing = [name for name, data in zip(names, loaded, strict=True) if data is None]
+        if missing:
+            logger.error(f"ShardManifests.load: Missing manifests {missing}")
+            return None
+        return [json.loads(data) for data in loaded]
@@ -0,0 +1,228 @@
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values, strict=True))
+    return f"{{{pairs}}}"
+
+
+def _number(value: float) -> str:
+    """A sample value at full precision, whole numbers without a fraction, e.g. byte counts and timestamps."""
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """
+    A metric family, every distinct combination of label values is a sample series of its own.
+    Updates take a lock, payloads are compressed on executor threads.
+    """
+
+    kind: str
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.series: dict[tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def value(self, **labels: str) -> float:
+        """Current value of a series, the sum of observations for a histogram."""
+        return self.series.get(self.key(labels), 0)
+
+    def samples(self) -> Iterator[tuple[str, tuple[str, ...], tuple[str, ...], float]]:
+        for key, value in sorted(self.series.items()):
+            yield self.name, self.labelnames, key, value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{_labels(names, key)} {_number(value)}" for name, names, key, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(f"{name}_total", documentation, labelnames)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self.lock:
+            self.series[self.key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> float:
+        key = self.key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+            return self.series[key]
+
+    @contextmanager
+    def track(self, peak: "Gauge | None" = None, **labels: str) -> Iterator[None]:
+        """Counts the block as in progress while it runs, `peak` keeps the highest count seen."""
+        current = self.inc(**labels)
+        if peak is not None and current > peak.series.get(peak.key(labels), 0):
+            peak.set(current, **labels)
+        try:
+            yield
+        finally:
+            self.inc(-1, **labels)
+
+
+class Timer:
+    """Elapsed seconds of a timed block, available once the block is left."""
+
+    seconds: float = 0.0
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        self.counts: dict[tuple[str, ...], list[int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self.series[key] = self.series.get(key, 0) + value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[Timer]:
+        """Observes the duration of the block."""
+        timer = Timer()
+        start = time.perf_counter()
+        try:
+            yield timer
+        finally:
+            timer.seconds = time.perf_counter() - start
+            self.observe(timer.seconds, **labels)
+
+    def samples(self) -> Iterator[tuple[str, tuple[str, ...], tuple[str, ...], float]]:
+        names = (*self.labelnames, "le")
+        for key, total in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), self.counts[key], strict=True):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    names,
+                    (*key, "+Inf" if bound == float("inf") else f"{bound:g}"),
+                    cumulative,
+                )
+            yield f"{self.name}_count", self.labelnames, key, cumulative
+            yield f"{self.name}_sum", self.labelnames, key, total
+
+
+class MetricsRegistry:
+    """Process-wide collection of metrics, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register[M: Metric](self, metric: M) -> M:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames))
+
+    def render(self) -> str:
+        lines = [line for metric in self.metrics.values() for line in metric.render()]
+        return "\n".join([*lines, ""])
+
+    def write_textfile(self, path: str) -> None:
+        """
+        Writes the metrics for the node exporter textfile collector. The file is replaced atomically,
+        so a scrape never reads a half-written file.
+        """
+        target = Path(path)
+        temporary = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        temporary.write_text(self.render())
+        temporary.replace(target)
+        logger.debug(f"MetricsRegistry.write_textfile: Metrics written to {path}")
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "chunked_flow_stage_seconds", "Time a chunk spent in every processing stage", ("stage",)
+)
+DB_QUERY_SECONDS = REGISTRY.histogram("chunked_flow_db_query_seconds", "Duration of DB queries", ("query",))
+S3_REQUEST_SECONDS = REGISTRY.histogram("chunked_flow_s3_request_seconds", "Duration of S3 requests", ("operation",))
+SEMAPHORE_WAIT_SECONDS = REGISTRY.histogram(
+    "chunked_flow_semaphore_wait_seconds", "Time a range waited for a concurrency slot"
+)
+ROWS = REGISTRY.counter("chunked_flow_rows", "Rows fetched from the DB")
+RAW_BYTES = REGISTRY.counter("chunked_flow_raw_bytes", "Uncompressed payload bytes")
+COMPRESSED_BYTES = REGISTRY.counter("chunked_flow_compressed_bytes", "Compressed payload bytes")
+RANGES = REGISTRY.counter("chunked_flow_ranges", "Processed id ranges by outcome", ("outcome",))
+SPOOLED_FILES = REGISTRY.counter("chunked_flow_spooled_files", "Spooled files synced by outcome", ("outcome",))
+RETRIES = REGISTRY.counter("chunked_flow_retries", "Retried requests", ("operation",))
+HEDGES = REGISTRY.counter("chunked_flow_hedged_requests", "Duplicate requests started for slow ones", ("operation",))
+DB_CONNECTIONS = REGISTRY.gauge("chunked_flow_db_connections_in_use", "DB connections currently acquired")
+DB_CONNECTIONS_PEAK = REGISTRY.gauge("chunked_flow_db_connections_in_use_peak", "Most DB connections acquired at once")
+DB_REPLICA_LAG = REGISTRY.gauge("chunked_flow_db_replica_lag_seconds", "Last measured lag of a replica", ("replica",))
+REPLICA_FALLBACKS = REGISTRY.counter("chunked_flow_replica_fallbacks", "Reads served by the primary, no replica usable")
+DB_POOL_SIZE = REGISTRY.gauge("chunked_flow_db_pool_max_size", "Maximum size of the DB connection pool")
+S3_REQUESTS = REGISTRY.gauge("chunked_flow_s3_requests_in_flight", "S3 requests currently in flight", ("client",))
+S3_REQUESTS_PEAK = REGISTRY.gauge(
+    "chunked_flow_s3_requests_in_flight_peak", "Most S3 requests in flight at once", ("client",)
+)
+S3_POOL_SIZE = REGISTRY.gauge(
+    "chunked_flow_s3_max_pool_connections", "Connection pool size of the S3 client", ("client",)
+)
+MEMORY_RESERVED = REGISTRY.gauge("chunked_flow_memory_reserved_bytes", "Memory reserved by chunks in flight")
+MEMORY_WAIT_SECONDS = REGISTRY.histogram(
+    "chunked_flow_memory_wait_seconds", "Time a range waited for its memory reservation"
+)
+CONCURRENCY_LIMIT = REGISTRY.gauge("chunked_flow_concurrency_limit", "Ranges allowed in flight at once")
+RUN_SECONDS = REGISTRY.gauge("chunked_flow_run_seconds", "Duration of the last run")
+RUN_TIMESTAMP = REGISTRY.gauge("chunked_flow_run_timestamp_seconds", "Unix time the last run finished")
@@ -1,56 +1,241 @@
 import asyncio
+import copy
 import gzip
 import io
 import json
 import logging
+import multiprocessing
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from operator import itemgetter
 
 from src.chunk.domain.facility.payload import Payload
+from src.chunk.infra.compression import BlockGzipCompressor
+from src.chunk.infra.metrics import RAW_BYTES
+from src.chunk.infra.transform import FACILITY_SPEC, Encoder, EntitySpec
 
 logger = logging.getLogger(__name__)
 
+DOCUMENT_HEAD = b'{"data": ['
+RECORD_SEPARATOR = b", "
+DOCUMENT_TAIL = b"]}"
+
+
+def projector(columns: tuple[str, ...]) -> Callable[[dict], tuple]:
+    """Returns a function projecting a dict record to its values in `columns` order."""
+    if len(columns) == 1:
+        (column,) = columns
+        return lambda rec: (rec[column],)
+    return itemgetter(*columns)
+
 
 class ChunkPayload(Payload):
-    async def build_payload(self, records: list[dict]) -> str:
-        """Transform list of records."""
-        data_payload = {"data": []}
-        for rec in records:
-            data_payload["data"].append(
-                {
-                    "entity_id": rec["id"],
-                    "name": rec["name"],
-                    "telephone": rec["phone"],
-                    "url": rec["url"],
-                    "location": {
-                        "latitude": f"{rec['latitude']:.6f}",
-                        "longitude": f"{rec['longitude']:6f}",
-                        "address": {
-                            "country": rec["country"],
-                            "locality": rec["locality"],
-                            "region": rec["region"],
-                            "postal_code": rec["postal_code"],
-                            "street_address": rec["street_address"],
-                        },
-                    },
-                }
-            )
-        logger.debug(f"ChunkPayload.build_payload: Payload size: {len(data_payload)}")
-        return json.dumps(data_payload, ensure_ascii=False)
+    columns: tuple[str, ...] = FACILITY_SPEC.columns
+    streaming: bool
+    fragment: bool
+    level: int
+    compressor: BlockGzipCompressor | None
+    spec: EntitySpec
 
-    async def compress(self, data_str: str) -> bytes:
-        """Return GZIP-compressed bytes of the data string."""
-        buffer = io.BytesIO()
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        streaming: bool = False,
+        fragment: bool = False,
+        level: int = 9,
+        compressor: BlockGzipCompressor | None = None,
+        spec: EntitySpec = FACILITY_SPEC,
+    ):
+        """
+        With `fragment` only the comma-separated records are emitted, without the surrounding document,
+        so that a `RollingFileWriter` can join the payloads of several chunks into one file.
+        A `compressor` deflates large payloads in parallel blocks instead of on a single thread.
+        Records are mapped to feed entities by the encoder compiled from `spec`.
+        """
+        self.streaming = streaming
+        self.fragment = fragment
+        self.level = level
+        self.compressor = compressor
+        self.use_spec(spec)
+
+    def use_spec(self, spec: EntitySpec) -> None:
+        self.spec = spec
+        self.encoder = spec.compile()
+        self.named_encoder = spec.compile(by_name=True)
+        self.getter = projector(spec.columns)
+        if type(self).columns is not None:
+            self.columns = spec.columns
+
+    def for_spec(self, spec: EntitySpec) -> "ChunkPayload":
+        """Returns a payload engine encoding `spec` entities, sharing the compressor and workers of this one."""
+        if spec == self.spec:
+            return self
+        payload = copy.copy(self)
+        payload.use_spec(spec)
+        return payload
+
+    def encoder_of(self, records: list) -> Encoder:
+        """
+        Fetched records select exactly the spec columns and are read by position,
+        dict records are read by column name.
+        """
+        return self.named_encoder if records and isinstance(records[0], dict) else self.encoder
+
+    def close(self) -> None:
+        """Release encoding resources, only the block compressor holds threads."""
+        if self.compressor is not None:
+            self.compressor.close()
+
+    async def build_payload(self, records: list[dict]) -> str | Iterable[bytes]:
+        """
+        Transform list of records.
+
+        In streaming mode nothing is serialized here: a lazy iterator of encoded records is returned
+        and `compress` feeds it into the compressor one record at a time.
+        """
+        if self.streaming:
+            return self._payload_stream(records, self.encoder_of(records).entity, self.fragment)
+        entities = self.encoder_of(records).entities(records)
+        logger.debug(f"ChunkPayload.build_payload: Payload size: {len(entities)}")
+        if self.fragment:
+            return json.dumps(entities, ensure_ascii=False)[1:-1]
+        return json.dumps({"data": entities}, ensure_ascii=False)
+
+    @staticmethod
+    def _payload_stream(records: Iterable, entity: Callable[[tuple], dict], fragment: bool = False) -> Iterator[bytes]:
+        """Yield the UTF-8 encoded payload document piece by piece, byte-identical to `json.dumps`."""
+        if not fragment:
+            yield DOCUMENT_HEAD
+        for index, rec in enumerate(records):
+            if index:
+                yield RECORD_SEPARATOR
+            yield json.dumps(entity(rec), ensure_ascii=False).encode("utf-8")
+        if not fragment:
+            yield DOCUMENT_TAIL
+
+    async def compress(self, data: str | Iterable[bytes]) -> bytes:
+        """Return GZIP-compressed bytes of the data string or of the encoded payload stream."""
         loop = asyncio.get_running_loop()
+        if self.compressor is not None:
+            return await loop.run_in_executor(None, self.compressor.compress, data)
+        buffer = io.BytesIO()
         # Run the blocking function in a ThreadPoolExecutor to avoid blocking event loop
-        await loop.run_in_executor(
+        raw_size = await loop.run_in_executor(
             None,  # use default thread pool
             self._payload_gzip,
-            data_str,
+            data,
             buffer,
+            self.level,
         )
+        RAW_BYTES.inc(raw_size)
         return buffer.getvalue()
 
     @staticmethod
-    def _payload_gzip(data_str: str, buffer: io.BytesIO) -> None:
-        """Write GZIP-compressed bytes of the data string to the buffer."""
-        with gzip.GzipFile(fileobj=buffer, mode="wb") as gz:
-            gz.write(data_str.encode("utf-8"))
+    def _payload_gzip(data: str | Iterable[bytes], buffer: io.BytesIO, level: int = 9) -> int:
+        """Write GZIP-compressed bytes of the data to the buffer and return the uncompressed size."""
+        with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=level) as gz:
+            if isinstance(data, str):
+                return gz.write(data.encode("utf-8"))
+            return sum(gz.write(piece) for piece in data)
+
+
+class PushdownPayload(ChunkPayload):
+    """Payload of entities already encoded as JSON by `PostgresJsonOperator`, it only needs to be joined."""
+
+    columns = None
+
+    async def build_payload(self, records: list[str]) -> str:
+        """Join the encoded entities into the payload document."""
+        data_str = ", ".join(records)
+        logger.debug(f"PushdownPayload.build_payload: Payload size: {len(records)}")
+        if self.fragment:
+            return data_str
+        return f'{{"data": [{data_str}]}}'
+
+
+@dataclass(frozen=True)
+class RowBatch:
+    """
+    Chunk rows as plain tuples ordered like the columns of `spec`, cheap to pickle to a worker process.
+    Only the rows and the digest of the spec are sent, workers keep the specs registered with them.
+    """
+
+    rows: list[tuple]
+    fragment: bool = False
+    spec: EntitySpec = FACILITY_SPEC
+
+    def __iter__(self) -> Iterator[bytes]:
+        return ChunkPayload._payload_stream(self.rows, self.spec.compile().entity, self.fragment)
+
+
+class UnknownSpecError(LookupError):
+    """The worker process was not given the spec of a batch yet."""
+
+
+# Specs registered with this worker process by their digest, each is compiled once on first use
+_specs: dict[str, EntitySpec] = {}
+
+
+def _register_spec(spec: EntitySpec) -> None:
+    _specs[spec.digest] = spec
+
+
+def _encode_rows(rows: list[tuple], fragment: bool, level: int, digest: str) -> tuple[bytes, int]:
+    """Build and compress the payload of a chunk inside a worker process, returns it with its uncompressed size."""
+    if digest not in _specs:
+        raise UnknownSpecError(digest)
+    buffer = io.BytesIO()
+    raw_size = ChunkPayload._payload_gzip(RowBatch(rows, fragment, _specs[digest]), buffer, level)
+    return buffer.getvalue(), raw_size
+
+
+def _register_and_encode(rows: list[tuple], fragment: bool, level: int, spec: EntitySpec) -> tuple[bytes, int]:
+    _register_spec(spec)
+    return _encode_rows(rows, fragment, level, spec.digest)
+
+
+class ProcessChunkPayload(ChunkPayload):
+    """
+    Builds and compresses payloads in a process pool so encoding scales across CPU cores.
+
+    Only value tuples and the digest of the entity spec are sent to the workers, the spec is registered
+    with every worker when it starts, and only the gzip bytes come back.
+    """
+
+    executor: ProcessPoolExecutor
+
+    def __init__(self, workers: int, fragment: bool = False, level: int = 9, spec: EntitySpec = FACILITY_SPEC):
+        super().__init__(streaming=True, fragment=fragment, level=level, spec=spec)
+        # Forking a process that already runs an event loop and executor threads is unsafe
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_register_spec,
+            initargs=(spec,),
+        )
+
+    async def build_payload(self, records: list[dict]) -> RowBatch:
+        """Project records to value tuples, the payload itself is built by a worker process."""
+        return RowBatch([self.getter(rec) for rec in records], self.fragment, self.spec)
+
+    async def compress(self, data: str | Iterable[bytes]) -> bytes:
+        """Return GZIP-compressed bytes of the payload, built and compressed in a worker process."""
+        if not isinstance(data, RowBatch):
+            return await super().compress(data)
+        loop = asyncio.get_running_loop()
+        batch = (data.rows, data.fragment, self.level)
+        try:
+            compressed_data, raw_size = await loop.run_in_executor(
+                self.executor, _encode_rows, *batch, data.spec.digest
+            )
+        except UnknownSpecError:
+            # A spec of `for_spec` reaches every worker with the first batch that worker gets without it
+            compressed_data, raw_size = await loop.run_in_executor(
+                self.executor, _register_and_encode, *batch, data.spec
+            )
+        RAW_BYTES.inc(raw_size)
+        return compressed_data
+
+    def close(self) -> None:
+        """Shut the worker processes down."""
+        self.executor.shutdown(cancel_futures=True)
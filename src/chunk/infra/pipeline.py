@@ -0,0 +1,151 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+import asyncpg
+
+from src.chunk.domain.facility.payload import Payload
+from src.chunk.domain.facility.storage import Fetcher, IdRange, Saver
+from src.chunk.infra.cache import ChunkCache
+from src.chunk.infra.metrics import COMPRESSED_BYTES, ROWS, STAGE_SECONDS
+from src.chunk.infra.processor import ChunkProcessor
+from src.chunk.infra.writer import RollingFileWriter
+from src.chunk.main.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PipelineItem:
+    id_range: IdRange
+    uploaded_files: list
+    done: asyncio.Future
+    data: Any = field(default=None, repr=False)
+    digest: str | None = None
+
+
+class StagedProcessor(ChunkProcessor):
+    """
+    Runs fetch, build, compress and upload as separate stages connected by bounded queues.
+
+    Every stage has its own pool of workers, so DB reads, payload encoding and uploads of
+    different chunks overlap. A full queue blocks the stage in front of it, which lets slow
+    uploads push back on the fetchers instead of piling up rows in memory.
+    """
+
+    queues: dict[str, asyncio.Queue]
+    tasks: list[asyncio.Task]
+
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        settings: Settings,
+        pool: asyncpg.Pool,
+        payload: Payload,
+        storage: Fetcher,
+        saver: Saver,
+        writer: RollingFileWriter | None = None,
+        cache: ChunkCache | None = None,
+    ):
+        super().__init__(
+            settings=settings, pool=pool, payload=payload, storage=storage, saver=saver, writer=writer, cache=cache
+        )
+        self.stages: list[tuple[str, int, Callable[[PipelineItem], Awaitable[bool]]]] = [
+            ("fetch", settings.pipeline_fetch_workers, self.fetch_stage),
+            ("build", settings.pipeline_build_workers, self.build_stage),
+            ("compress", settings.pipeline_compress_workers, self.compress_stage),
+            ("upload", settings.pipeline_upload_workers, self.upload_stage),
+        ]
+        self.queues = {name: asyncio.Queue(maxsize=settings.pipeline_queue_size) for name, _, _ in self.stages}
+        self.tasks = []
+
+    def queue_depths(self) -> dict[str, int]:
+        """Return the number of chunks waiting in front of every stage."""
+        return {name: queue.qsize() for name, queue in self.queues.items()}
+
+    async def handle(self, id_range: IdRange, uploaded_files: list) -> bool:
+        """Submit a chunk to the pipeline and wait until it has passed all stages."""
+        if not self.tasks:
+            self.start()
+        item = PipelineItem(id_range, uploaded_files, asyncio.get_running_loop().create_future())
+        await self.queues["fetch"].put(item)
+        logger.debug(f"StagedProcessor.handle: Range {id_range.lo}-{id_range.hi} queued. Depths {self.queue_depths()}")
+        return await item.done
+
+    def start(self) -> None:
+        """Spawn the workers of every stage."""
+        names = [name for name, _, _ in self.stages]
+        for index, (name, workers, step) in enumerate(self.stages):
+            inbox = self.queues[name]
+            outbox = self.queues[names[index + 1]] if index + 1 < len(names) else None
+            self.tasks.extend(
+                asyncio.create_task(self.run_stage(name, step, inbox, outbox), name=f"{name}-{worker}")
+                for worker in range(workers)
+            )
+        logger.debug(f"StagedProcessor.start: {len(self.tasks)} stage workers started")
+
+    async def finish(self, uploaded_files: list) -> bool:
+        """Stop the stage workers once every submitted chunk is done and complete the open output file."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        logger.debug("StagedProcessor.finish: Stage workers stopped")
+        return await super().finish(uploaded_files)
+
+    @staticmethod
+    async def run_stage(
+        name: str,
+        step: Callable[[PipelineItem], Awaitable[bool]],
+        inbox: asyncio.Queue,
+        outbox: asyncio.Queue | None,
+    ) -> None:
+        """
+        Takes chunks from the stage queue, runs the stage step and forwards them to the next stage.
+        A step returning False has already resolved the chunk and drops it from the pipeline.
+        """
+        while True:
+            item = await inbox.get()
+            try:
+                with STAGE_SECONDS.time(stage=name):
+                    forward = await step(item)
+                if forward:
+                    if outbox is None:
+                        item.done.set_result(True)
+                    else:
+                        await outbox.put(item)
+            except Exception as e:
+                logger.error(f"StagedProcessor.{name}: Failed to process range {item.id_range}: {e}")
+                item.done.set_exception(e)
+            finally:
+                inbox.task_done()
+
+    async def fetch_stage(self, item: PipelineItem) -> bool:
+        if self.cache is not None:
+            item.digest = await self.fetcher.hash_data(item.id_range, self.settings.db_table_name)
+            if await self.reuse(item.id_range, item.digest, item.uploaded_files):
+                item.done.set_result(True)
+                return False
+        item.data = await self.fetcher.fetch_data(item.id_range, self.settings.db_table_name)
+        ROWS.inc(len(item.data))
+        logger.debug(f"StagedProcessor.fetch_stage: {len(item.data)} rows were fetched. Range: {item.id_range}")
+        if not item.data:
+            item.done.set_result(True)
+            return False
+        return True
+
+    async def build_stage(self, item: PipelineItem) -> bool:
+        item.data = await self.payload.build_payload(item.data)
+        return True
+
+    async def compress_stage(self, item: PipelineItem) -> bool:
+        item.data = await self.payload.compress(item.data)
+        COMPRESSED_BYTES.inc(len(item.data))
+        return True
+
+    async def upload_stage(self, item: PipelineItem) -> bool:
+        if not await self.upload(item.data, item.id_range, item.uploaded_files, item.digest):
+            item.done.set_result(False)
+            return False
+        return True
@@ -5,7 +5,10 @@ import asyncpg
 
 from src.chunk.domain.facility.payload import Payload
 from src.chunk.domain.facility.processor import Processor
-from src.chunk.domain.facility.storage import Fetcher, Saver
+from src.chunk.domain.facility.storage import Fetcher, IdRange, Saver
+from src.chunk.infra.cache import ChunkCache
+from src.chunk.infra.metrics import COMPRESSED_BYTES, ROWS, STAGE_SECONDS
+from src.chunk.infra.writer import RollingFileWriter
 from src.chunk.main.settings import Settings
 
 logger = logging.getLogger(__name__)
@@ -17,33 +20,141 @@ class ChunkProcessor(Processor):
     payload: Payload
     fetcher: Fetcher
     saver: Saver
+    writer: RollingFileWriter | None
+    cache: ChunkCache | None
 
-    def __init__(self, settings, pool: asyncpg.Pool, payload: Payload, storage: Fetcher, saver: Saver):
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        settings,
+        pool: asyncpg.Pool,
+        payload: Payload,
+        storage: Fetcher,
+        saver: Saver,
+        writer: RollingFileWriter | None = None,
+        cache: ChunkCache | None = None,
+    ):
         self.settings = settings
         self.pool = pool
         self.payload = payload
         self.fetcher = storage
         self.saver = saver
+        self.writer = writer
+        self.cache = cache
+        # Batches of changed ids exported by this process, several can be exported within one second
+        self.batches = 0
 
-    async def handle(self, offset: int, uploaded_files: list):
+    async def handle(self, id_range: IdRange, uploaded_files: list):
         """Fetch a chunk from DB, transform, compress, and save."""
-        logger.debug(f"ChunkProcessor.handle: Processing chunk {offset}")
-        rows = await self.fetcher.fetch_data(offset, self.settings.chunk_size, self.settings.db_table_name)
-        logger.debug(
-            f"ChunkProcessor.handle: {len(rows)} rows were fetched. Offset: {offset}. Chunk {self.settings.chunk_size}"
-        )
+        logger.debug(f"ChunkProcessor.handle: Processing chunk {id_range.lo}-{id_range.hi}")
+        if self.writer is not None and self.settings.fetch_batch_size:
+            return await self.stream(id_range, uploaded_files)
+        digest = None
+        if self.cache is not None:
+            digest = await self.fetcher.hash_data(id_range, self.settings.db_table_name)
+            if await self.reuse(id_range, digest, uploaded_files):
+                return True
+        with STAGE_SECONDS.time(stage="fetch"):
+            rows = await self.fetcher.fetch_data(id_range, self.settings.db_table_name)
+        ROWS.inc(len(rows))
+        logger.debug(f"ChunkProcessor.handle: {len(rows)} rows were fetched. Range: {id_range.lo}-{id_range.hi}")
         if not rows:
+            # The range was planned up front, so an empty result only means its rows were deleted meanwhile
+            return True
+
+        return await self.export(rows, id_range, uploaded_files, digest)
+
+    async def handle_ids(self, ids: list[int], uploaded_files: list) -> bool:
+        """Fetch the rows of the given sorted ids, e.g. the ones reported changed, and save them as one file."""
+        with STAGE_SECONDS.time(stage="fetch"):
+            rows = await self.fetcher.fetch_ids(ids, self.settings.db_table_name)
+        ROWS.inc(len(rows))
+        logger.debug(f"ChunkProcessor.handle_ids: {len(rows)} of {len(ids)} changed rows were fetched")
+        if not rows:
+            return True
+        self.batches += 1
+        label = f"changes_{self.batches}"
+        return await self.export(rows, IdRange(ids[0], ids[-1] + 1), uploaded_files, label=label)
+
+    async def export(  # noqa: PLR0913
+        self, rows: list, id_range: IdRange, uploaded_files: list, digest: str | None = None, label: str = "feed"
+    ) -> bool:
+        """Build, compress and save the payload of fetched rows."""
+        with STAGE_SECONDS.time(stage="build"):
+            data_str = await self.payload.build_payload(rows)
+        with STAGE_SECONDS.time(stage="compress"):
+            compressed_data = await self.payload.compress(data_str)
+        COMPRESSED_BYTES.inc(len(compressed_data))
+        with STAGE_SECONDS.time(stage="upload"):
+            return await self.upload(compressed_data, id_range, uploaded_files, digest, label)
+
+    async def reuse(self, id_range: IdRange, digest: str | None, uploaded_files: list) -> bool:
+        """Register the object of an earlier run if the content of the range is unchanged."""
+        if digest is None:
             return False
+        file_name = await self.cache.get(id_range, digest)
+        if file_name is None:
+            return False
+        logger.debug(f"ChunkProcessor.reuse: Range {id_range.lo}-{id_range.hi} is unchanged, reusing {file_name}")
+        uploaded_files.append(file_name)
+        return True
 
-        data_str = await self.payload.build_payload(rows)
-        compressed_data = await self.payload.compress(data_str)
+    async def stream(self, id_range: IdRange, uploaded_files: list) -> bool:
+        """
+        Stream a chunk from DB in batches and hand every batch to the rolling writer as soon as it is encoded,
+        so a large range is never held in memory as a whole.
+        """
+        batches = self.fetcher.stream_data(id_range, self.settings.db_table_name, self.settings.fetch_batch_size)
+        while True:
+            with STAGE_SECONDS.time(stage="fetch"):
+                rows = await anext(batches, None)
+            if rows is None:
+                return True
+            ROWS.inc(len(rows))
+            with STAGE_SECONDS.time(stage="build"):
+                data = await self.payload.build_payload(rows)
+            with STAGE_SECONDS.time(stage="compress"):
+                compressed_data = await self.payload.compress(data)
+            COMPRESSED_BYTES.inc(len(compressed_data))
+            with STAGE_SECONDS.time(stage="upload"):
+                written = await self.writer.write(compressed_data, uploaded_files, id_range)
+            if not written:
+                await batches.aclose()
+                return False
 
+    async def upload(  # noqa: PLR0913, PLR0917
+        self,
+        compressed_data: bytes,
+        id_range: IdRange,
+        uploaded_files: list,
+        digest: str | None = None,
+        label: str = "feed",
+    ) -> bool:
+        """
+        Save a compressed chunk and register its file name, or hand it to the rolling writer.
+        A chunk saved with the content hash of its range can be reused by later runs.
+        """
+        if self.writer is not None:
+            return await self.writer.write(compressed_data, uploaded_files, id_range)
         timestamp = int(time.time())
-        file_name = f"facility_feed_{timestamp}_{offset}.json.gz"
-        logger.debug(f"ChunkProcessor.handle: File name - {file_name}")
+        file_name = f"{self.settings.db_table_name}_{label}_{timestamp}_{id_range.lo}.json.gz"
+        logger.debug(f"ChunkProcessor.upload: File name - {file_name}")
         success = await self.saver.save_data(compressed_data, file_name)
         if not success:
-            logger.error(f"ChunkProcessor.handle: Failed to save file {file_name}")
+            logger.error(f"ChunkProcessor.upload: Failed to save file {file_name}")
             return False
         uploaded_files.append(file_name)
+        if self.cache is not None and digest is not None:
+            await self.cache.put(id_range, digest, file_name)
         return True
+
+    async def finish(self, uploaded_files: list) -> bool:
+        """Complete the output file still open in the rolling writer, chunk files are saved by `handle` itself."""
+        if self.writer is None:
+            return True
+        return await self.writer.close(uploaded_files)
+
+    def discarded(self) -> set[IdRange]:
+        """Ranges handled successfully whose fragments were discarded with a failed output file afterwards."""
+        if self.writer is None:
+            return set()
+        return set(self.writer.discarded)
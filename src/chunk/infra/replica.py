@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+
+import asyncpg
+
+from src.chunk.infra.metrics import DB_REPLICA_LAG, REPLICA_FALLBACKS
+
+logger = logging.getLogger(__name__)
+
+# WAL position the node has applied and the age in seconds of the last transaction it replayed.
+# A primary has applied its own WAL. Whether a standby lags is only known against the position of the primary:
+# one whose WAL receiver is disconnected has replayed everything it received, however far behind it is.
+POSITION_QUERY = """
+SELECT
+    pg_wal_lsn_diff(COALESCE(pg_last_wal_replay_lsn(), pg_current_wal_lsn()), '0/0')::bigint,
+    COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)::float8
+"""
+
+
+@dataclass
+class Replica:
+    """A read replica with the requests it serves and its last known position, unknown while unreachable."""
+
+    pool: asyncpg.Pool
+    name: str
+    outstanding: int = 0
+    position: int | None = None
+    lag: float | None = None
+
+
+class ReplicaPool:
+    """
+    Spreads reads over the pools of several read replicas, the one with the fewest requests outstanding
+    serves the next connection.
+
+    Replicas lagging more than `max_lag` seconds are skipped until they catch up, and the primary serves
+    the reads when no replica qualifies. Lag is measured every `refresh_interval` seconds: a replica that
+    applied the WAL position of the primary does not lag, any other lags by the age of its last replayed transaction.
+
+    `pin` picks the planner, the node planning ranges and reading the high-water mark. It is the least
+    advanced replica within the lag limit, and its WAL position becomes the floor every replica must have
+    applied before it serves reads. Replicas only move forward, so every chunk is read from a state at least
+    as recent as the planned one, and no row changed before the saved high-water mark is missed.
+    """
+
+    primary: asyncpg.Pool
+    replicas: list[Replica]
+    max_lag: float
+    refresh_interval: float
+    planner: asyncpg.Pool
+    floor: int
+
+    def __init__(self, primary: asyncpg.Pool, replicas: list[Replica], max_lag: float, refresh_interval: float = 5.0):
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.refresh_interval = refresh_interval
+        self.planner = primary
+        self.floor = 0
+        self.refreshed = float("-inf")
+        self.refreshing = asyncio.Lock()
+
+    @staticmethod
+    async def position(pool: asyncpg.Pool) -> tuple[int, float]:
+        async with pool.acquire() as conn:
+            position, lag = await conn.fetchrow(POSITION_QUERY)
+        return position, lag
+
+    async def measure(self, replica: Replica, primary_position: int | None) -> None:
+        try:
+            replica.position, replica.lag = await self.position(replica.pool)
+        except (OSError, asyncpg.PostgresError) as e:
+            logger.warning(f"ReplicaPool.measure: Replica {replica.name} is unreachable: {e}")
+            replica.position, replica.lag = None, None
+            return
+        if primary_position is not None and replica.position >= primary_position:
+            replica.lag = 0.0
+        DB_REPLICA_LAG.set(replica.lag, replica=replica.name)
+
+    async def refresh(self, max_age: float = 0.0) -> None:
+        """Measures the position and lag of every replica, unless they were measured within `max_age` seconds."""
+        async with self.refreshing:
+            if time.monotonic() - self.refreshed < max_age:
+                return
+            try:
+                # Taken first, so replicas only look further behind than they are
+                primary_position, _ = await self.position(self.primary)
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning(f"ReplicaPool.refresh: Primary is unreachable, lag is the age of replayed WAL: {e}")
+                primary_position = None
+            await asyncio.gather(*(self.measure(replica, primary_position) for replica in self.replicas))
+            self.refreshed = time.monotonic()
+        logger.debug(
+            "ReplicaPool.refresh: "
+            + ", ".join(f"{replica.name} lag {replica.lag} position {replica.position}" for replica in self.replicas)
+        )
+
+    def within_lag(self, replica: Replica) -> bool:
+        return replica.lag is not None and replica.lag <= self.max_lag
+
+    def usable(self) -> list[Replica]:
+        """Replicas within the lag limit that applied the planned state."""
+        return [replica for replica in self.replicas if self.within_lag(replica) and replica.position >= self.floor]
+
+    async def pin(self) -> asyncpg.Pool:
+        """Picks the planner and sets the floor of the replica positions, returns the planner."""
+        await self.refresh()
+        candidates = [replica for replica in self.replicas if self.within_lag(replica)]
+        if candidates:
+            planner = min(candidates, key=lambda replica: replica.position)
+            self.planner, self.floor = planner.pool, planner.position
+            logger.info(f"ReplicaPool.pin: Planning on replica {planner.name}")
+        else:
+            self.planner = self.primary
+            self.floor, _ = await self.position(self.primary)
+            logger.warning(f"ReplicaPool.pin: No replica lags less than {self.max_lag}s, planning on the primary")
+        return self.planner
+
+    def choose(self) -> Replica | None:
+        usable = self.usable()
+        return min(usable, key=lambda replica: replica.outstanding) if usable else None
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        """Acquires a connection of the least busy usable replica, of the primary when none is usable."""
+        if time.monotonic() - self.refreshed >= self.refresh_interval:
+            await self.refresh(self.refresh_interval)
+        replica = self.choose()
+        if replica is None:
+            REPLICA_FALLBACKS.inc()
+            async with self.primary.acquire() as conn:
+                yield conn
+            return
+        replica.outstanding += 1
+        try:
+            async with AsyncExitStack() as stack:
+                try:
+                    conn = await stack.enter_async_context(replica.pool.acquire())
+                except (OSError, asyncpg.PostgresError):
+                    # Skipped until the next refresh finds it reachable again
+                    replica.lag = None
+                    raise
+                yield conn
+        finally:
+            replica.outstanding -= 1
+
+    def get_max_size(self) -> int:
+        return self.primary.get_max_size() + sum(replica.pool.get_max_size() for replica in self.replicas)
+
+    async def close(self) -> None:
+        """Closes the replica pools, the primary pool is left to its owner."""
+        await asyncio.gather(*(replica.pool.close() for replica in self.replicas))
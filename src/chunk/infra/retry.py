@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass
+
+from src.chunk.domain.facility.storage import Fetcher, IdRange, Loader, MultipartSaver, Saver, Store, Uploader
+from src.chunk.infra.metrics import HEDGES, RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Retries a failed call with exponentially growing delays. Every delay is drawn uniformly below its
+    exponential bound (full jitter), so chunks that failed together do not retry in lockstep.
+    """
+
+    attempts: int = 3
+    base_delay: float = 0.2
+    max_delay: float = 5.0
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))  # noqa: S311
+
+    async def call(self, operation: str, call: Callable[[], Awaitable]):
+        """
+        Awaits `call` until it neither raises nor returns False, and returns the last result.
+        The exception of the last attempt is raised.
+        """
+        for attempt in range(self.attempts):
+            last = attempt == self.attempts - 1
+            try:
+                result = await call()
+            except Exception as e:
+                if last:
+                    raise
+                logger.warning(f"RetryPolicy.call: {operation} failed on attempt {attempt + 1}: {e}")
+            else:
+                if result is not False or last:
+                    return result
+                logger.warning(f"RetryPolicy.call: {operation} failed on attempt {attempt + 1}")
+            RETRIES.inc(operation=operation)
+            await asyncio.sleep(self.delay(attempt))
+        raise ValueError("RetryPolicy.attempts must be at least 1")
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful requests."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.samples: deque[float] = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, percentile: float) -> float | None:
+        """The latency below which `percentile` percent of the samples fall, None until enough are seen."""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+class RetryingFetcher(Fetcher):
+    """Retries failed chunk fetches and hashes. Streams are passed through, half a stream cannot be replayed."""
+
+    def __init__(self, fetcher: Fetcher, policy: RetryPolicy):
+        self.fetcher = fetcher
+        self.policy = policy
+
+    async def fetch_data(self, id_range: IdRange, table: str) -> list:
+        return await self.policy.call("fetch_data", lambda: self.fetcher.fetch_data(id_range, table))
+
+    async def fetch_ids(self, ids: list[int], table: str) -> list:
+        return await self.policy.call("fetch_ids", lambda: self.fetcher.fetch_ids(ids, table))
+
+    def stream_data(self, id_range: IdRange, table: str, batch_size: int) -> AsyncIterator[list]:
+        return self.fetcher.stream_data(id_range, table, batch_size)
+
+    async def hash_data(self, id_range: IdRange, table: str) -> str | None:
+        return await self.policy.call("hash_data", lambda: self.fetcher.hash_data(id_range, table))
+
+
+class RetryingSaver(Saver):
+    """
+    Retries failed uploads and hedges slow ones.
+
+    With a hedge percentile, an upload still running after that percentile of the recent upload latencies
+    gets a duplicate request for the same key. The first one to succeed wins and the other is cancelled,
+    so one stuck PUT does not hold up the chunk. Writing an object twice with the same content is harmless.
+    """
+
+    def __init__(self, saver: Saver, policy: RetryPolicy, hedge_percentile: float = 0.0):
+        self.saver = saver
+        self.policy = policy
+        self.hedge_percentile = hedge_percentile
+        self.latencies = LatencyWindow()
+
+    async def save_data(self, data: bytes | str, file_name: str) -> bool:
+        return await self.policy.call("save_data", lambda: self.hedged(data, file_name))
+
+    async def hedged(self, data: bytes | str, file_name: str) -> bool:
+        if not self.hedge_percentile:
+            return await self.saver.save_data(data, file_name)
+        start = time.perf_counter()
+        delay = self.latencies.percentile(self.hedge_percentile)
+        pending = {asyncio.create_task(self.saver.save_data(data, file_name))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                logger.debug(f"RetryingSaver.hedged: {file_name} slower than {delay:.3f}s, hedging")
+                HEDGES.inc(operation="save_data")
+                pending.add(asyncio.create_task(self.saver.save_data(data, file_name)))
+            while True:
+                for task in done:
+                    if task.exception() is None and task.result():
+                        self.latencies.add(time.perf_counter() - start)
+                        return True
+                if not pending:
+                    # Every request failed, report the outcome of the last one
+                    return task.result()
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class RetryingUploader(RetryingSaver, MultipartSaver):
+    """
+    Retries failed uploads of chunk files, single PUTs as well as every step of a multipart upload.
+    A part uploaded again under its number replaces the earlier one.
+    """
+
+    saver: Uploader
+
+    async def create_upload(self, file_name: str) -> str:
+        return await self.policy.call("create_upload", lambda: self.saver.create_upload(file_name))
+
+    async def upload_part(self, file_name: str, upload_id: str, part_number: int, data: bytes) -> str:
+        return await self.policy.call(
+            "upload_part", lambda: self.saver.upload_part(file_name, upload_id, part_number, data)
+        )
+
+    async def complete_upload(self, file_name: str, upload_id: str, etags: list[str]) -> bool:
+        return await self.policy.call(
+            "complete_upload", lambda: self.saver.complete_upload(file_name, upload_id, etags)
+        )
+
+    async def abort_upload(self, file_name: str, upload_id: str) -> None:
+        await self.policy.call("abort_upload", lambda: self.saver.abort_upload(file_name, upload_id))
+
+
+class RetryingStore(RetryingSaver, Loader):
+    """Retries failed saves and loads of metadata files, manifests and high-water marks."""
+
+    saver: Store
+
+    async def load_data(self, file_name: str) -> str | None:
+        return await self.policy.call("load_data", lambda: self.saver.load_data(file_name))
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+
+from aioboto3.session import Session
+from aiobotocore.config import AioConfig
+from botocore.exceptions import ClientError
+
+from src.chunk.domain.facility.storage import Loader, Saver, Uploader
+from src.chunk.infra.metrics import RETRIES, S3_POOL_SIZE, S3_REQUEST_SECONDS, S3_REQUESTS, S3_REQUESTS_PEAK
+
+logger = logging.getLogger(__name__)
+
+
+class S3Client:
+    """
+    One S3 client for the whole run, so uploads reuse its connection pool instead of paying for
+    client construction, endpoint resolution and a TLS handshake on every call. Operators of
+    several buckets and feeds can share it.
+    """
+
+    session: Session
+    max_pool_connections: int
+
+    def __init__(self, session: Session, max_pool_connections: int = 10):
+        self.session = session
+        self.max_pool_connections = max_pool_connections
+        self._client = None
+        self._exit_stack = AsyncExitStack()
+        self._lock = asyncio.Lock()
+
+    async def get(self):
+        """Returns the S3 client, creating it on first use."""
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    self._client = await self._exit_stack.enter_async_context(
+                        self.session.client("s3", config=AioConfig(max_pool_connections=self.max_pool_connections))
+                    )
+                    logger.debug(f"S3Client.get: S3 client created with {self.max_pool_connections} connections")
+        return self._client
+
+    async def close(self) -> None:
+        """Closes the S3 client and its connection pool."""
+        await self._exit_stack.aclose()
+        self._client = None
+
+
+class S3Operator:
+    """
+    Reads and writes the objects of one bucket under an optional key prefix. Without a shared
+    `s3` client the operator owns a client of its own.
+    """
+
+    bucket: str
+    prefix: str
+    s3: S3Client
+    success_http_code: int = 200
+
+    def __init__(
+        self,
+        session: Session | None = None,
+        bucket: str = "",
+        max_pool_connections: int = 10,
+        prefix: str = "",
+        s3: S3Client | None = None,
+    ):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.s3 = s3 or S3Client(session, max_pool_connections)
+        S3_POOL_SIZE.set(self.s3.max_pool_connections, client=type(self).__name__)
+
+    async def client(self):
+        """Returns the S3 client, creating it on first use."""
+        return await self.s3.get()
+
+    async def request(self, operation: str, **kwargs) -> dict:
+        """
+        Sends one request of the bucket through the shared client, timing it and counting the
+        attempts botocore retried on its own. Object keys are placed under the operator prefix.
+        """
+        s3_client = await self.client()
+        if "Key" in kwargs:
+            kwargs["Key"] = f"{self.prefix}{kwargs['Key']}"
+        with (
+            S3_REQUEST_SECONDS.time(operation=operation),
+            S3_REQUESTS.track(S3_REQUESTS_PEAK, client=type(self).__name__),
+        ):
+            res = await getattr(s3_client, operation)(Bucket=self.bucket, **kwargs)
+        if retries := res.get("ResponseMetadata", {}).get("RetryAttempts", 0):
+            RETRIES.inc(retries, operation=operation)
+        return res
+
+    async def close(self) -> None:
+        """Closes the S3 client and its connection pool."""
+        await self.s3.close()
+
+
+class AWSOperator(S3Operator, Uploader):
+    async def exists(self, file_name: str) -> bool:
+        """Tells whether an object was already uploaded under the key."""
+        try:
+            await self.request("head_object", Key=file_name)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in {"404", "NoSuchKey", "NotFound"}:
+                return False
+            raise
+        return True
+
+    async def save_data(self, data: bytes | str, file_name: str) -> bool:
+        """Uploads gzip data to S3 asynchronously."""
+        res = await self.request(
+            "put_object", Key=file_name, Body=data, ContentType="application/json", ContentEncoding="gzip"
+        )
+        logger.debug(f"AWSOperator.save_data: File {file_name} uploaded to S3")
+        status = res.get("ResponseMetadata", {}).get("HTTPStatusCode", False)
+        return status == self.success_http_code
+
+    async def create_upload(self, file_name: str) -> str:
+        """Starts a multipart upload of a gzip file and returns its upload id."""
+        res = await self.request(
+            "create_multipart_upload", Key=file_name, ContentType="application/json", ContentEncoding="gzip"
+        )
+        logger.debug(f"AWSOperator.create_upload: Multipart upload of {file_name} started")
+        return res["UploadId"]
+
+    async def upload_part(self, file_name: str, upload_id: str, part_number: int, data: bytes) -> str:
+        """Uploads one part of a multipart upload and returns its ETag."""
+        res = await self.request("upload_part", Key=file_name, UploadId=upload_id, PartNumber=part_number, Body=data)
+        logger.debug(f"AWSOperator.upload_part: Part {part_number} of {file_name} uploaded to S3")
+        return res["ETag"]
+
+    async def complete_upload(self, file_name: str, upload_id: str, etags: list[str]) -> bool:
+        """Assembles the uploaded parts into the final object."""
+        res = await self.request(
+            "complete_multipart_upload",
+            Key=file_name,
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [{"ETag": etag, "PartNumber": number} for number, etag in enumerate(etags, start=1)]
+            },
+        )
+        logger.debug(f"AWSOperator.complete_upload: File {file_name} uploaded to S3 in {len(etags)} parts")
+        status = res.get("ResponseMetadata", {}).get("HTTPStatusCode", False)
+        return status == self.success_http_code
+
+    async def abort_upload(self, file_name: str, upload_id: str) -> None:
+        """Discards the parts of an unfinished multipart upload."""
+        await self.request("abort_multipart_upload", Key=file_name, UploadId=upload_id)
+        logger.debug(f"AWSOperator.abort_upload: Multipart upload of {file_name} aborted")
+
+
+class MetadataOperator(S3Operator, Saver, Loader):
+    async def save_data(self, data: bytes | str, file_name: str) -> bool:
+        """Uploads data to S3 asynchronously."""
+        res = await self.request("put_object", Key=file_name, Body=data, ContentType="application/json")
+        logger.debug(f"MetadataOperator.save_data: Metadata file {file_name} uploaded to S3")
+        status = res.get("ResponseMetadata", {}).get("HTTPStatusCode", False)
+        return status == self.success_http_code
+
+    async def load_data(self, file_name: str) -> str | None:
+        """Downloads a metadata file from S3, returns None if it does not exist."""
+        s3_client = await self.client()
+        try:
+            res = await self.request("get_object", Key=file_name)
+        except s3_client.exceptions.NoSuchKey:
+            return None
+        async with res["Body"] as stream:
+            data = await stream.read()
+        logger.debug(f"MetadataOperator.load_data: Metadata file {file_name} downloaded from S3")
+        return data.decode("utf-8")
@@ -0,0 +1,58 @@
+import logging
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotPool:
+    """
+    Connection pool whose connections all read the database as of one instant.
+
+    `export` opens a REPEATABLE READ transaction on a connection held for the whole export and exports
+    its snapshot. Every connection acquired afterwards runs in a read-only REPEATABLE READ transaction
+    importing that snapshot, so planning, hashing and fetching on parallel connections see the same rows
+    and a row that moves or changes mid-export is neither duplicated nor missed.
+
+    The held transaction keeps vacuum from removing row versions newer than the snapshot until `close`.
+    """
+
+    pool: asyncpg.Pool
+    snapshot: str | None
+
+    def __init__(self, pool: asyncpg.Pool):
+        self.pool = pool
+        self.snapshot = None
+        self.holder = AsyncExitStack()
+
+    async def export(self) -> str:
+        """Starts the transaction holding the snapshot and returns the snapshot id."""
+        conn = await self.holder.enter_async_context(self.pool.acquire())
+        await self.holder.enter_async_context(conn.transaction(isolation="repeatable_read", readonly=True))
+        self.snapshot = await conn.fetchval("SELECT pg_export_snapshot()")
+        logger.info(f"SnapshotPool.export: Reading snapshot {self.snapshot}")
+        return self.snapshot
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        """Acquires a connection reading the exported snapshot, a plain one before `export`."""
+        async with self.pool.acquire() as conn:
+            if self.snapshot is None:
+                yield conn
+                return
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                await conn.execute(f"SET TRANSACTION SNAPSHOT '{self.snapshot}'")
+                yield conn
+
+    def get_max_size(self) -> int:
+        return self.pool.get_max_size()
+
+    async def close(self) -> None:
+        """Ends the transaction holding the snapshot and closes the pool."""
+        self.snapshot = None
+        try:
+            await self.holder.aclose()
+        finally:
+            await self.pool.close()
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import shutil
+import time
+import uuid
+from collections.abc import Iterator
+from pathlib import Path
+
+from src.chunk.domain.facility.storage import MultipartSaver, Saver, Uploader
+from src.chunk.infra.metrics import SPOOLED_FILES
+from src.chunk.infra.retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+# Files still being written, a spooled file only appears under its key once it is complete
+SPOOLING_SUFFIX = ".spooling"
+
+
+class SpoolSaver(Saver, MultipartSaver):
+    """
+    Writes compressed files to a local spool directory instead of uploading them, so encoding is bound
+    by the CPU and the disk rather than by S3. `SpoolSync` uploads the spool afterwards.
+
+    Every file is written under a temporary name and moved to its key with an atomic rename (`os.replace`), so the spool
+    only ever holds complete files. Files left in the spool by a failed sync are uploaded by the next one.
+    """
+
+    root: Path
+    spooled: set[str]
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.spooled = set()
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Half-written files of an interrupted run, their chunks are exported again
+        for path in self.root.rglob(f"*{SPOOLING_SUFFIX}"):
+            path.unlink()
+
+    def path(self, file_name: str) -> Path:
+        return self.root / file_name
+
+    def spooling(self, file_name: str, upload_id: str = "") -> Path:
+        path = self.path(file_name)
+        return path.with_name(f"{path.name}.{upload_id or uuid.uuid4().hex}{SPOOLING_SUFFIX}")
+
+    def write(self, data: bytes | str, file_name: str) -> None:
+        spooling = self.spooling(file_name)
+        spooling.parent.mkdir(parents=True, exist_ok=True)
+        spooling.write_bytes(data.encode("utf-8") if isinstance(data, str) else data)
+        spooling.replace(self.path(file_name))
+        self.spooled.add(file_name)
+
+    async def save_data(self, data: bytes | str, file_name: str) -> bool:
+        """Spools a complete file."""
+        try:
+            await asyncio.to_thread(self.write, data, file_name)
+        except OSError as e:
+            logger.error(f"SpoolSaver.save_data: Failed to spool {file_name}: {e}")
+            return False
+        logger.debug(f"SpoolSaver.save_data: File {file_name} spooled")
+        return True
+
+    async def create_upload(self, file_name: str) -> str:
+        """Starts spooling a file written part by part, returns the id of its temporary file."""
+        upload_id = uuid.uuid4().hex
+        spooling = self.spooling(file_name, upload_id)
+        spooling.parent.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(spooling.touch)
+        return upload_id
+
+    async def upload_part(self, file_name: str, upload_id: str, part_number: int, data: bytes) -> str:
+        """Writes a part to a file of its own, parts of one file may be written concurrently and out of order."""
+        await asyncio.to_thread(self.spooling(file_name, f"{upload_id}_{part_number}").write_bytes, data)
+        return str(part_number)
+
+    async def complete_upload(self, file_name: str, upload_id: str, etags: list[str]) -> bool:
+        """Joins the written parts in order and moves them to the key of the file."""
+
+        def assemble() -> None:
+            spooling = self.spooling(file_name, upload_id)
+            with spooling.open("ab") as file:
+                for etag in etags:
+                    part = self.spooling(file_name, f"{upload_id}_{etag}")
+                    with part.open("rb") as data:
+                        shutil.copyfileobj(data, file)
+                    part.unlink()
+            spooling.replace(self.path(file_name))
+
+        await asyncio.to_thread(assemble)
+        self.spooled.add(file_name)
+        logger.debug(f"SpoolSaver.complete_upload: File {file_name} spooled in {len(etags)} parts")
+        return True
+
+    async def abort_upload(self, file_name: str, upload_id: str) -> None:
+        """Discards the parts of an unfinished file."""
+
+        def discard() -> None:
+            spooling = self.spooling(file_name, upload_id)
+            for path in spooling.parent.glob(f"{self.path(file_name).name}.{upload_id}*{SPOOLING_SUFFIX}"):
+                path.unlink(missing_ok=True)
+
+        await asyncio.to_thread(discard)
+
+    def files(self) -> list[Path]:
+        """Complete files of the spool, oldest first."""
+        paths = [path for path in self.root.rglob("*") if path.is_file() and path.suffix != SPOOLING_SUFFIX]
+        return sorted(paths, key=lambda path: path.stat().st_mtime)
+
+    def key(self, path: Path) -> str:
+        return path.relative_to(self.root).as_posix()
+
+
+class SpoolSync:
+    """
+    Uploads the spooled files with up to `concurrency` streams at once and removes every uploaded file.
+
+    Files larger than `part_size` are uploaded in parts, so no stream holds more than one part in memory.
+    A key that already exists is not uploaded again: file names are unique, so the object is the spooled
+    file, uploaded by a sync that was interrupted before removing it. Only files left over by an earlier
+    run and retried uploads are checked, the ones spooled by this process are new.
+    """
+
+    spool: SpoolSaver
+    target: Uploader
+    concurrency: int
+    part_size: int
+    policy: RetryPolicy
+
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        spool: SpoolSaver,
+        target: Uploader,
+        concurrency: int,
+        part_size: int,
+        policy: RetryPolicy | None = None,
+    ):
+        self.spool = spool
+        self.target = target
+        self.concurrency = concurrency
+        self.part_size = part_size
+        self.policy = policy or RetryPolicy()
+        self.attempted: set[str] = set()
+
+    async def sync(self) -> bool:
+        """Uploads the whole spool, returns whether no file is left behind."""
+        start = time.perf_counter()
+        files = await asyncio.to_thread(self.spool.files)
+        pending = iter(files)
+        workers = min(self.concurrency, len(files))
+        failed = sum(await asyncio.gather(*(self.worker(pending) for _ in range(workers))))
+        if failed:
+            logger.error(f"SpoolSync.sync: {failed} of {len(files)} spooled files were not uploaded")
+            return False
+        logger.info(f"SpoolSync.sync: {len(files)} spooled files synced in {time.perf_counter() - start:.3f}s")
+        return True
+
+    async def worker(self, pending: Iterator[Path]) -> int:
+        """Uploads spooled files until none are left, returns how many failed."""
+        failed = 0
+        for path in pending:
+            key = self.spool.key(path)
+            try:
+                uploaded = await self.policy.call("sync", lambda path=path, key=key: self.upload(path, key))
+            except Exception as e:
+                logger.error(f"SpoolSync.worker: Failed to upload {key}: {e}")
+                uploaded = False
+            if not uploaded:
+                SPOOLED_FILES.inc(outcome="failed")
+                failed += 1
+                continue
+            await asyncio.to_thread(path.unlink)
+        return failed
+
+    async def upload(self, path: Path, key: str) -> bool:
+        unknown = key not in self.spool.spooled or key in self.attempted
+        self.attempted.add(key)
+        if unknown and await self.target.exists(key):
+            SPOOLED_FILES.inc(outcome="skipped")
+            logger.debug(f"SpoolSync.upload: {key} already exists")
+            return True
+        if path.stat().st_size > self.part_size:
+            uploaded = await self.upload_parts(path, key)
+        else:
+            uploaded = await self.target.save_data(await asyncio.to_thread(path.read_bytes), key)
+        if uploaded:
+            SPOOLED_FILES.inc(outcome="uploaded")
+        return uploaded
+
+    async def upload_parts(self, path: Path, key: str) -> bool:
+        upload_id = await self.target.create_upload(key)
+        etags = []
+        try:
+            with path.open("rb") as file:
+                while part := await asyncio.to_thread(file.read, self.part_size):
+                    etags.append(await self.target.upload_part(key, upload_id, len(etags) + 1, part))
+            completed = await self.target.complete_upload(key, upload_id, etags)
+        except Exception:
+            await self.target.abort_upload(key, upload_id)
+            raise
+        if not completed:
+            await self.target.abort_upload(key, upload_id)
+        return completed
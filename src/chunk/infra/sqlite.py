@@ -0,0 +1,26 @@
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """
+    Local SQLite file shared by the event loop and executor threads.
+    Statements run in autocommit mode unless a transaction is opened explicitly.
+    """
+
+    path: str
+    schema: str = ""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.schema)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _execute(self, query: str, *args) -> list[tuple]:
+        with self.lock:
+            return self.conn.execute(query, args).fetchall()
@@ -0,0 +1,124 @@
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+from importlib.machinery import ModuleSpec
+from types import ModuleType
+
+# Profile of this process, set by `install`
+_profile: "StartupProfile | None" = None
+
+
+class TimedLoader:
+    """Wraps the loader of a module to time its execution, every other attribute is the wrapped loader's."""
+
+    def __init__(self, loader, profile: "StartupProfile"):
+        self.loader = loader
+        self.profile = profile
+
+    def __getattr__(self, name: str):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec: ModuleSpec) -> ModuleType | None:
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        # The module only sees its own loader once it is loaded
+        with self.profile.importing(module.__name__):
+            try:
+                self.loader.exec_module(module)
+            finally:
+                module.__loader__ = self.loader
+                if module.__spec__ is not None:
+                    module.__spec__.loader = self.loader
+
+
+class ImportTimer(MetaPathFinder):
+    """Finds modules with the finders after it and wraps their loaders in a `TimedLoader`."""
+
+    def __init__(self, profile: "StartupProfile"):
+        self.profile = profile
+
+    def find_spec(self, name: str, path, target: ModuleType | None = None) -> ModuleSpec | None:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = TimedLoader(spec.loader, self.profile)
+            return spec
+        return None
+
+
+class StartupProfile:
+    """
+    Measures where the start of a run goes: how long every module takes to import, without the modules
+    it imports itself, and when the first occurrence of each event happens, e.g. the first fetched chunk.
+    Times are in seconds since the profile was created.
+    """
+
+    start: float
+    imports: dict[str, float]
+    events: dict[str, float]
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.imports = {}
+        self.events = {}
+        # Time spent in nested imports, per import in progress of every thread
+        self.nested = threading.local()
+        self.timer = ImportTimer(self)
+
+    @contextmanager
+    def importing(self, name: str) -> Iterator[None]:
+        """Times one module import, the time of the imports nested in it is left to those modules."""
+        if not hasattr(self.nested, "stack"):
+            self.nested.stack = [0.0]
+        stack = self.nested.stack
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            stack[-1] += elapsed
+            self.imports[name] = elapsed - nested
+
+    def mark(self, event: str) -> None:
+        """Records the first time `event` happens."""
+        self.events.setdefault(event, time.perf_counter() - self.start)
+
+    def report(self, top: int = 15) -> str:
+        """The slowest imports and the events, as lines of text."""
+        lines = [f"import time {sum(self.imports.values()):.3f}s in {len(self.imports)} modules"]
+        slowest = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)[:top]
+        lines += [f"  {seconds * 1000:8.1f} ms  {name}" for name, seconds in slowest]
+        lines += [f"{event} after {seconds:.3f}s" for event, seconds in self.events.items()]
+        return "\n".join(lines)
+
+
+def install() -> StartupProfile:
+    """Starts profiling this process, imports are only timed from now on."""
+    global _profile  # noqa: PLW0603
+    if _profile is None:
+        _profile = StartupProfile()
+        sys.meta_path.insert(0, _profile.timer)
+    return _profile
+
+
+def uninstall() -> None:
+    global _profile  # noqa: PLW0603
+    if _profile is not None:
+        sys.meta_path.remove(_profile.timer)
+        _profile = None
+
+
+def mark(event: str) -> None:
+    """Records the first time `event` happens, a no-op unless a profile is installed."""
+    if _profile is not None:
+        _profile.mark(event)
@@ -1,98 +1,225 @@
+import json
 import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from datetime import datetime
+from itertools import pairwise
 
 import asyncpg
-from aioboto3.session import Session
 
-from src.chunk.domain.facility.storage import Fetcher, Saver
+from src.chunk.domain.facility.storage import Fetcher, IdRange, Loader, Shard
+from src.chunk.infra.metrics import (
+    DB_CONNECTIONS,
+    DB_CONNECTIONS_PEAK,
+    DB_QUERY_SECONDS,
+)
+from src.chunk.infra.startup import mark
+from src.chunk.infra.transform import FACILITY_SPEC, EntitySpec
 
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def acquire(pool: asyncpg.Pool) -> AsyncIterator[asyncpg.Connection]:
+    """Acquires a pool connection and counts it as in use until it is released."""
+    async with pool.acquire() as conn:
+        with DB_CONNECTIONS.track(DB_CONNECTIONS_PEAK):
+            yield conn
+
+
+def shard_filter(shard: Shard) -> str:
+    """Builds the condition restricting a WHERE clause to the ids of a shard, empty for an unsharded export."""
+    if shard.count == 1:
+        return ""
+    return f" AND id % {shard.count} = {shard.index}"
+
+
+def range_filter(id_range: IdRange, delta_column: str, shard: Shard = Shard()) -> tuple[str, list]:
+    """Builds the WHERE clause selecting the rows of an id range and its arguments."""
+    if id_range.since is None:
+        return f"id >= $1 AND id < $2{shard_filter(shard)}", [id_range.lo, id_range.hi]
+    return (
+        f"id >= $1 AND id < $2 AND {delta_column} > $3{shard_filter(shard)}",
+        [id_range.lo, id_range.hi, id_range.since],
+    )
+
+
 class PostgresOperator(Fetcher):
     pool: asyncpg.Pool
+    columns: tuple[str, ...] | None
+    delta_column: str
+    column_map: dict[str, str]
+    shard: Shard
 
-    def __init__(self, pool: asyncpg.Pool):
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        pool: asyncpg.Pool,
+        columns: tuple[str, ...] | None = None,
+        delta_column: str = "updated_at",
+        column_map: dict[str, str] | None = None,
+        shard: Shard | None = None,
+    ):
+        """
+        `columns` limits the selected columns to the ones the payload maps, all columns are selected by default.
+        Delta ranges only select rows whose `delta_column` is past the range high-water mark.
+        `column_map` names the table column holding a payload column whose name differs, `id` is never mapped.
+        A `shard` only selects the rows of its slice of the ids.
+        """
         self.pool = pool
+        self.columns = columns
+        self.delta_column = delta_column
+        self.column_map = column_map or {}
+        self.shard = shard or Shard()
+
+    def source(self, column: str) -> str:
+        """Returns the table column holding a payload column."""
+        return self.column_map.get(column, column)
+
+    def select_list(self) -> str:
+        """Returns the projected columns, mapped columns are renamed to their payload names."""
+        if not self.columns:
+            return "*"
+        return ", ".join(
+            column if self.source(column) == column else f"{self.source(column)} AS {column}" for column in self.columns
+        )
+
+    def query(self, table: str, id_range: IdRange) -> tuple[str, list]:
+        """Builds the id range query with the projected columns and its arguments."""
+        where, args = range_filter(id_range, self.delta_column, self.shard)
+        return f"SELECT {self.select_list()} FROM {table} WHERE {where} ORDER BY id", args  # noqa S608
 
-    async def fetch_data(self, offset: int, limit: int, table: str) -> list[dict]:
-        """Fetch a chunk of facility records."""
-        rows = await self.get_rows(offset, limit, table)
+    async def fetch_data(self, id_range: IdRange, table: str) -> list:
+        """
+        Fetch a chunk of facility records.
+        Records are handed over as is, they support the same lookups by column name as a dict.
+        """
+        rows = await self.get_rows(id_range, table)
         logger.debug(f"PostgresOperator.fetch_data: {len(rows)} rows were fetched.")
-        return [dict(row) for row in rows]
+        return rows
 
-    async def get_rows(self, offset: int, limit: int, table: str):
+    async def fetch_ids(self, ids: list[int], table: str) -> list:
         """
-        Fetches a paginated list of records from the database.
+        Fetches the records of the given ids, e.g. the rows reported changed. Ids whose rows are gone are skipped.
         """
-        start = datetime.now()
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(f"SELECT * FROM {table} WHERE id > $1 ORDER BY id LIMIT $2", offset, limit)  # noqa S608
+        with DB_QUERY_SECONDS.time(query="fetch_ids"):
+            async with acquire(self.pool) as conn:
+                rows = await conn.fetch(
+                    f"SELECT {self.select_list()} FROM {table} WHERE id = ANY($1::bigint[]) ORDER BY id",  # noqa S608
+                    ids,
+                )
+        mark("first fetch")
+        logger.debug(f"PostgresOperator.fetch_ids: {len(rows)} of {len(ids)} rows were fetched.")
+        return rows
+
+    async def get_rows(self, id_range: IdRange, table: str):
+        """
+        Fetches all records whose id falls into the given `[lo, hi)` range.
+        """
+        with DB_QUERY_SECONDS.time(query="fetch") as timer:
+            async with acquire(self.pool) as conn:
+                query, args = self.query(table, id_range)
+                rows = await conn.fetch(query, *args)
+        mark("first fetch")
         logger.debug(
             f"PostgresOperator.get_rows: {len(rows)} rows were fetched."
-            f" Offset: {offset}. Chunk {limit}. Time: {(datetime.now() - start).total_seconds()}"
+            f" Range: {id_range.lo}-{id_range.hi}. Time: {timer.seconds}"
         )
         return rows
 
+    async def hash_data(self, id_range: IdRange, table: str) -> str | None:
+        """
+        Hashes the selected content of the range inside Postgres, so an unchanged chunk can be
+        recognized without transferring its rows. Returns None for an empty range.
+        """
+        query, args = self.query(table, id_range)
+        with DB_QUERY_SECONDS.time(query="hash"):
+            async with acquire(self.pool) as conn:
+                digest = await conn.fetchval(
+                    # Rows of the ordered subquery are aggregated in its order
+                    f"SELECT md5(string_agg(q::text, E'\\n')) FROM ({query}) AS q",  # noqa S608
+                    *args,
+                )
+        logger.debug(f"PostgresOperator.hash_data: Range {id_range.lo}-{id_range.hi} hash {digest}")
+        return digest
 
-class AWSOperator(Saver):
-    session: Session
-    bucket: str
-    success_http_code: int = 200
+    async def stream_data(self, id_range: IdRange, table: str, batch_size: int) -> AsyncIterator[list]:
+        """
+        Streams the records of the range through a single server-side cursor, `batch_size` records at a time.
+        """
+        fetched = 0
+        async with acquire(self.pool) as conn, conn.transaction(readonly=True):
+            query, args = self.query(table, id_range)
+            cursor = await conn.cursor(query, *args)
+            while True:
+                with DB_QUERY_SECONDS.time(query="stream"):
+                    rows = await cursor.fetch(batch_size)
+                if not rows:
+                    break
+                fetched += len(rows)
+                mark("first fetch")
+                yield rows
+        logger.debug(f"PostgresOperator.stream_data: {fetched} rows were streamed. Range: {id_range.lo}-{id_range.hi}")
 
-    def __init__(self, session: Session, bucket: str):
-        self.session = session
-        self.bucket = bucket
 
-    async def save_data(self, data: bytes | str, file_name: str) -> bool:
-        """Uploads gzip data to S3 asynchronously."""
-        start = datetime.now()
-        async with self.session.client("s3") as s3_client:
-            res = await s3_client.put_object(
-                Bucket=self.bucket, Key=file_name, Body=data, ContentType="application/json", ContentEncoding="gzip"
-            )
-        logger.debug(
-            f"AWSOperator.save_data: File {file_name} uploaded to S3. Time: {(datetime.now() - start).total_seconds()}"
-        )
-        status = res.get("ResponseMetadata", {}).get("HTTPStatusCode", False)
-        return status == self.success_http_code
+class PostgresJsonOperator(PostgresOperator):
+    """
+    Lets Postgres build the feed entities with `json_build_object`, in the same shape as `ChunkPayload`.
+    Every fetched record is the JSON text of one entity, ready to be joined into the payload.
+    """
 
+    spec: EntitySpec
 
-class MetadataOperator(Saver):
-    session: Session
-    bucket: str
-    success_http_code: int = 200
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        pool: asyncpg.Pool,
+        delta_column: str = "updated_at",
+        column_map: dict[str, str] | None = None,
+        shard: Shard | None = None,
+        spec: EntitySpec = FACILITY_SPEC,
+    ):
+        """`spec` is the entity mapping of the payload, compiled to SQL instead of Python."""
+        super().__init__(pool, delta_column=delta_column, column_map=column_map, shard=shard)
+        self.spec = spec
 
-    def __init__(self, session: Session, bucket: str):
-        self.session = session
-        self.bucket = bucket
+    def select_list(self) -> str:
+        """Returns the expression encoding one feed entity per row."""
+        return self.spec.sql(self.source)
 
-    async def save_data(self, data: bytes | str, file_name: str) -> bool:
-        """Uploads data to S3 asynchronously."""
+    async def fetch_data(self, id_range: IdRange, table: str) -> list[str]:
+        """Fetch a chunk of facility entities encoded as JSON."""
+        return [row[0] for row in await super().fetch_data(id_range, table)]
 
-        start = datetime.now()
-        async with self.session.client("s3") as s3_client:
-            res = await s3_client.put_object(
-                Bucket=self.bucket,
-                Key=file_name,
-                Body=data,
-                ContentType="application/json",
-            )
-        logger.debug(
-            f"MetadataOperator.save_data: Metadata file {file_name} uploaded to S3. "
-            f"Time: {(datetime.now() - start).total_seconds()}"
-        )
-        status = res.get("ResponseMetadata", {}).get("HTTPStatusCode", False)
-        return status == self.success_http_code
+    async def fetch_ids(self, ids: list[int], table: str) -> list[str]:
+        """Fetch the facility entities of the given ids encoded as JSON."""
+        return [row[0] for row in await super().fetch_ids(ids, table)]
+
+    async def stream_data(self, id_range: IdRange, table: str, batch_size: int) -> AsyncIterator[list[str]]:
+        """Streams the range as batches of facility entities encoded as JSON."""
+        async for rows in super().stream_data(id_range, table, batch_size):
+            yield [row[0] for row in rows]
 
 
 class OffsetManager:
     offset: int | None = None
     pool: asyncpg.Pool
+    delta_column: str
+    shard: Shard
+    aligned: bool
 
-    def __init__(self, pool: asyncpg.Pool, offset: int | None = None):
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        pool: asyncpg.Pool,
+        offset: int | None = None,
+        delta_column: str = "updated_at",
+        shard: Shard | None = None,
+        aligned: bool = False,
+    ):
+        """With `aligned` ranges cover fixed id intervals, see `plan_ranges`."""
         self.pool = pool
         self.offset = offset
+        self.delta_column = delta_column
+        self.shard = shard or Shard()
+        self.aligned = aligned
 
     async def fetch_offset(self, table: str) -> int:
         """
@@ -100,8 +227,94 @@ class OffsetManager:
         """
         if self.offset:
             return self.offset
-        async with self.pool.acquire() as conn:
+        async with acquire(self.pool) as conn:
             row = await conn.fetchrow(f"SELECT MIN(id) FROM {table}")  # noqa S608
         offset = row[0] - 1 if row[0] else 0
         logger.debug(f"PostgresOperator.fetch_offset: Offset - {offset}")
         return offset
+
+    async def plan_ranges(
+        self, table: str, offset: int, chunk_size: int, since: datetime | None = None
+    ) -> list[IdRange]:
+        """
+        Splits the ids above `offset` into consecutive `[lo, hi)` ranges holding `chunk_size` rows each.
+        With `since` only rows changed after that high-water mark are planned.
+
+        Bounds are taken from the real id distribution, so gaps in the id sequence
+        never produce empty or oversized chunks. A shard only counts the rows of its own slice.
+
+        Aligned ranges cover fixed intervals of `chunk_size` ids (of every slice of a split export) instead,
+        and only the non-empty ones are planned. Inserted or deleted rows then only change the range they fall
+        into, which keeps the ranges of the chunk cache stable between runs, at the cost of chunks below
+        `chunk_size` rows wherever ids have gaps.
+        """
+        width = chunk_size * self.shard.count if self.aligned else chunk_size
+        where, args = "id > $1", [offset, width]
+        if since is not None:
+            where, args = f"id > $1 AND {self.delta_column} > $3", [*args, since]
+        where += shard_filter(self.shard)
+        if self.aligned:
+            async with acquire(self.pool) as conn:
+                rows = await conn.fetch(f"SELECT DISTINCT id / $2 FROM {table} WHERE {where} ORDER BY 1", *args)  # noqa S608
+            ranges = [IdRange(max(bucket * width, offset + 1), (bucket + 1) * width, since) for (bucket,) in rows]
+            logger.debug(f"OffsetManager.plan_ranges: {len(ranges)} aligned ranges were planned from offset {offset}")
+            return ranges
+        async with acquire(self.pool) as conn:
+            rows = await conn.fetch(
+                f"SELECT MIN(id), MAX(id) FROM ("  # noqa S608
+                f"SELECT id, (ROW_NUMBER() OVER (ORDER BY id) - 1) / $2 AS bucket FROM {table} WHERE {where}"
+                f") AS numbered GROUP BY bucket ORDER BY 1",
+                *args,
+            )
+        ranges = [IdRange(lo, next_lo, since) for (lo, _), (next_lo, _) in pairwise(rows)]
+        if rows:
+            ranges.append(IdRange(rows[-1][0], rows[-1][1] + 1, since))
+        logger.debug(f"OffsetManager.plan_ranges: {len(ranges)} ranges were planned from offset {offset}")
+        return ranges
+
+
+class WatermarkManager:
+    """
+    Persists the high-water mark of the last successful export, so a delta export only
+    selects rows whose `delta_column` moved past it.
+    """
+
+    pool: asyncpg.Pool
+    store: Loader
+    delta_column: str
+    file_name: str
+
+    def __init__(self, pool: asyncpg.Pool, store: Loader, delta_column: str, file_name: str):
+        self.pool = pool
+        self.store = store
+        self.delta_column = delta_column
+        self.file_name = file_name
+
+    async def fetch_current(self, table: str) -> datetime | None:
+        """
+        Fetches the current high-water mark of the table, to be saved once the export succeeds.
+        """
+        async with acquire(self.pool) as conn:
+            row = await conn.fetchrow(f"SELECT MAX({self.delta_column}) FROM {table}")  # noqa S608
+        logger.debug(f"WatermarkManager.fetch_current: High-water mark - {row[0]}")
+        return row[0]
+
+    async def load(self, table: str) -> datetime | None:
+        """
+        Loads the high-water mark saved by the last successful export.
+        """
+        data = await self.store.load_data(self.file_name.format(table=table))
+        if data is None:
+            logger.info(f"WatermarkManager.load: No high-water mark saved for {table}")
+            return None
+        mark = json.loads(data)["high_water_mark"]
+        return datetime.fromisoformat(mark) if mark else None
+
+    async def save(self, table: str, mark: datetime | None) -> bool:
+        """
+        Saves the high-water mark of a successful export.
+        """
+        data = json.dumps(
+            {"table": table, "column": self.delta_column, "high_water_mark": mark.isoformat() if mark else None}
+        )
+        return await self.store.save_data(data=data, file_name=self.file_name.format(table=table))
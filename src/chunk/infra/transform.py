@@ -0,0 +1,115 @@
+import hashlib
+import json
+import re
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from functools import cache
+
+from src.chunk.main.constants import FACILITY_FIELDS
+from src.chunk.main.settings import FieldSpec
+
+FIXED_POINT = re.compile(r"\.(\d+)f")
+
+
+@dataclass(frozen=True)
+class Encoder:
+    """Functions compiled from an entity spec, both take records holding the values of its `columns`."""
+
+    entity: Callable[[tuple], dict]
+    entities: Callable[[Iterable[tuple]], list[dict]]
+    source: str
+
+
+class EntitySpec:
+    """
+    Declarative mapping of table rows to feed entities.
+
+    `compile` generates the source of a function building the whole nested entity from the record
+    values as a single expression, so no walks over the spec or per-field calls are left at runtime.
+    Fetched records are read by position in `columns` order, dict records by column name.
+    """
+
+    fields: tuple[FieldSpec, ...]
+    columns: tuple[str, ...]
+
+    def __init__(self, fields: Iterable[FieldSpec | dict]):
+        self.fields = tuple(field if isinstance(field, FieldSpec) else FieldSpec(**field) for field in fields)
+        self.columns = tuple(dict.fromkeys(field.column for field in self.fields))
+        paths = [field.path for field in self.fields]
+        if len(set(paths)) < len(paths):
+            raise ValueError("Entity fields must have distinct paths")
+        self.tree()
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, EntitySpec) and self.fields == other.fields
+
+    def __hash__(self) -> int:
+        return hash(self.fields)
+
+    @property
+    def digest(self) -> str:
+        """Stable short digest of the fields, changes whenever the encoded entities would."""
+        fields = json.dumps([field.model_dump() for field in self.fields])
+        return hashlib.sha1(fields.encode(), usedforsecurity=False).hexdigest()[:12]
+
+    def tree(self) -> dict:
+        """Nests the fields by their paths, leaves are the fields themselves."""
+        tree: dict = {}
+        for field in self.fields:
+            *parents, name = field.path.split(".")
+            node = tree
+            for parent in parents:
+                node = node.setdefault(parent, {})
+                if not isinstance(node, dict):
+                    raise ValueError(f"Field path {field.path} runs through a value")
+            if name in node:
+                raise ValueError(f"Field path {field.path} is also an object")
+            node[name] = field
+        return tree
+
+    def expression(self, node: dict | FieldSpec, by_name: bool = False) -> str:
+        """Python expression building the value of a node from the record `r`, read by position or by name."""
+        if isinstance(node, FieldSpec):
+            value = f"r[{node.column!r}]" if by_name else f"r[{self.columns.index(node.column)}]"
+            if not node.format:
+                return value
+            return f'(None if {value} is None else f"{{{value}:{node.format}}}")'
+        return "{" + ", ".join(f"{name!r}: {self.expression(child, by_name)}" for name, child in node.items()) + "}"
+
+    def compile(self, by_name: bool = False) -> Encoder:
+        """Generates and compiles the encoder of the spec, `by_name` reads mappings keyed by column."""
+        return _compile(self, by_name)
+
+    def sql(self, source: Callable[[str], str]) -> str:
+        """
+        Postgres expression encoding a row as the same JSON entity, for `PostgresJsonOperator`.
+        `source` names the table column of a spec column. Only fixed-point formats can be pushed down.
+        """
+
+        def build(node: dict | FieldSpec) -> str:
+            if isinstance(node, FieldSpec):
+                column = node.column if node.column == "id" else source(node.column)
+                if not node.format:
+                    return column
+                fixed = FIXED_POINT.fullmatch(node.format)
+                if fixed is None:
+                    raise ValueError(f"Format {node.format!r} of {node.path} cannot be pushed down to Postgres")
+                return f"to_char({column}, 'FM999999999999990.{'0' * int(fixed.group(1))}')"
+            return "json_build_object(" + ", ".join(f"'{name}', {build(child)}" for name, child in node.items()) + ")"
+
+        return f"{build(self.tree())}::text"
+
+
+@cache
+def _compile(spec: EntitySpec, by_name: bool) -> Encoder:
+    """Compiles every spec once per process."""
+    expression = spec.expression(spec.tree(), by_name)
+    source = (
+        f"def entity(r):\n    return {expression}\n\ndef entities(rows):\n    return [{expression} for r in rows]\n"
+    )
+    namespace: dict = {}
+    exec(compile(source, "<entity spec>", "exec"), namespace)  # noqa: S102
+    return Encoder(entity=namespace["entity"], entities=namespace["entities"], source=source)
+
+
+FACILITY_SPEC = EntitySpec(FACILITY_FIELDS)
@@ -0,0 +1,160 @@
+import asyncio
+import gzip
+import logging
+import time
+from dataclasses import dataclass, field
+
+from src.chunk.domain.facility.storage import IdRange, MultipartSaver
+from src.chunk.infra.payload import DOCUMENT_HEAD, DOCUMENT_TAIL, RECORD_SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+# Concatenated gzip members decompress to the concatenation of their contents
+HEAD_MEMBER = gzip.compress(DOCUMENT_HEAD, mtime=0)
+SEPARATOR_MEMBER = gzip.compress(RECORD_SEPARATOR, mtime=0)
+TAIL_MEMBER = gzip.compress(DOCUMENT_TAIL, mtime=0)
+
+
+@dataclass
+class OpenFile:
+    file_name: str
+    upload_id: str
+    buffer: bytearray = field(default_factory=bytearray, repr=False)
+    # Uploads of the parts taken from the buffer, in part number order
+    parts: list[asyncio.Task[str]] = field(default_factory=list, repr=False)
+    size: int = 0
+    fragments: int = 0
+    aborted: bool = False
+    # Ranges with fragments in the file
+    ranges: set[IdRange] = field(default_factory=set)
+
+
+class RollingFileWriter:
+    """
+    Joins compressed payload fragments of many chunks into output files of a target compressed size.
+
+    Every file is streamed to a multipart upload part by part. Fragments are appended to the buffer of the open
+    file without waiting for S3, a full buffer is taken as the next part and uploaded by the writer that filled it,
+    so parts of one file upload concurrently. Only opening a file is serialized, completing it waits for its parts.
+    Each fragment is a gzip member of its own, the document head, separators and tail are added here.
+
+    A failed upload discards the whole file, with the fragments of ranges whose writes already succeeded.
+    Those ranges are collected in `discarded`, so they are exported again instead of counting as done.
+    """
+
+    saver: MultipartSaver
+    target_size: int
+    part_size: int
+    file_name_template: str = "{table}_feed_{timestamp}_{index}.json.gz"
+
+    def __init__(self, saver: MultipartSaver, target_size: int, part_size: int, table: str = "facility"):
+        self.saver = saver
+        self.target_size = target_size
+        self.part_size = part_size
+        self.table = table
+        self.file: OpenFile | None = None
+        self.files_opened = 0
+        self.discarded: set[IdRange] = set()
+        self.lock = asyncio.Lock()
+
+    async def write(self, fragment: bytes, uploaded_files: list, id_range: IdRange | None = None) -> bool:
+        """
+        Append a compressed fragment of `id_range` to the current file and roll over once it reaches the target size.
+        """
+        file = None
+        try:
+            file = await self.current()
+            # Nothing awaits until the fragment is in the buffer, so fragments of concurrent writes never interleave
+            self.append(file, SEPARATOR_MEMBER if file.fragments else HEAD_MEMBER)
+            self.append(file, fragment)
+            file.fragments += 1
+            if id_range is not None:
+                file.ranges.add(id_range)
+            part = self.take_part(file) if len(file.buffer) >= self.part_size else None
+            rolled = file.size >= self.target_size
+            if rolled:
+                # Later writes open the next file while this one completes
+                self.file = None
+            if part is not None:
+                await part
+            written = await self.complete(file, uploaded_files) if rolled else True
+        except Exception as e:
+            logger.error(f"RollingFileWriter.write: Failed to write to {file}: {e}")
+            await self.abort(file)
+            written = False
+        if not written:
+            # Reported failed by this write already
+            self.discarded.discard(id_range)
+        return written
+
+    async def close(self, uploaded_files: list) -> bool:
+        """Complete the file that is still open."""
+        async with self.lock:
+            file, self.file = self.file, None
+        if file is None:
+            return True
+        try:
+            return await self.complete(file, uploaded_files)
+        except Exception as e:
+            logger.error(f"RollingFileWriter.close: Failed to complete {file}: {e}")
+            await self.abort(file)
+            return False
+
+    async def current(self) -> OpenFile:
+        """The open file, opened first if there is none. Concurrent writes wait for one file to be opened."""
+        async with self.lock:
+            if self.file is None:
+                self.file = await self.open()
+            return self.file
+
+    async def open(self) -> OpenFile:
+        self.files_opened += 1
+        file_name = self.file_name_template.format(
+            table=self.table, timestamp=int(time.time()), index=self.files_opened
+        )
+        upload_id = await self.saver.create_upload(file_name)
+        logger.debug(f"RollingFileWriter.open: File {file_name} opened")
+        return OpenFile(file_name=file_name, upload_id=upload_id)
+
+    def append(self, file: OpenFile, data: bytes) -> None:
+        file.buffer += data
+        file.size += len(data)
+
+    def take_part(self, file: OpenFile) -> asyncio.Task[str]:
+        """Starts the upload of the buffer as the next part of the file."""
+        upload = self.saver.upload_part(file.file_name, file.upload_id, len(file.parts) + 1, bytes(file.buffer))
+        file.buffer.clear()
+        file.parts.append(asyncio.create_task(upload))
+        return file.parts[-1]
+
+    async def complete(self, file: OpenFile, uploaded_files: list) -> bool:
+        self.append(file, TAIL_MEMBER)
+        self.take_part(file)
+        etags = await asyncio.gather(*file.parts, return_exceptions=True)
+        if errors := [etag for etag in etags if isinstance(etag, BaseException)]:
+            raise errors[0]
+        if file.aborted:
+            return False
+        if not await self.saver.complete_upload(file.file_name, file.upload_id, etags):
+            logger.error(f"RollingFileWriter.complete: Failed to complete file {file.file_name}")
+            await self.abort(file)
+            return False
+        logger.debug(f"RollingFileWriter.complete: File {file.file_name} of {file.size} bytes completed")
+        uploaded_files.append(file.file_name)
+        return True
+
+    async def abort(self, file: OpenFile | None) -> None:
+        if file is None or file.aborted:
+            return
+        file.aborted = True
+        if self.file is file:
+            self.file = None
+        self.discarded.update(file.ranges)
+        if file.ranges:
+            logger.error(
+                f"RollingFileWriter.abort: Fragments of {len(file.ranges)} ranges in {file.file_name} discarded"
+            )
+        try:
+            await self.saver.abort_upload(file.file_name, file.upload_id)
+        except Exception as e:
+            logger.error(f"RollingFileWriter.abort: Failed to abort upload of {file.file_name}: {e}")
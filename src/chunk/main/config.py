@@ -1,19 +1,169 @@
 import logging
+from contextlib import AsyncExitStack
+from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
 
 import asyncpg
-from aioboto3.session import Session
+
+from src.chunk.application.services.budget import MemoryBudget
+from src.chunk.application.services.limiter import AdaptiveLimiter, ConcurrencyLimiter
+from src.chunk.domain.facility.storage import Uploader
+from src.chunk.infra.backends import backend
+from src.chunk.infra.compression import BlockGzipCompressor
+from src.chunk.infra.payload import ChunkPayload, ProcessChunkPayload, PushdownPayload
+from src.chunk.infra.replica import Replica, ReplicaPool
+from src.chunk.infra.retry import RetryPolicy
+from src.chunk.infra.snapshot import SnapshotPool
+from src.chunk.infra.spool import SpoolSaver, SpoolSync
+from src.chunk.infra.storage import PostgresJsonOperator, PostgresOperator
+from src.chunk.main.settings import Settings
+
+if TYPE_CHECKING:
+    from aioboto3.session import Session
 
 logger = logging.getLogger(__name__)
 
 
-async def get_db_pool(dsn: str) -> asyncpg.Pool:
-    """Create and return a connection pool."""
+async def get_db_pool(dsn: str, snapshot: bool = False, max_size: int = 10) -> asyncpg.Pool | SnapshotPool:
+    """Create and return a connection pool, with `snapshot` one whose connections all read one exported snapshot."""
     logger.debug(f"get_db_pool: Creating connection pool with DSN: {dsn}")
-    return await asyncpg.create_pool(dsn=dsn)
+    # The snapshot is held by a connection of its own
+    max_size += snapshot
+    pool = await asyncpg.create_pool(dsn=dsn, min_size=min(max_size, 10), max_size=max_size)
+    if not snapshot:
+        return pool
+    pool = SnapshotPool(pool)
+    try:
+        await pool.export()
+    except BaseException:
+        await pool.close()
+        raise
+    return pool
 
 
-def get_s3_session(access_key_id: str, secret_access_key: str, region: str) -> Session:
+async def get_replica_pool(settings: Settings, primary: asyncpg.Pool) -> ReplicaPool:
+    """
+    Creates a pool per replica, each large enough to serve every chunk in flight on its own
+    with a connection to spare for planning and lag measurements, and pins the planner of the export.
+    """
+    replicas = []
+    async with AsyncExitStack() as opened:
+        for dsn in settings.replica_dsns:
+            pool = await asyncpg.create_pool(
+                dsn=dsn,
+                user=settings.db_user,
+                password=settings.db_password,
+                database=settings.db_name,
+                min_size=1,
+                max_size=settings.db_pool_size,
+            )
+            opened.push_async_callback(pool.close)
+            replicas.append(Replica(pool=pool, name=urlsplit(dsn).netloc.rpartition("@")[2]))
+        pool = ReplicaPool(
+            primary=primary,
+            replicas=replicas,
+            max_lag=settings.replica_max_lag,
+            refresh_interval=settings.replica_lag_interval,
+        )
+        await pool.pin()
+        # The replica pools are closed by the caller from now on, only a failed setup closes them here
+        opened.pop_all()
+    return pool
+
+
+def get_s3_session(access_key_id: str, secret_access_key: str, region: str) -> "Session":
     """
     Creates and returns a new AWS S3 session using the provided credentials and region.
+    aioboto3 is imported here, on first use.
+    """
+    session_class = backend("s3_session")
+    return session_class(aws_access_key_id=access_key_id, aws_secret_access_key=secret_access_key, region_name=region)
+
+
+def get_fetcher(settings: Settings, pool: asyncpg.Pool, payload: ChunkPayload) -> PostgresOperator:
+    """
+    Creates the DB fetcher matching the payload engine, selecting the columns of its entity spec.
+    """
+    if settings.payload_pushdown:
+        return PostgresJsonOperator(
+            pool=pool,
+            delta_column=settings.delta_column,
+            column_map=settings.column_map,
+            shard=settings.shard,
+            spec=payload.spec,
+        )
+    return PostgresOperator(
+        pool=pool,
+        columns=payload.columns,
+        delta_column=settings.delta_column,
+        column_map=settings.column_map,
+        shard=settings.shard,
+    )
+
+
+def get_retry_policy(settings: Settings) -> RetryPolicy:
+    return RetryPolicy(
+        attempts=settings.retry_attempts, base_delay=settings.retry_base_delay, max_delay=settings.retry_max_delay
+    )
+
+
+def get_payload(settings: Settings) -> ChunkPayload:
+    """
+    Creates the payload engine: a push-down one when Postgres encodes the entities,
+    a process pool one when payload workers are configured, an in-process one otherwise.
+    Size-targeted output files are assembled from payload fragments.
+    In-process payloads are compressed in parallel blocks when a compression block size is configured.
+    """
+    fragment = bool(settings.output_file_size)
+    if settings.payload_workers and not settings.payload_pushdown:
+        logger.debug(f"get_payload: Encoding payloads in {settings.payload_workers} worker processes")
+        return ProcessChunkPayload(workers=settings.payload_workers, fragment=fragment, level=settings.compress_level)
+    compressor = None
+    if settings.compress_block_size:
+        compressor = BlockGzipCompressor(
+            level=settings.compress_level, block_size=settings.compress_block_size, threads=settings.compress_threads
+        )
+    if settings.payload_pushdown:
+        return PushdownPayload(fragment=fragment, level=settings.compress_level, compressor=compressor)
+    return ChunkPayload(
+        streaming=settings.payload_streaming, fragment=fragment, level=settings.compress_level, compressor=compressor
+    )
+
+
+def get_spool(settings: Settings, target: Uploader, policy: RetryPolicy, name: str) -> SpoolSync | None:
+    """
+    Creates the sync of the spool directory `name` of a feed, if chunk files are spooled.
+    """
+    if not settings.spool_path:
+        return None
+    return SpoolSync(
+        spool=SpoolSaver(Path(settings.spool_path) / name),
+        target=target,
+        concurrency=settings.spool_sync_concurrency,
+        part_size=settings.multipart_part_size,
+        policy=policy,
+    )
+
+
+def get_limiter(settings: Settings) -> ConcurrencyLimiter:
+    """
+    Creates the limiter of ranges in flight: an adaptive one bounded by `concurrency_limit`
+    when adaptive concurrency is enabled, a fixed one at `concurrency_limit` otherwise.
+    """
+    if settings.adaptive_concurrency:
+        return AdaptiveLimiter(
+            max_limit=settings.concurrency_limit,
+            min_limit=settings.adaptive_min_concurrency,
+            tolerance=settings.adaptive_latency_tolerance,
+        )
+    return ConcurrencyLimiter(settings.concurrency_limit)
+
+
+def get_budget(settings: Settings) -> MemoryBudget | None:
+    """
+    Creates the memory budget of the chunks in flight, if one is configured.
     """
-    return Session(aws_access_key_id=access_key_id, aws_secret_access_key=secret_access_key, region_name=region)
+    if not settings.memory_budget:
+        return None
+    return MemoryBudget(budget=settings.memory_budget, overhead=settings.memory_overhead)
@@ -1,2 +1,20 @@
-MAX_CHUNK_SIZE = 100
+MAX_CHUNK_SIZE = 50_000
+MIN_MULTIPART_PART_SIZE = 5 * 1024 * 1024
+MAX_COMPRESS_LEVEL = 9
+# Payload bytes assumed per row until the first chunks were encoded
+INITIAL_ROW_BYTES = 2048
 VALID_TABLES = ["facility"]
+# Facility row -> feed entity mapping, the default of the FIELDS setting
+FACILITY_FIELDS = (
+    {"column": "id", "path": "entity_id"},
+    {"column": "name", "path": "name"},
+    {"column": "phone", "path": "telephone"},
+    {"column": "url", "path": "url"},
+    {"column": "latitude", "path": "location.latitude", "format": ".6f"},
+    {"column": "longitude", "path": "location.longitude", "format": ".6f"},
+    {"column": "country", "path": "location.address.country"},
+    {"column": "locality", "path": "location.address.locality"},
+    {"column": "region", "path": "location.address.region"},
+    {"column": "postal_code", "path": "location.address.postal_code"},
+    {"column": "street_address", "path": "location.address.street_address"},
+)
@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import logging
 import sys
@@ -5,16 +6,47 @@ from pathlib import Path
 
 sys.path.append(Path(__file__).parent.parent.parent.parent.as_posix())
 
-from src.chunk.presentation.service import run
-
+# Only the standard library is imported up front, the service and its backends load once the arguments
+# are parsed, so --help answers at once and --startup-profile sees every import.
 logger = logging.getLogger(__name__)
 
 
+def parse_args(argv: list[str] | None = None) -> tuple[argparse.Namespace, dict]:
+    """Returns the parsed arguments and the settings overridden on the command line."""
+    parser = argparse.ArgumentParser(description="Exports the configured feeds to S3.")
+    parser.add_argument("--shard", type=int, help="slice of the ids this process exports, from 0")
+    parser.add_argument("--shards", type=int, help="number of slices the export is split into")
+    parser.add_argument("--run", help="label shared by the shards of one export")
+    parser.add_argument("--finalize", action="store_true", help="merge the manifests of all shards")
+    parser.add_argument("--daemon", action="store_true", help="keep exporting changed rows as they are notified")
+    parser.add_argument("--install-trigger", action="store_true", help="create the change triggers of the daemon")
+    parser.add_argument(
+        "--startup-profile", action="store_true", help="report the slowest imports and the time to the first fetch"
+    )
+    args = parser.parse_args(argv)
+    overrides = {"shard_index": args.shard, "shard_count": args.shards, "shard_run": args.run}
+    return args, {key: value for key, value in overrides.items() if value is not None}
+
+
 def main():
+    args, overrides = parse_args()
+    profile = None
+    if args.startup_profile:
+        from src.chunk.infra.startup import install
+
+        profile = install()
+    from src.chunk.presentation.service import run, serve
+
     try:
-        asyncio.run(run())
+        if args.daemon:
+            asyncio.run(serve(args.install_trigger, **overrides))
+        else:
+            asyncio.run(run(args.finalize, **overrides))
     except KeyboardInterrupt:
         logger.info("main: KeyboardInterrupt")
+    finally:
+        if profile is not None:
+            sys.stderr.write(f"{profile.report()}\n")
 
 
 if __name__ == "__main__":
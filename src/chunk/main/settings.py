@@ -1,9 +1,59 @@
+import re
 from functools import lru_cache
+from typing import Literal
 
-from pydantic import field_validator
+from pydantic import BaseModel, field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from src.chunk.main.constants import MAX_CHUNK_SIZE
+from src.chunk.domain.facility.storage import Shard
+from src.chunk.main.constants import (
+    FACILITY_FIELDS,
+    MAX_CHUNK_SIZE,
+    MAX_COMPRESS_LEVEL,
+    MIN_MULTIPART_PART_SIZE,
+    VALID_TABLES,
+)
+
+# Columns and paths are inlined into SQL and into the generated encoder, so only plain names are allowed
+NAME = re.compile(r"[A-Za-z_]\w*")
+PATH = re.compile(r"[A-Za-z_]\w*(\.[A-Za-z_]\w*)*")
+FORMAT_SPEC = re.compile(r"[\w.,+\- #%<>=^]*")
+
+
+class FieldSpec(BaseModel, frozen=True):
+    """
+    One field of the feed entity: the value of `column` placed at the dotted `path` of the entity,
+    formatted with the Python format spec `format` unless it is empty or the value is null.
+    """
+
+    column: str
+    path: str
+    format: str = ""
+
+    @model_validator(mode="after")
+    def plain_names(self) -> "FieldSpec":
+        """
+        Ensures the field only holds names and a format spec.
+        """
+        if not NAME.fullmatch(self.column) or not PATH.fullmatch(self.path):
+            raise ValueError(f"Invalid field {self.column} -> {self.path}")
+        if not FORMAT_SPEC.fullmatch(self.format):
+            raise ValueError(f"Invalid format spec {self.format!r} of {self.path}")
+        return self
+
+
+class FeedDefinition(BaseModel):
+    """One exported table, empty fields fall back to the top-level settings."""
+
+    table: str
+    # Payload column -> table column for the columns named differently in this table
+    columns: dict[str, str] = {}
+    bucket: str = ""
+    prefix: str = ""
+    metadata_file_name: str = ""
+    # `name` of the feed in its metadata file
+    name: str = ""
+    fields: list[FieldSpec] = []
 
 
 class Settings(BaseSettings):
@@ -22,18 +72,117 @@ class Settings(BaseSettings):
     db_host: str = "localhost"
     db_port: int = 5432
     db: str = "postgresql"
-    db_table_name: str
+    # DSNs of read replicas sharing the credentials above, chunks are fetched from them instead of the primary
+    replica_dsns: list[str] = []
+    # Replicas lagging more than that many seconds are skipped, lag is measured every `replica_lag_interval` seconds
+    replica_max_lag: float = 30.0
+    replica_lag_interval: float = 5.0
+    db_table_name: str = ""
+    # Tables a feed may export. Table names are put into the queries as they are, so only listed ones are accepted
+    valid_tables: list[str] = list(VALID_TABLES)
+    # Payload column -> table column for the columns named differently in the table
+    column_map: dict[str, str] = {}
+    # Mapping of table columns to the fields of the feed entity, as a JSON list of {"column", "path", "format"}
+    fields: list[FieldSpec] = [FieldSpec(**field) for field in FACILITY_FIELDS]
+    # Several feeds exported concurrently over shared DB and S3 connections, as a JSON list of definitions.
+    # Without it the single feed of `db_table_name` is exported
+    feeds: list[FeedDefinition] = []
+
+    # Export only slice `shard_index` of `shard_count` disjoint slices of the ids, a row belongs to `id % shard_count`.
+    # Every shard saves a partial manifest, the finalize step merges them into the metadata file
+    shard_index: int = 0
+    shard_count: int = 1
+    # Label shared by the shards of one export, e.g. the job id, so manifests of another export are never merged
+    shard_run: str = ""
+    shard_manifest_file_name: str = "manifest_{table}_{run}_{index}_of_{count}.json"
 
     concurrency_limit: int = 10
+    # Adapt the ranges in flight to the observed latency and failures, `concurrency_limit` stays the upper bound
+    adaptive_concurrency: bool = False
+    adaptive_min_concurrency: int = 1
+    # A range slower than this multiple of the fastest recent range counts as congestion
+    adaptive_latency_tolerance: float = 2.0
+    # Bytes of memory the chunks in flight may hold together, a range waits until its estimate fits. 0 disables.
+    # The estimate is `chunk_size` times the observed payload bytes per row times `memory_overhead`
+    memory_budget: int = 0
+    memory_overhead: float = 4.0
+    # Read every chunk from one exported snapshot, so parallel connections see the table as of the same instant.
+    # Holds one pool connection in a REPEATABLE READ transaction for the whole run, which also holds back vacuum
+    snapshot_reads: bool = False
+    # Rows fetched from the DB per chunk
     chunk_size: int = 100
+    # With size-targeted output files, stream every chunk through a server-side cursor in batches of that size
+    fetch_batch_size: int = 0
     offset_initial: int | None = None
 
+    # Track the high-water mark of this column after every successful run, empty disables tracking
+    delta_column: str = ""
+    # A delta feed only exports the rows whose `delta_column` moved past the saved high-water mark
+    feed_mode: Literal["full", "delta"] = "full"
+    watermark_file_name: str = "watermark_{table}.json"
+
+    # Directory chunk files are written to before a sync phase uploads them with `spool_sync_concurrency`
+    # streams, so encoding does not wait for S3. Empty uploads every file as soon as it is built.
+    # Files a failed sync left behind are uploaded by the next run.
+    spool_path: str = ""
+    spool_sync_concurrency: int = 32
+
+    # SQLite file recording completed ranges, so an interrupted export resumes, empty disables the journal
+    journal_path: str = ""
+    # SQLite file mapping content hashes of ranges to uploaded objects, so unchanged chunks are not uploaded again.
+    # Entries unused for `chunk_cache_ttl` seconds are evicted. Evicted objects are not deleted, a lifecycle rule
+    # of the bucket expires them by age: objects uploaded `chunk_cache_max_age` seconds ago are uploaded again,
+    # so it must stay below the expiration of that rule. The cache plans aligned ranges.
+    chunk_cache_path: str = ""
+    chunk_cache_ttl: int = 7 * 24 * 60 * 60
+    chunk_cache_max_age: int = 21 * 24 * 60 * 60
+
+    # Serialize records one by one straight into the compressor instead of building the whole JSON document
+    payload_streaming: bool = False
+    # Build and compress payloads in that many worker processes, 0 keeps encoding in the service process
+    payload_workers: int = 0
+    # Let Postgres encode the feed entities with json_build_object, Python only joins and compresses them
+    payload_pushdown: bool = False
+    # gzip level of the chunk files, lower levels trade ratio for compression throughput
+    compress_level: int = 9
+    # Deflate payloads in blocks of that many bytes on `compress_threads` threads, 0 compresses on a single thread.
+    # Every block becomes a gzip member of its own, the result is still one valid gzip stream
+    compress_block_size: int = 0
+    compress_threads: int = 4
+
+    # Daemon mode exports the changed rows notified within this many seconds, or once that many ids arrived, as one file
+    daemon_window: float = 1.0
+    daemon_max_batch: int = 1000
+
+    # Attempts of every chunk fetch and upload, failures are retried after exponentially growing, jittered delays
+    retry_attempts: int = 3
+    retry_base_delay: float = 0.2
+    retry_max_delay: float = 5.0
+    # Start a duplicate upload once an upload runs longer than this percentile of recent upload latencies, 0 disables
+    hedge_percentile: float = 0.0
+
+    # Staged fetch -> build -> compress -> upload mode, chunks in flight are still bounded by `concurrency_limit`
+    pipeline: bool = False
+    pipeline_queue_size: int = 2
+    pipeline_fetch_workers: int = 2
+    pipeline_build_workers: int = 1
+    pipeline_compress_workers: int = 2
+    pipeline_upload_workers: int = 4
+
     aws_bucket: str = ""
+    # Key prefix of every object the feed writes, e.g. "facility/"
+    s3_prefix: str = ""
     aws_region: str = ""
     aws_access_key_id: str = ""
     aws_secret_access_key: str = ""
 
     metadata_file_name: str = "metadata_{timestamp}.json"
+    feed_name: str = "reservewithgoogle.entity"
+    # Prometheus textfile written at the end of every run, e.g. for the node exporter textfile collector
+    metrics_textfile: str = ""
+    # Roll output files over at this compressed size in bytes instead of writing one file per chunk, 0 disables
+    output_file_size: int = 0
+    multipart_part_size: int = 8 * 1024 * 1024
 
     @field_validator("chunk_size")
     @classmethod
@@ -46,6 +195,117 @@ class Settings(BaseSettings):
             return MAX_CHUNK_SIZE
         return v
 
+    @field_validator("compress_level")
+    @classmethod
+    def valid_compress_level(cls, v: int) -> int:
+        """
+        Clamps the level to the range zlib accepts.
+        """
+        return min(max(v, 0), MAX_COMPRESS_LEVEL)
+
+    @field_validator("retry_attempts")
+    @classmethod
+    def min_retry_attempts(cls, v: int) -> int:
+        """
+        Ensures every call is attempted at least once.
+        """
+        return max(v, 1)
+
+    @field_validator("valid_tables")
+    @classmethod
+    def plain_table_names(cls, v: list[str]) -> list[str]:
+        """
+        Ensures the allowed tables are plain names, they are inlined into SQL.
+        """
+        if invalid := [table for table in v if not NAME.fullmatch(table)]:
+            raise ValueError(f"Invalid table names: {', '.join(invalid)}")
+        return v
+
+    @field_validator("multipart_part_size")
+    @classmethod
+    def min_multipart_part_size(cls, v: int) -> int:
+        """
+        Raises the part size to the S3 minimum for every part but the last one.
+        """
+        return max(v, MIN_MULTIPART_PART_SIZE)
+
+    @model_validator(mode="after")
+    def range_state_needs_chunk_files(self) -> "Settings":
+        """
+        Ensures the journal and the chunk cache are not combined with size-targeted output files.
+        Those files span many ranges and are only complete at the end of the run, so no file belongs to one range.
+        """
+        if self.journal_path and self.output_file_size:
+            raise ValueError("journal_path cannot be combined with output_file_size")
+        if self.chunk_cache_path and self.output_file_size:
+            raise ValueError("chunk_cache_path cannot be combined with output_file_size")
+        return self
+
+    @model_validator(mode="after")
+    def snapshot_on_one_node(self) -> "Settings":
+        """
+        Ensures snapshot reads are not spread over replicas, a snapshot only exists on the node that exported it.
+        """
+        if self.snapshot_reads and self.replica_dsns:
+            raise ValueError("snapshot_reads cannot be combined with replica_dsns")
+        return self
+
+    @model_validator(mode="after")
+    def valid_shard(self) -> "Settings":
+        """
+        Ensures the shard is one of the slices and that a split export is labeled.
+        """
+        if not 0 <= self.shard_index < self.shard_count:
+            raise ValueError("shard_index must be between 0 and shard_count - 1")
+        if self.shard_count > 1 and not self.shard_run:
+            raise ValueError("shard_run must label a split export")
+        return self
+
+    @model_validator(mode="after")
+    def distinct_feeds(self) -> "Settings":
+        """
+        Ensures there is a feed to export and that feeds neither share a table nor overwrite each other's metadata.
+        """
+        feeds = self.feed_settings()
+        if not all(feed.db_table_name for feed in feeds):
+            raise ValueError("db_table_name or feeds must name the exported tables")
+        if len({feed.db_table_name for feed in feeds}) < len(feeds):
+            raise ValueError("feeds must export distinct tables")
+        if len({(feed.aws_bucket, feed.s3_prefix, feed.metadata_file_name) for feed in feeds}) < len(feeds):
+            raise ValueError("feeds must write their metadata files to distinct locations")
+        return self
+
+    def feed_settings(self) -> list["Settings"]:
+        """
+        Returns the settings of every feed, the top-level settings with the fields of its definition applied.
+        """
+        if not self.feeds:
+            return [self]
+        return [
+            self.model_copy(
+                update={
+                    "db_table_name": feed.table,
+                    "column_map": feed.columns or self.column_map,
+                    "aws_bucket": feed.bucket or self.aws_bucket,
+                    "s3_prefix": feed.prefix or self.s3_prefix,
+                    "metadata_file_name": feed.metadata_file_name or self.metadata_file_name,
+                    "feed_name": feed.name or self.feed_name,
+                    "fields": feed.fields or self.fields,
+                    "feeds": [],
+                }
+            )
+            for feed in self.feeds
+        ]
+
+    @property
+    def shard(self) -> Shard:
+        return Shard(self.shard_index, self.shard_count)
+
+    @property
+    def db_pool_size(self) -> int:
+        """Connections of a pool: one per chunk in flight and one more for planning and bookkeeping queries."""
+        return self.concurrency_limit + 1
+
     @property
     def dsn(self) -> str:
         """
@@ -55,8 +315,8 @@ class Settings(BaseSettings):
 
 
 @lru_cache
-def get_settings() -> Settings:
+def get_settings(**overrides) -> Settings:
     """
-    Retrieves an instance of the Settings.
+    Retrieves an instance of the Settings, `overrides` take precedence over the environment.
     """
-    return Settings()
+    return Settings(**overrides)
@@ -1,42 +1,277 @@
+import asyncio
 import logging
+import signal
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
 from datetime import datetime
+from typing import TYPE_CHECKING
 
+import asyncpg
+
+from src.chunk.application.services.budget import MemoryBudget
+from src.chunk.application.services.daemon import ChangeDaemon
 from src.chunk.application.services.feed import FeedService
+from src.chunk.application.services.limiter import ConcurrencyLimiter
+from src.chunk.infra.backends import backend, preload
+from src.chunk.infra.cache import ChunkCache
+from src.chunk.infra.journal import ProgressJournal
+from src.chunk.infra.listener import ChangeListener
+from src.chunk.infra.manifest import ShardManifests
+from src.chunk.infra.metrics import DB_POOL_SIZE, REGISTRY, RUN_SECONDS, RUN_TIMESTAMP
 from src.chunk.infra.payload import ChunkPayload
+from src.chunk.infra.pipeline import StagedProcessor
 from src.chunk.infra.processor import ChunkProcessor
-from src.chunk.infra.storage import AWSOperator, MetadataOperator, PostgresOperator
-from src.chunk.main.config import get_db_pool, get_s3_session
-from src.chunk.main.constants import VALID_TABLES
-from src.chunk.main.settings import get_settings
+from src.chunk.infra.replica import ReplicaPool
+from src.chunk.infra.retry import RetryingFetcher, RetryingStore, RetryingUploader
+from src.chunk.infra.startup import mark
+from src.chunk.infra.storage import WatermarkManager
+from src.chunk.infra.transform import EntitySpec
+from src.chunk.infra.writer import RollingFileWriter
+from src.chunk.main.config import (
+    get_budget,
+    get_db_pool,
+    get_fetcher,
+    get_limiter,
+    get_payload,
+    get_replica_pool,
+    get_retry_policy,
+    get_s3_session,
+    get_spool,
+)
+from src.chunk.main.settings import Settings, get_settings
+
+if TYPE_CHECKING:
+    from src.chunk.infra.s3 import S3Client
+
+
+def create_feed(  # noqa: PLR0913, PLR0917
+    settings: Settings,
+    pool: asyncpg.Pool,
+    s3: "S3Client",
+    payload: ChunkPayload,
+    limiter: ConcurrencyLimiter,
+    budget: MemoryBudget | None,
+    journal: ProgressJournal | None,
+    replicas: ReplicaPool | None = None,
+) -> tuple[FeedService, ChunkCache | None]:
+    """
+    Wires the service exporting one feed. Feeds share the DB pool, the S3 client, the payload engine,
+    the limiter and the memory budget, only the components tied to one table are created per feed.
+    With `replicas` chunks are fetched from the replicas, ranges and the high-water mark come from their planner.
+    """
+    reads = pool
+    if replicas is not None:
+        pool, reads = replicas.planner, replicas
+    payload = payload.for_spec(EntitySpec(settings.fields))
+    policy = get_retry_policy(settings)
+    upload_operator = backend("s3_saver")(bucket=settings.aws_bucket, prefix=settings.s3_prefix, s3=s3)
+    # Metadata files, manifests and high-water marks publish a whole export, one failed PUT must not lose it
+    metadata = RetryingStore(
+        backend("s3_metadata")(bucket=settings.aws_bucket, prefix=settings.s3_prefix, s3=s3), policy
+    )
+    manifests = None
+    if settings.shard_count > 1:
+        manifests = ShardManifests(
+            store=metadata,
+            table=settings.db_table_name,
+            shard=settings.shard,
+            run=settings.shard_run,
+            file_name=settings.shard_manifest_file_name,
+        )
+    # Rolled files are numbered per process and spooled per feed, the shard index keeps shards apart
+    local_name = settings.db_table_name if manifests is None else f"{settings.db_table_name}_{settings.shard_index}"
+    spool = get_spool(settings, upload_operator, policy, local_name)
+    saver = RetryingUploader(upload_operator, policy, hedge_percentile=settings.hedge_percentile)
+    if spool is not None:
+        # Spooled files are uploaded by the sync phase, which retries on its own
+        saver = spool.spool
+    writer = None
+    if settings.output_file_size:
+        writer = RollingFileWriter(
+            saver=saver,
+            target_size=settings.output_file_size,
+            part_size=settings.multipart_part_size,
+            table=local_name,
+        )
+    cache = None
+    if settings.chunk_cache_path:
+        cache = ChunkCache(
+            settings.chunk_cache_path,
+            # Cached digests only hold for the entities of the spec they were uploaded with. Aligned ranges
+            # of different shards share their bounds, the shard keeps their entries apart.
+            namespace=(
+                f"{settings.db_table_name}:{settings.shard_index}/{settings.shard_count}:"
+                f"{type(payload).__name__}:{payload.spec.digest}"
+            ),
+            ttl=settings.chunk_cache_ttl,
+            max_age=settings.chunk_cache_max_age,
+        )
+    processor_class = StagedProcessor if settings.pipeline else ChunkProcessor
+    processor = processor_class(
+        settings=settings,
+        pool=reads,
+        storage=RetryingFetcher(get_fetcher(settings, reads, payload), policy),
+        payload=payload,
+        saver=saver,
+        writer=writer,
+        cache=cache,
+    )
+    watermark = None
+    if settings.delta_column:
+        watermark = WatermarkManager(
+            pool=pool, store=metadata, delta_column=settings.delta_column, file_name=settings.watermark_file_name
+        )
+    service = FeedService(
+        settings=settings,
+        pool=pool,
+        processor=processor,
+        metadata=metadata,
+        watermark=watermark,
+        journal=journal,
+        limiter=limiter,
+        budget=budget,
+        manifests=manifests,
+        spool=spool,
+    )
+    return service, cache
 
 
-async def run():
+def validated_feeds(settings: Settings, finalize: bool) -> list[Settings]:
+    """
+    Returns the settings of every feed, rejecting tables missing from `valid_tables` and conflicting entity fields
+    before any connection is opened.
+    """
+    feeds = settings.feed_settings()
+    for feed in feeds:
+        if feed.db_table_name not in settings.valid_tables:
+            raise ValueError(f"Invalid table name: {feed.db_table_name}, allowed tables are set by VALID_TABLES")
+        EntitySpec(feed.fields)
+    if finalize and settings.shard_count == 1:
+        raise ValueError("finalize merges the manifests of a split export, shard_count must be above 1")
+    return feeds
+
+
+@asynccontextmanager
+async def feed_services(
+    settings: Settings, feeds: list[Settings], snapshot: bool, replicas: bool
+) -> AsyncIterator[list[FeedService]]:
+    """
+    Opens the connections shared by all feeds and yields the service of every feed, closing everything on exit.
+    Whatever was opened before a failing step of the setup is closed too.
+    """
+    async with AsyncExitStack() as resources:
+        # The S3 backend is imported while the pools connect
+        loading = asyncio.create_task(preload("s3_session", "s3_client", "s3_saver", "s3_metadata"))
+        try:
+            pool = await get_db_pool(dsn=settings.dsn, snapshot=snapshot, max_size=settings.db_pool_size)
+            resources.push_async_callback(pool.close)
+            replica_pool = None
+            if replicas:
+                replica_pool = await get_replica_pool(settings, pool)
+                resources.push_async_callback(replica_pool.close)
+        finally:
+            await loading
+        mark("db pool")
+        DB_POOL_SIZE.set((replica_pool or pool).get_max_size())
+        session = get_s3_session(
+            access_key_id=settings.aws_access_key_id,
+            secret_access_key=settings.aws_secret_access_key,
+            region=settings.aws_region,
+        )
+        # One connection more than the chunks in flight, or than the streams syncing the spool,
+        # keeps metadata uploads from queueing behind them
+        streams = max(settings.concurrency_limit, settings.spool_sync_concurrency if settings.spool_path else 0)
+        s3 = backend("s3_client")(session, max_pool_connections=streams + 1)
+        resources.push_async_callback(s3.close)
+        payload_operator = get_payload(settings)
+        resources.callback(payload_operator.close)
+        journal = None
+        if settings.journal_path:
+            journal = ProgressJournal(settings.journal_path)
+            resources.callback(journal.close)
+        limiter = get_limiter(settings)
+        budget = get_budget(settings)
+        services = []
+        for feed in feeds:
+            service, cache = create_feed(feed, pool, s3, payload_operator, limiter, budget, journal, replica_pool)
+            services.append(service)
+            if cache is not None:
+                resources.callback(cache.close)
+                resources.push_async_callback(cache.evict)
+        yield services
+
+
+async def run(finalize: bool = False, **overrides):
     """
     Executes the main asynchronous workflow for data processing and operations.
+    All configured feeds are exported concurrently, a failing feed does not stop the others.
+
+    With `finalize` the shards of a split export are done, and their partial manifests are merged
+    into the metadata file of every feed instead.
     """
-    settings = get_settings()
+    settings = get_settings(**overrides)
     logging.basicConfig(level=settings.log_level, format=settings.log_format)
     logger = logging.getLogger(__name__)
 
-    pool = await get_db_pool(dsn=settings.dsn)
-    session = get_s3_session(
-        access_key_id=settings.aws_access_key_id,
-        secret_access_key=settings.aws_secret_access_key,
-        region=settings.aws_region,
-    )
-    fetch_operator = PostgresOperator(pool=pool)
-    payload_operator = ChunkPayload()
-    upload_operator = AWSOperator(session=session, bucket=settings.aws_bucket)
-    processor = ChunkProcessor(
-        settings=settings, pool=pool, storage=fetch_operator, payload=payload_operator, saver=upload_operator
-    )
-    metadata = MetadataOperator(session=session, bucket=settings.aws_bucket)
-    service = FeedService(settings=settings, pool=pool, processor=processor, metadata=metadata)
-    if settings.db_table_name not in VALID_TABLES:
-        raise ValueError(f"Invalid table name: {settings.table}")
+    feeds = validated_feeds(settings, finalize)
     start = datetime.now()
-    logger.info("service.run: Starting processing")
-    await service.feed()
-    await pool.close()
-    logger.debug(f"service.run: Processing finished in {(datetime.now() - start).total_seconds()} seconds")
+    try:
+        async with feed_services(
+            settings, feeds, snapshot=settings.snapshot_reads, replicas=bool(settings.replica_dsns)
+        ) as services:
+            logger.info(f"service.run: Starting {'finalizing' if finalize else 'processing'} of {len(services)} feeds")
+            jobs = [service.finalize() if finalize else service.feed() for service in services]
+            results = await asyncio.gather(*jobs, return_exceptions=True)
+        for index, (feed, result) in enumerate(zip(feeds, results, strict=True)):
+            if result is False:
+                # Failed ranges, files or metadata saves were logged by the feed, the exit status reports them
+                failure = "Manifests of {} were not merged" if finalize else "Export of {} was not published"
+                results[index] = RuntimeError(failure.format(feed.db_table_name))
+            if isinstance(results[index], BaseException):
+                logger.error(f"service.run: Feed {feed.db_table_name} failed: {results[index]}")
+        if errors := [result for result in results if isinstance(result, BaseException)]:
+            raise errors[0]
+    finally:
+        finished = datetime.now()
+        RUN_SECONDS.set((finished - start).total_seconds())
+        RUN_TIMESTAMP.set(finished.timestamp())
+        if settings.metrics_textfile:
+            REGISTRY.write_textfile(settings.metrics_textfile)
+    logger.debug(f"service.run: Processing finished in {(finished - start).total_seconds()} seconds")
     logger.info("service.run: Processing was finished")
+
+
+async def serve(install_trigger: bool = False, **overrides):
+    """
+    Runs the export daemon until SIGTERM or SIGINT: the changed rows of every feed are exported
+    as their change notifications arrive, instead of sweeping the whole table.
+    With `install_trigger` the triggers notifying the changes are created first.
+    """
+    settings = get_settings(**overrides)
+    logging.basicConfig(level=settings.log_level, format=settings.log_format)
+    logger = logging.getLogger(__name__)
+
+    feeds = validated_feeds(settings, finalize=False)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    # A snapshot would hide every change made after the daemon started, and a lagging replica could
+    # still serve the previous version of a changed row. Notifications are only sent on the primary.
+    async with feed_services(settings, feeds, snapshot=False, replicas=False) as services:
+        daemons = [
+            ChangeDaemon(
+                service=service,
+                listener=ChangeListener(service.pool, feed.db_table_name),
+                window=settings.daemon_window,
+                max_batch=settings.daemon_max_batch,
+                backoff=get_retry_policy(settings),
+            )
+            for feed, service in zip(feeds, services, strict=True)
+        ]
+        if install_trigger:
+            for daemon in daemons:
+                await daemon.listener.install()
+        logger.info(f"service.serve: Exporting the changes of {len(daemons)} feeds")
+        await asyncio.gather(*(daemon.serve(stop) for daemon in daemons))
+    logger.info("service.serve: Daemon stopped")
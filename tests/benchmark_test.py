@@ -0,0 +1,14 @@
+import pytest
+
+from benchmarks.feed import run_feed
+
+
+@pytest.mark.asyncio
+async def test_offline_feed_exports_every_row():
+    rows = 300
+
+    result = await run_feed(rows, overrides={"chunk_size": "100", "concurrency_limit": "2"})
+
+    assert result["files"] == rows // 100
+    assert result["bytes_out"] > 0
+    assert set(result["stages"]) >= {"fetch", "build", "compress", "upload", "metadata"}
@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from src.chunk.application.services.budget import MemoryBudget
+
+
+@pytest.mark.asyncio
+async def test_reservation_waits_until_memory_is_released():
+    chunk = 60
+    budget = MemoryBudget(budget=100)
+    await budget.reserve(chunk)
+
+    waiter = asyncio.create_task(budget.reserve(chunk))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    await budget.release(chunk)
+    await asyncio.wait_for(waiter, timeout=1)
+    assert budget.reserved == chunk
+
+
+def test_estimate_never_exceeds_the_budget():
+    budget = MemoryBudget(budget=1024, overhead=4.0)
+
+    assert budget.estimate(0) == 0
+    assert budget.estimate(10**9) == budget.budget
@@ -0,0 +1,104 @@
+import sqlite3
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.chunk.domain.facility.storage import IdRange
+from src.chunk.infra.cache import ChunkCache
+from src.chunk.infra.processor import ChunkProcessor
+
+
+def make_processor(cache: ChunkCache, digest: str) -> tuple[ChunkProcessor, AsyncMock]:
+    mock_fetcher = AsyncMock()
+    mock_fetcher.hash_data.return_value = digest
+    mock_fetcher.fetch_data.return_value = ["row1", "row2"]
+
+    mock_payload = MagicMock()
+    mock_payload.build_payload = AsyncMock(return_value="json_data")
+    mock_payload.compress = AsyncMock(return_value=b"compressed_data")
+
+    mock_saver = MagicMock()
+    mock_saver.save_data = AsyncMock(return_value=True)
+
+    processor = ChunkProcessor(
+        settings=MagicMock(db_table_name="facility"),
+        pool=MagicMock(),
+        payload=mock_payload,
+        storage=mock_fetcher,
+        saver=mock_saver,
+        cache=cache,
+    )
+    return processor, mock_saver.save_data
+
+
+@pytest.mark.asyncio
+async def test_unchanged_range_reuses_uploaded_object(tmp_path):
+    cache = ChunkCache(str(tmp_path / "cache.sqlite"), namespace="facility:ChunkPayload", ttl=60, max_age=600)
+    id_range = IdRange(1, 101)
+
+    first, first_save = make_processor(cache, digest="a")
+    first_files = []
+    assert await first.handle(id_range, first_files) is True
+    first_save.assert_awaited_once()
+
+    unchanged, unchanged_save = make_processor(cache, digest="a")
+    unchanged_files = []
+    assert await unchanged.handle(id_range, unchanged_files) is True
+    unchanged_save.assert_not_awaited()
+    assert unchanged_files == first_files
+
+    changed, changed_save = make_processor(cache, digest="b")
+    assert await changed.handle(id_range, []) is True
+    changed_save.assert_awaited_once()
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_evict_drops_entries_unused_within_ttl(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    stale = ChunkCache(path, namespace="facility:ChunkPayload", ttl=60, max_age=600)
+    await stale.put(IdRange(1, 101), "a", "facility_feed_1_1.json.gz")
+    stale._execute("UPDATE chunks SET last_used = ?", time.time() - 120)
+    await stale.put(IdRange(101, 201), "b", "facility_feed_1_101.json.gz")
+
+    assert await stale.evict() == 1
+    assert await stale.get(IdRange(1, 101), "a") is None
+    assert await stale.get(IdRange(101, 201), "b") == "facility_feed_1_101.json.gz"
+    stale.close()
+
+
+@pytest.mark.asyncio
+async def test_objects_older_than_max_age_are_uploaded_again(tmp_path):
+    cache = ChunkCache(str(tmp_path / "cache.sqlite"), namespace="facility:ChunkPayload", ttl=60, max_age=600)
+    id_range = IdRange(1, 101)
+    first, _ = make_processor(cache, digest="a")
+    assert await first.handle(id_range, []) is True
+    # Reused every run, yet uploaded longer ago than the bucket may keep it
+    cache._execute("UPDATE chunks SET uploaded = ?", time.time() - 900)
+
+    unchanged, unchanged_save = make_processor(cache, digest="a")
+    files = []
+    assert await unchanged.handle(id_range, files) is True
+
+    unchanged_save.assert_awaited_once()
+    assert cache._execute("SELECT file_name FROM chunks") == [(files[0],)]
+    cache._execute("UPDATE chunks SET uploaded = ?", time.time() - 900)
+    assert await cache.evict() == 1
+    cache.close()
+
+
+def test_cache_file_without_upload_times_is_reset(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    old = sqlite3.connect(path)
+    old.execute(
+        "CREATE TABLE chunks (namespace TEXT, lo INTEGER, hi INTEGER, digest TEXT, file_name TEXT, last_used REAL)"
+    )
+    old.execute("INSERT INTO chunks VALUES ('facility:ChunkPayload', 1, 101, 'a', 'old.json.gz', 0)")
+    old.commit()
+    old.close()
+
+    cache = ChunkCache(path, namespace="facility:ChunkPayload", ttl=60, max_age=600)
+
+    assert cache._execute("SELECT * FROM chunks") == []
+    cache.close()
@@ -4,7 +4,8 @@ from io import BytesIO
 
 import pytest
 
-from src.chunk.infra.payload import ChunkPayload
+from src.chunk.infra.compression import BlockGzipCompressor
+from src.chunk.infra.payload import ChunkPayload, ProcessChunkPayload
 
 
 @pytest.mark.asyncio
@@ -58,3 +59,69 @@ async def test_compress():
     with gzip.GzipFile(fileobj=BytesIO(compressed_data), mode="rb") as gz:
         decompressed_data = gz.read().decode("utf-8")
     assert decompressed_data == data_str
+
+
+def facility_records(count: int) -> list[dict]:
+    return [
+        {
+            "id": index,
+            "name": f"Facility «{index}»",
+            "phone": None,
+            "url": "https://example.com",
+            "latitude": 40.7128951 + index,
+            "longitude": -74.00607,
+            "country": "USA",
+            "locality": "New York",
+            "region": "NY",
+            "postal_code": "10001",
+            "street_address": "123 Main Street",
+        }
+        for index in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_streaming_payload_matches_document():
+    records = facility_records(3)
+    document = await ChunkPayload().build_payload(records)
+
+    streaming_builder = ChunkPayload(streaming=True)
+    stream = await streaming_builder.build_payload(records)
+    compressed_data = await streaming_builder.compress(stream)
+
+    assert not isinstance(stream, str)
+    assert gzip.decompress(compressed_data).decode("utf-8") == document
+
+
+@pytest.mark.asyncio
+async def test_process_payload_matches_document():
+    records = facility_records(5)
+    document = await ChunkPayload().build_payload(records)
+
+    process_builder = ProcessChunkPayload(workers=1)
+    try:
+        compressed_data = await process_builder.compress(await process_builder.build_payload(records))
+    finally:
+        process_builder.close()
+
+    assert gzip.decompress(compressed_data).decode("utf-8") == document
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("streaming", [False, True])
+async def test_block_compressed_payload_is_multi_member_gzip(streaming):
+    records = facility_records(50)
+    document = await ChunkPayload().build_payload(records)
+    block_size = 256
+
+    block_builder = ChunkPayload(
+        streaming=streaming, compressor=BlockGzipCompressor(level=6, block_size=block_size, threads=2)
+    )
+    try:
+        compressed_data = await block_builder.compress(await block_builder.build_payload(records))
+    finally:
+        block_builder.close()
+
+    members = compressed_data.count(b"\x1f\x8b\x08")
+    assert members >= len(document.encode("utf-8")) // block_size
+    assert gzip.decompress(compressed_data).decode("utf-8") == document
@@ -0,0 +1,193 @@
+import asyncio
+import gzip
+import json
+import os
+from unittest.mock import AsyncMock, MagicMock
+
+import asyncpg
+import pytest
+
+from benchmarks.data import facility_table, synthetic_records
+from benchmarks.standins import MemoryFetcher, StageClock
+from src.chunk.application.services.daemon import ChangeDaemon
+from src.chunk.application.services.feed import FeedService
+from src.chunk.infra.listener import ChangeListener
+from src.chunk.infra.payload import ChunkPayload
+from src.chunk.infra.processor import ChunkProcessor
+from src.chunk.infra.retry import RetryPolicy
+from src.chunk.infra.storage import PostgresOperator
+
+TEST_DSN = os.environ.get("TEST_DSN")
+TABLE = "chunked_flow_daemon_test"
+
+
+class ObjectStore:
+    def __init__(self):
+        self.objects: dict[str, bytes | str] = {}
+        self.published = asyncio.Event()
+
+    async def save_data(self, data: bytes | str, file_name: str) -> bool:
+        self.objects[file_name] = data
+        if file_name.startswith("metadata_"):
+            self.published.set()
+        return True
+
+    def exported_ids(self) -> list[int]:
+        metadata = next(data for name, data in self.objects.items() if name.startswith("metadata_"))
+        ids = []
+        for file_name in json.loads(metadata)["data_file"]:
+            ids.extend(entity["entity_id"] for entity in json.loads(gzip.decompress(self.objects[file_name]))["data"])
+        return ids
+
+
+def feed_service(fetcher, table: str, store: ObjectStore) -> FeedService:
+    settings = MagicMock()
+    settings.db_table_name = table
+    settings.metadata_file_name = "metadata_{timestamp}.json"
+    settings.feed_name = "reservewithgoogle.entity"
+    processor = ChunkProcessor(settings=settings, pool=None, payload=ChunkPayload(), storage=fetcher, saver=store)
+    return FeedService(settings=settings, pool=None, processor=processor, metadata=store)
+
+
+def listening_pool() -> MagicMock:
+    pool = MagicMock()
+    conn = MagicMock()
+    conn.add_listener = AsyncMock()
+    conn.remove_listener = AsyncMock()
+    pool.acquire.return_value.__aenter__.return_value = conn
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_listener_batches_distinct_ids_up_to_the_limit():
+    listener = ChangeListener(pool=None, table="facility")
+    for change in ("7", "3", "7", "5", "9"):
+        listener.notified(None, 1, listener.channel, change)
+
+    assert await listener.batch(window=1.0, max_ids=3) == [3, 5, 7]
+    assert await listener.batch(window=0.01, max_ids=3) == [9]
+
+    listener.terminated(None)
+    with pytest.raises(ConnectionError):
+        await listener.batch(window=0.01, max_ids=3)
+
+
+@pytest.mark.asyncio
+async def test_daemon_exports_notified_rows_as_delta_feed():
+    store = ObjectStore()
+    service = feed_service(MemoryFetcher(synthetic_records(50), StageClock()), "facility", store)
+    listener = ChangeListener(listening_pool(), "facility")
+    daemon = ChangeDaemon(service, listener, window=0.01, max_batch=100)
+    stop = asyncio.Event()
+
+    serving = asyncio.create_task(daemon.serve(stop))
+    await asyncio.sleep(0)
+    for change in ("42", "4", "42"):
+        listener.notified(None, 1, listener.channel, change)
+    await asyncio.wait_for(store.published.wait(), timeout=5)
+    stop.set()
+    await asyncio.wait_for(serving, timeout=5)
+
+    assert store.exported_ids() == [4, 42]
+    assert service.feed_type == "delta"
+
+
+@pytest.mark.asyncio
+async def test_batches_of_one_second_are_published_under_distinct_names(mocker):
+    mocker.patch("time.time", return_value=1680000000)
+    store = ObjectStore()
+    service = feed_service(MemoryFetcher(synthetic_records(10), StageClock()), "facility", store)
+    daemon = ChangeDaemon(service, ChangeListener(listening_pool(), "facility"), window=0.01, max_batch=2)
+
+    for ids in ([1, 2], [3, 4], [5, 6]):
+        assert await daemon.export(ids)
+
+    metadata = [data for name, data in store.objects.items() if name.startswith("metadata_")]
+    published = [file_name for data in metadata for file_name in json.loads(data)["data_file"]]
+    assert len(metadata) == len(published) == len(store.objects) - len(metadata)
+
+
+@pytest.mark.asyncio
+async def test_ids_of_a_failed_batch_are_queued_again():
+    store = ObjectStore()
+    service = feed_service(MemoryFetcher(synthetic_records(10), StageClock()), "facility", store)
+    service.feed_ids = AsyncMock(return_value=False)
+    listener = ChangeListener(listening_pool(), "facility")
+    daemon = ChangeDaemon(service, listener, window=0.01, max_batch=10)
+
+    assert not await daemon.export([3, 5])
+    assert await listener.batch(window=0.01, max_ids=10) == [3, 5]
+
+
+@pytest.mark.skipif(not TEST_DSN, reason="TEST_DSN is not set")
+@pytest.mark.asyncio
+async def test_daemon_exports_rows_changed_in_postgres():
+    pool = await asyncpg.create_pool(dsn=TEST_DSN, min_size=2, max_size=4)
+    store = ObjectStore()
+    try:
+        async with pool.acquire() as conn:
+            await conn.execute(facility_table(TABLE, temporary=False))
+        listener = ChangeListener(pool, TABLE)
+        await listener.install()
+        fetcher = PostgresOperator(pool, columns=ChunkPayload.columns)
+        daemon = ChangeDaemon(feed_service(fetcher, TABLE, store), listener, window=0.2, max_batch=100)
+        stop = asyncio.Event()
+        serving = asyncio.create_task(daemon.serve(stop))
+        await asyncio.sleep(0.2)
+        async with pool.acquire() as conn:
+            await conn.executemany(
+                f"INSERT INTO {TABLE} (id, name, latitude, longitude) VALUES ($1, $2, $3, $4)",  # noqa S608
+                [(1, "A", 1.5, 2.5), (2, "B", 3.5, 4.5)],
+            )
+        await asyncio.wait_for(store.published.wait(), timeout=5)
+        stop.set()
+        await asyncio.wait_for(serving, timeout=5)
+    finally:
+        async with pool.acquire() as conn:
+            await conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        await pool.close()
+
+    assert store.exported_ids() == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_batch_in_progress_on_stop_is_exported():
+    store = ObjectStore()
+    service = feed_service(MemoryFetcher(synthetic_records(10), StageClock()), "facility", store)
+    listener = ChangeListener(listening_pool(), "facility")
+    # The window outlasts the test, only stopping ends the batch
+    daemon = ChangeDaemon(service, listener, window=60, max_batch=100)
+    stop = asyncio.Event()
+
+    serving = asyncio.create_task(daemon.serve(stop))
+    await asyncio.sleep(0)
+    for change in ("3", "5"):
+        listener.notified(None, 1, listener.channel, change)
+    await asyncio.sleep(0.01)
+    stop.set()
+    await asyncio.wait_for(serving, timeout=5)
+
+    assert store.exported_ids() == [3, 5]
+
+
+@pytest.mark.asyncio
+async def test_daemon_reconnects_after_losing_the_listening_connection():
+    store = ObjectStore()
+    service = feed_service(MemoryFetcher(synthetic_records(10), StageClock()), "facility", store)
+    listener = ChangeListener(listening_pool(), "facility")
+    daemon = ChangeDaemon(service, listener, window=0.01, max_batch=100, backoff=RetryPolicy(base_delay=0.0))
+    stop = asyncio.Event()
+
+    serving = asyncio.create_task(daemon.serve(stop))
+    await asyncio.sleep(0)
+    listener.notified(None, 1, listener.channel, "4")
+    listener.terminated(None)
+    listener.notified(None, 1, listener.channel, "7")
+    await asyncio.wait_for(store.published.wait(), timeout=5)
+    stop.set()
+    await asyncio.wait_for(serving, timeout=5)
+
+    connections = 2
+    assert not serving.exception()
+    assert listener.pool.acquire.call_count == connections
+    assert sorted(store.exported_ids()) == [4, 7]
@@ -1,29 +1,41 @@
+import asyncio
 import json
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
 from src.chunk.application.services.feed import FeedService
+from src.chunk.domain.facility.storage import IdRange, Saver
 from src.chunk.infra.processor import Processor
-from src.chunk.infra.storage import Saver
+from src.chunk.infra.storage import OffsetManager, WatermarkManager
+from src.chunk.presentation import service
+
+
+def mock_offset_manager(ranges: list[IdRange]) -> AsyncMock:
+    offset_manager = AsyncMock(spec=OffsetManager)
+    offset_manager.fetch_offset.return_value = 0
+    offset_manager.plan_ranges.return_value = ranges
+    return offset_manager
 
 
 @patch("time.time", return_value=1680000000)
 @pytest.mark.asyncio
-async def test_feed_stops_on_no_data(mocker):
-    """Test that `feed()` stops when processor handle returns False."""
+async def test_feed_continues_after_failed_range(mocker):
+    """Test that a failed range does not stop `feed()` from processing the rest of the plan, nor publishes it."""
     mock_settings = MagicMock()
     mock_settings.chunk_size = 10
     mock_settings.concurrency_limit = 2
     mock_settings.metadata_file_name = "metadata_{timestamp}.json"
+    mock_settings.feed_name = "reservewithgoogle.entity"
 
     mock_pool = MagicMock()
     mock_processor = AsyncMock(spec=Processor)
     mock_saver = AsyncMock(spec=Saver)
 
-    mock_processor.handle.side_effect = [True, True, False]
+    mock_processor.handle.side_effect = [True, False, True]
     call_count = 3
-    mock_time = 1680000000
 
     feed_service = FeedService(
         settings=mock_settings,
@@ -31,14 +43,13 @@ async def test_feed_stops_on_no_data(mocker):
         processor=mock_processor,
         metadata=mock_saver,
     )
+    feed_service.offset_manager = mock_offset_manager([IdRange(1, 11), IdRange(11, 25), IdRange(25, 31)])
 
-    await feed_service.feed()
+    assert not await feed_service.feed()
 
     assert mock_processor.handle.call_count == call_count
-    mock_saver.save_data.assert_awaited_once_with(
-        data=feed_service.create_metadata_file(mock_time),
-        file_name=mock_settings.metadata_file_name.format(timestamp=mock_time),
-    )
+    # Entities missing from a full feed would count as deleted
+    mock_saver.save_data.assert_not_awaited()
 
 
 @pytest.mark.asyncio
@@ -48,6 +59,7 @@ async def test_feed_creates_metadata_file(mocker):
     mock_settings.chunk_size = 10
     mock_settings.concurrency_limit = 2
     mock_settings.metadata_file_name = "metadata_{timestamp}.json"
+    mock_settings.feed_name = "reservewithgoogle.entity"
 
     mock_pool = MagicMock()
     mock_processor = AsyncMock(spec=Processor)
@@ -96,24 +108,36 @@ async def test_semaphore_wrapper(mocker):
     result = await feed_service.semaphore_wrapper(0)
 
     assert result is True
-    mock_processor.handle.assert_awaited_once_with(0, feed_service.uploaded_files)
+    mock_processor.handle.assert_awaited_once_with(0, [])
 
 
 @patch("time.time", return_value=1680000000)
 @pytest.mark.asyncio
 async def test_feed_with_multiple_chunks(mocker):
-    """Test `feed()` processes multiple chunks with proper concurrency."""
+    """Test `feed()` processes every planned range with proper concurrency."""
     mock_settings = MagicMock()
     mock_settings.chunk_size = 10
     mock_settings.concurrency_limit = 2
     mock_settings.metadata_file_name = "metadata_{timestamp}.json"
+    mock_settings.feed_name = "reservewithgoogle.entity"
 
     mock_pool = MagicMock()
     mock_processor = AsyncMock(spec=Processor)
     mock_saver = AsyncMock(spec=Saver)
 
-    mock_processor.handle.side_effect = [True, True, True, False]
-    call_count = 4
+    in_flight = 0
+    max_in_flight = 0
+
+    async def handle(id_range, uploaded_files):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return True
+
+    mock_processor.handle.side_effect = handle
+    ranges = [IdRange(1, 11), IdRange(11, 21), IdRange(21, 35), IdRange(35, 40)]
     mock_time = 1680000000
 
     feed_service = FeedService(
@@ -122,11 +146,145 @@ async def test_feed_with_multiple_chunks(mocker):
         processor=mock_processor,
         metadata=mock_saver,
     )
+    feed_service.offset_manager = mock_offset_manager(ranges)
 
     await feed_service.feed()
 
-    assert mock_processor.handle.call_count == call_count
+    assert mock_processor.handle.call_count == len(ranges)
+    assert {call.args[0] for call in mock_processor.handle.call_args_list} == set(ranges)
+    assert max_in_flight == mock_settings.concurrency_limit
     mock_saver.save_data.assert_awaited_with(
         data=feed_service.create_metadata_file(mock_time),
         file_name=mock_settings.metadata_file_name.format(timestamp=mock_time),
     )
+
+
+@patch("time.time", return_value=1680000000)
+@pytest.mark.asyncio
+async def test_feed_delta_exports_changes_since_watermark(mocker):
+    """Test that a delta feed plans from the saved high-water mark and moves it after success."""
+    mock_settings = MagicMock()
+    mock_settings.chunk_size = 10
+    mock_settings.concurrency_limit = 2
+    mock_settings.feed_mode = "delta"
+    mock_settings.metadata_file_name = "metadata_{timestamp}.json"
+    mock_settings.feed_name = "reservewithgoogle.entity"
+
+    mock_processor = AsyncMock(spec=Processor)
+    mock_processor.handle.return_value = True
+    mock_saver = AsyncMock(spec=Saver)
+    mock_watermark = AsyncMock(spec=WatermarkManager)
+    previous_mark = datetime(2025, 1, 1, tzinfo=UTC)
+    current_mark = datetime(2025, 1, 2, tzinfo=UTC)
+    mock_watermark.load.return_value = previous_mark
+    mock_watermark.fetch_current.return_value = current_mark
+
+    feed_service = FeedService(
+        settings=mock_settings,
+        pool=MagicMock(),
+        processor=mock_processor,
+        metadata=mock_saver,
+        watermark=mock_watermark,
+    )
+    feed_service.offset_manager = mock_offset_manager([IdRange(1, 11, previous_mark)])
+
+    assert await feed_service.feed()
+
+    assert feed_service.offset_manager.plan_ranges.await_args.args[3] == previous_mark
+    assert json.loads(mock_saver.save_data.await_args.kwargs["data"])["type"] == "delta"
+    mock_watermark.save.assert_awaited_once_with(mock_settings.db_table_name, current_mark)
+
+
+@patch("time.time", return_value=1680000000)
+@pytest.mark.asyncio
+async def test_failed_watermark_save_fails_the_publication(mocker):
+    mock_settings = MagicMock()
+    mock_settings.metadata_file_name = "metadata_{timestamp}.json"
+    mock_settings.feed_name = "reservewithgoogle.entity"
+    mock_saver = AsyncMock(spec=Saver)
+    mock_saver.save_data.return_value = True
+    mock_watermark = AsyncMock(spec=WatermarkManager)
+    mock_watermark.save.return_value = False
+    current_mark = datetime(2025, 1, 2, tzinfo=UTC)
+
+    feed_service = FeedService(
+        settings=mock_settings,
+        pool=MagicMock(),
+        processor=AsyncMock(spec=Processor),
+        metadata=mock_saver,
+        watermark=mock_watermark,
+        offset_manager=MagicMock(),
+    )
+    feed_service.feed_type = "delta"
+
+    assert not await feed_service.publish("facility", current_mark, failed=0)
+    mock_saver.save_data.assert_awaited_once()
+    mock_watermark.save.assert_awaited_once_with("facility", current_mark)
+
+
+@patch("time.time", return_value=1680000000)
+@pytest.mark.asyncio
+async def test_incomplete_delta_is_published_without_moving_the_watermark(mocker):
+    mock_settings = MagicMock()
+    mock_settings.chunk_size = 10
+    mock_settings.concurrency_limit = 2
+    mock_settings.feed_mode = "delta"
+    mock_settings.metadata_file_name = "metadata_{timestamp}.json"
+    mock_settings.feed_name = "reservewithgoogle.entity"
+
+    mock_processor = AsyncMock(spec=Processor)
+    mock_processor.handle.side_effect = [True, False]
+    mock_processor.discarded.return_value = set()
+    mock_saver = AsyncMock(spec=Saver)
+    mock_watermark = AsyncMock(spec=WatermarkManager)
+    previous_mark = datetime(2025, 1, 1, tzinfo=UTC)
+    mock_watermark.load.return_value = previous_mark
+
+    feed_service = FeedService(
+        settings=mock_settings,
+        pool=MagicMock(),
+        processor=mock_processor,
+        metadata=mock_saver,
+        watermark=mock_watermark,
+    )
+    feed_service.offset_manager = mock_offset_manager([IdRange(1, 11, previous_mark), IdRange(11, 21, previous_mark)])
+
+    assert not await feed_service.feed()
+
+    mock_saver.save_data.assert_awaited_once()
+    mock_watermark.save.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_run_fails_when_a_feed_is_not_published(monkeypatch):
+    unpublished = AsyncMock(spec=FeedService)
+    unpublished.feed.return_value = False
+
+    @asynccontextmanager
+    async def feed_services(*args, **kwargs):
+        yield [unpublished]
+
+    monkeypatch.setattr(service, "feed_services", feed_services)
+
+    with pytest.raises(RuntimeError, match="Export of facility was not published"):
+        await service.run(_env_file=None, db_user="", db_password="", db_name="", db_table_name="facility")
+
+
+@pytest.mark.asyncio
+async def test_failed_setup_closes_what_was_opened(monkeypatch):
+    pool = AsyncMock()
+    pool.get_max_size = MagicMock(return_value=10)
+    s3 = AsyncMock()
+    monkeypatch.setattr(service, "preload", AsyncMock())
+    monkeypatch.setattr(service, "get_db_pool", AsyncMock(return_value=pool))
+    monkeypatch.setattr(service, "get_s3_session", MagicMock())
+    monkeypatch.setattr(service, "backend", MagicMock(return_value=MagicMock(return_value=s3)))
+    monkeypatch.setattr(service, "create_feed", MagicMock(side_effect=ValueError("invalid feed")))
+    settings = service.Settings(_env_file=None, db_user="", db_password="", db_name="", db_table_name="facility")
+
+    with pytest.raises(ValueError, match="invalid feed"):
+        async with service.feed_services(settings, [settings], snapshot=False, replicas=False):
+            pass
+
+    s3.close.assert_awaited_once()
+    pool.close.assert_awaited_once()
@@ -0,0 +1,86 @@
+import json
+from datetime import UTC, datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.chunk.application.services.feed import FeedService
+from src.chunk.domain.facility.storage import IdRange, Saver
+from src.chunk.infra.journal import ProgressJournal
+from src.chunk.infra.processor import Processor
+from src.chunk.infra.storage import OffsetManager, WatermarkManager
+
+RANGES = [IdRange(1, 11), IdRange(11, 21), IdRange(21, 31)]
+
+
+def make_service(journal: ProgressJournal, fail_lo: int | None = None) -> FeedService:
+    mock_settings = MagicMock()
+    mock_settings.chunk_size = 10
+    mock_settings.concurrency_limit = 1
+    mock_settings.db_table_name = "facility"
+    mock_settings.metadata_file_name = "metadata_{timestamp}.json"
+    mock_settings.feed_name = "reservewithgoogle.entity"
+
+    async def handle(id_range, uploaded_files):
+        if id_range.lo == fail_lo:
+            raise ConnectionError("process was killed")
+        uploaded_files.append(f"facility_feed_{id_range.lo}.json.gz")
+        return True
+
+    mock_processor = AsyncMock(spec=Processor)
+    mock_processor.handle.side_effect = handle
+    mock_processor.finish.return_value = True
+    feed_service = FeedService(
+        settings=mock_settings,
+        pool=MagicMock(),
+        processor=mock_processor,
+        metadata=AsyncMock(spec=Saver),
+        journal=journal,
+    )
+    feed_service.offset_manager = AsyncMock(spec=OffsetManager)
+    feed_service.offset_manager.fetch_offset.return_value = 0
+    feed_service.offset_manager.plan_ranges.return_value = RANGES
+    return feed_service
+
+
+@pytest.mark.asyncio
+async def test_interrupted_export_resumes_from_journal(tmp_path):
+    path = (tmp_path / "journal.sqlite3").as_posix()
+
+    first = make_service(ProgressJournal(path), fail_lo=11)
+    await first.feed()
+    first.journal.close()
+
+    second = make_service(ProgressJournal(path))
+    await second.feed()
+
+    assert [call.args[0] for call in second.processor.handle.await_args_list] == [IdRange(11, 21)]
+    second.offset_manager.plan_ranges.assert_not_awaited()
+    metadata = json.loads(second.metadata.save_data.await_args.kwargs["data"])
+    assert metadata["data_file"] == [f"facility_feed_{id_range.lo}.json.gz" for id_range in RANGES]
+    assert await second.journal.resume("facility") is None
+    second.journal.close()
+
+
+@pytest.mark.asyncio
+async def test_resumed_delta_without_changes_stays_delta(tmp_path):
+    path = (tmp_path / "journal.sqlite3").as_posix()
+    since = datetime(2025, 1, 1, tzinfo=UTC)
+
+    first = make_service(ProgressJournal(path))
+    first.settings.feed_mode = "delta"
+    first.watermark = AsyncMock(spec=WatermarkManager)
+    first.watermark.load.return_value = since
+    first.watermark.fetch_current.return_value = since
+    first.offset_manager.plan_ranges.return_value = []
+    first.metadata.save_data.return_value = False
+    assert not await first.feed()
+    first.journal.close()
+
+    second = make_service(ProgressJournal(path))
+    assert await second.feed()
+
+    second.offset_manager.plan_ranges.assert_not_awaited()
+    assert second.feed_type == "delta"
+    assert json.loads(second.metadata.save_data.await_args.kwargs["data"])["type"] == "delta"
+    second.journal.close()
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from src.chunk.application.services.limiter import AdaptiveLimiter, ConcurrencyLimiter
+
+
+async def complete(limiter: ConcurrencyLimiter, ranges: int, latency: float, success: bool = True) -> None:
+    """Finishes `ranges` ranges one by one, refilling every free slot before each of them."""
+    for _ in range(ranges):
+        while limiter.in_flight < int(limiter.limit):
+            await limiter.acquire()
+        await limiter.release(latency, success)
+
+
+@pytest.mark.asyncio
+async def test_slow_start_grows_up_to_the_upper_bound():
+    max_limit = 8
+    limiter = AdaptiveLimiter(max_limit=max_limit)
+
+    await complete(limiter, 20, latency=0.1)
+
+    assert int(limiter.limit) == max_limit
+
+
+@pytest.mark.asyncio
+async def test_failures_and_latency_spikes_cut_the_limit_once_per_window():
+    limiter = AdaptiveLimiter(max_limit=16)
+    await complete(limiter, 7, latency=0.1)
+    grown = int(limiter.limit)
+
+    await complete(limiter, 3, latency=0.1, success=False)
+    assert int(limiter.limit) == grown // 2
+
+    await complete(limiter, 1, latency=1.0)
+    assert int(limiter.limit) == grown // 2
+
+    await complete(limiter, 1, latency=1.0)
+    assert int(limiter.limit) == grown // 4
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_a_free_slot():
+    limiter = ConcurrencyLimiter(1)
+    await limiter.acquire()
+
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    await limiter.release(0.1, True)
+    await asyncio.wait_for(waiter, timeout=1)
+    assert limiter.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_free_slots_are_shared_by_feeds_in_turn():
+    limiter = ConcurrencyLimiter(1)
+    await limiter.acquire("facility")
+    granted = []
+
+    async def wait(feed: str) -> None:
+        await limiter.acquire(feed)
+        granted.append(feed)
+
+    waiters = [asyncio.create_task(wait("facility")) for _ in range(3)]
+    waiters.append(asyncio.create_task(wait("clinic")))
+    await asyncio.sleep(0)
+    for _ in waiters:
+        await limiter.release(0.1, True)
+        await asyncio.sleep(0)
+
+    assert granted[:3] == ["facility", "clinic", "facility"]
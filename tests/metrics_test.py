@@ -0,0 +1,58 @@
+from src.chunk.infra.metrics import MetricsRegistry
+
+
+def test_render_counters_gauges_and_histograms():
+    registry = MetricsRegistry()
+    rows = registry.counter("rows", "Rows fetched")
+    in_use = registry.gauge("in_use", "Connections in use")
+    peak = registry.gauge("in_use_peak", "Most connections in use")
+    latency = registry.histogram("stage_seconds", "Stage time", ("stage",))
+
+    rows.inc(10)
+    rows.inc(5)
+    with in_use.track(peak), in_use.track(peak):
+        pass
+    latency.observe(0.003, stage="fetch")
+    latency.observe(0.2, stage="fetch")
+    latency.observe(60, stage="fetch")
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE rows_total counter" in lines
+    assert "rows_total 15" in lines
+    assert "in_use 0" in lines
+    assert "in_use_peak 2" in lines
+    assert 'stage_seconds_bucket{stage="fetch",le="0.005"} 1' in lines
+    assert 'stage_seconds_bucket{stage="fetch",le="0.25"} 2' in lines
+    assert 'stage_seconds_bucket{stage="fetch",le="+Inf"} 3' in lines
+    assert 'stage_seconds_count{stage="fetch"} 3' in lines
+    assert 'stage_seconds_sum{stage="fetch"} 60.203' in lines
+
+
+def test_write_textfile_replaces_file(tmp_path):
+    registry = MetricsRegistry()
+    registry.gauge("run_seconds", "Run duration").set(1.5)
+    path = tmp_path / "chunked_flow.prom"
+    path.write_text("stale")
+
+    registry.write_textfile(str(path))
+
+    assert "run_seconds 1.5" in path.read_text().splitlines()
+    assert [entry.name for entry in tmp_path.iterdir()] == ["chunked_flow.prom"]
+
+
+def test_render_keeps_full_precision():
+    registry = MetricsRegistry()
+    raw_bytes = registry.counter("raw_bytes", "Uncompressed bytes")
+    finished = registry.gauge("run_timestamp_seconds", "Unix time the run finished")
+    lag = registry.gauge("replica_lag_seconds", "Replica lag")
+
+    raw_bytes.inc(1234567)
+    finished.set(1760781234.5)
+    lag.set(float("inf"))
+
+    lines = registry.render().splitlines()
+
+    assert "raw_bytes_total 1234567" in lines
+    assert "run_timestamp_seconds 1760781234.5" in lines
+    assert "replica_lag_seconds +Inf" in lines
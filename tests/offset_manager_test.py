@@ -0,0 +1,83 @@
+from datetime import UTC, datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.chunk.domain.facility.storage import IdRange
+from src.chunk.infra.storage import OffsetManager, WatermarkManager
+
+
+def mock_pool(conn: AsyncMock) -> MagicMock:
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__.return_value = conn
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_plan_ranges_follows_id_distribution():
+    """Test that ranges are contiguous, start at each bucket minimum and include the last id."""
+    conn = AsyncMock()
+    conn.fetch.return_value = [(1, 40), (57, 90), (1000, 1003)]
+    offset_manager = OffsetManager(mock_pool(conn))
+
+    ranges = await offset_manager.plan_ranges("facility", 0, 3)
+
+    assert ranges == [IdRange(1, 57), IdRange(57, 1000), IdRange(1000, 1004)]
+    assert conn.fetch.await_args.args[1:] == (0, 3)
+
+
+@pytest.mark.asyncio
+async def test_plan_ranges_empty_table():
+    conn = AsyncMock()
+    conn.fetch.return_value = []
+    offset_manager = OffsetManager(mock_pool(conn))
+
+    assert await offset_manager.plan_ranges("facility", 0, 100) == []
+
+
+@pytest.mark.asyncio
+async def test_plan_ranges_since_watermark():
+    conn = AsyncMock()
+    conn.fetch.return_value = [(5, 9)]
+    since = datetime(2025, 1, 1, tzinfo=UTC)
+    offset_manager = OffsetManager(mock_pool(conn), delta_column="updated_at")
+
+    ranges = await offset_manager.plan_ranges("facility", 0, 100, since)
+
+    assert ranges == [IdRange(5, 10, since)]
+    assert "updated_at > $3" in conn.fetch.await_args.args[0]
+    assert conn.fetch.await_args.args[1:] == (0, 100, since)
+
+
+@pytest.mark.asyncio
+async def test_aligned_ranges_cover_fixed_id_intervals():
+    """Test that aligned ranges do not depend on how many rows precede them."""
+    conn = AsyncMock()
+    conn.fetch.return_value = [(0,), (2,), (5,)]
+    offset_manager = OffsetManager(mock_pool(conn), aligned=True)
+
+    ranges = await offset_manager.plan_ranges("facility", 0, 100)
+
+    assert ranges == [IdRange(1, 100), IdRange(200, 300), IdRange(500, 600)]
+    assert "DISTINCT id / $2" in conn.fetch.await_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_watermark_round_trip():
+    stored = {}
+
+    async def save_data(data, file_name):
+        stored[file_name] = data
+        return True
+
+    async def load_data(file_name):
+        return stored.get(file_name)
+
+    store = MagicMock(save_data=save_data, load_data=load_data)
+    watermark = WatermarkManager(MagicMock(), store, "updated_at", "watermark_{table}.json")
+    mark = datetime(2025, 1, 2, 3, 4, 5, tzinfo=UTC)
+
+    assert await watermark.load("facility") is None
+    assert await watermark.save("facility", mark)
+    assert await watermark.load("facility") == mark
+    assert list(stored) == ["watermark_facility.json"]
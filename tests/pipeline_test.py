@@ -0,0 +1,88 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.chunk.domain.facility.storage import IdRange
+from src.chunk.infra.pipeline import StagedProcessor
+
+
+def make_processor(mocker, fetcher, saver, queue_size=1) -> StagedProcessor:
+    payload = MagicMock()
+    payload.build_payload = AsyncMock(side_effect=lambda rows: ",".join(rows))
+    payload.compress = AsyncMock(side_effect=lambda data: data.encode())
+    settings = mocker.MagicMock(
+        db_table_name="facility",
+        pipeline_queue_size=queue_size,
+        pipeline_fetch_workers=2,
+        pipeline_build_workers=1,
+        pipeline_compress_workers=1,
+        pipeline_upload_workers=1,
+    )
+    return StagedProcessor(settings=settings, pool=MagicMock(), payload=payload, storage=fetcher, saver=saver)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_processes_all_chunks(mocker):
+    fetcher = AsyncMock()
+    fetcher.fetch_data.side_effect = lambda id_range, table: [f"row{id_range.lo}"]
+    saver = AsyncMock()
+    saver.save_data.return_value = True
+    processor = make_processor(mocker, fetcher, saver)
+
+    uploaded_files = []
+    ranges = [IdRange(lo, lo + 10) for lo in range(0, 50, 10)]
+    results = await asyncio.gather(*(processor.handle(id_range, uploaded_files) for id_range in ranges))
+    await processor.finish(uploaded_files)
+
+    assert results == [True] * len(ranges)
+    assert len(uploaded_files) == len(ranges)
+    assert sorted(call.args[0] for call in saver.save_data.call_args_list) == [
+        f"row{lo}".encode() for lo in range(0, 50, 10)
+    ]
+    assert processor.tasks == []
+
+
+@pytest.mark.asyncio
+async def test_pipeline_slow_upload_applies_backpressure(mocker):
+    release = asyncio.Event()
+
+    async def save_data(data, file_name):
+        await release.wait()
+        return True
+
+    fetcher = AsyncMock()
+    fetcher.fetch_data.side_effect = lambda id_range, table: ["row"]
+    saver = AsyncMock()
+    saver.save_data.side_effect = save_data
+    processor = make_processor(mocker, fetcher, saver)
+
+    uploaded_files = []
+    tasks = [asyncio.create_task(processor.handle(IdRange(lo, lo + 1), uploaded_files)) for lo in range(20)]
+    await asyncio.sleep(0.05)
+
+    # One chunk per stage worker plus one per bounded queue, the rest waits in front of the fetch queue
+    assert fetcher.fetch_data.await_count < len(tasks)
+    assert all(depth <= 1 for depth in processor.queue_depths().values())
+
+    release.set()
+    assert await asyncio.gather(*tasks) == [True] * len(tasks)
+    await processor.finish(uploaded_files)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_reports_failed_and_empty_chunks(mocker):
+    fetcher = AsyncMock()
+    fetcher.fetch_data.side_effect = lambda id_range, table: [] if id_range.lo == 0 else ["row"]
+    saver = AsyncMock()
+    saver.save_data.return_value = False
+    processor = make_processor(mocker, fetcher, saver)
+
+    uploaded_files = []
+    empty = await processor.handle(IdRange(0, 10), uploaded_files)
+    failed = await processor.handle(IdRange(10, 20), uploaded_files)
+    await processor.finish(uploaded_files)
+
+    assert empty is True
+    assert failed is False
+    assert uploaded_files == []
@@ -0,0 +1,51 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.chunk.domain.facility.storage import IdRange
+from src.chunk.infra.storage import PostgresOperator
+
+
+def mock_pool(conn: AsyncMock) -> MagicMock:
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__.return_value = conn
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_fetch_data_projects_columns_without_copying_records():
+    records = [MagicMock(), MagicMock()]
+    conn = AsyncMock()
+    conn.fetch.return_value = records
+    operator = PostgresOperator(mock_pool(conn), columns=("id", "name"))
+
+    rows = await operator.fetch_data(IdRange(1, 11), "facility")
+
+    assert rows is records
+    query, lo, hi = conn.fetch.await_args.args
+    assert query.startswith("SELECT id, name FROM facility WHERE id >= $1 AND id < $2")
+    assert (lo, hi) == (1, 11)
+
+
+@pytest.mark.asyncio
+async def test_stream_data_yields_cursor_batches():
+    cursor = AsyncMock()
+    cursor.fetch.side_effect = [["r1", "r2"], ["r3"], []]
+    conn = MagicMock()
+    conn.cursor = AsyncMock(return_value=cursor)
+    operator = PostgresOperator(mock_pool(conn))
+
+    batches = [rows async for rows in operator.stream_data(IdRange(1, 4), "facility", batch_size=2)]
+
+    assert batches == [["r1", "r2"], ["r3"]]
+    assert conn.cursor.await_args.args[0].startswith("SELECT * FROM facility")
+    cursor.fetch.assert_awaited_with(2)
+    conn.transaction.assert_called_once_with(readonly=True)
+
+
+def test_column_map_renames_table_columns_to_payload_columns():
+    operator = PostgresOperator(MagicMock(), columns=("id", "name", "phone"), column_map={"phone": "phone_number"})
+
+    query, _ = operator.query("clinic", IdRange(1, 11))
+
+    assert query.startswith("SELECT id, name, phone_number AS phone FROM clinic WHERE")
@@ -2,6 +2,7 @@ from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
+from src.chunk.domain.facility.storage import IdRange
 from src.chunk.infra.processor import ChunkProcessor
 
 
@@ -26,16 +27,48 @@ async def test_handle_returns_true_when_data_fetched_and_saved(mocker):
     )
 
     uploaded_files = []
-    offset = 0
+    id_range = IdRange(1, 101)
     db_table_name = "facility"
 
-    result = await processor.handle(offset, uploaded_files)
+    result = await processor.handle(id_range, uploaded_files)
 
     assert result is True
-    mock_fetcher.fetch_data.assert_awaited_once_with(offset, 100, db_table_name)
+    mock_fetcher.fetch_data.assert_awaited_once_with(id_range, db_table_name)
     mock_payload.build_payload.assert_awaited_once_with(["row1", "row2"])
     mock_payload.compress.assert_awaited_once_with("json_data")
     mock_saver.save_data.assert_awaited()
 
     assert len(uploaded_files) == 1
     assert uploaded_files[0].startswith("facility_feed_") and uploaded_files[0].endswith(".json.gz")
+
+
+@pytest.mark.asyncio
+async def test_handle_streams_batches_into_writer(mocker):
+    async def stream_data(id_range, table, batch_size):
+        yield ["row1", "row2"]
+        yield ["row3"]
+
+    mock_fetcher = MagicMock()
+    mock_fetcher.stream_data = stream_data
+
+    mock_payload = MagicMock()
+    mock_payload.build_payload = AsyncMock(side_effect=lambda rows: ",".join(rows))
+    mock_payload.compress = AsyncMock(side_effect=lambda data: data.encode())
+
+    mock_writer = MagicMock()
+    mock_writer.write = AsyncMock(return_value=True)
+
+    processor = ChunkProcessor(
+        settings=mocker.MagicMock(chunk_size=100, fetch_batch_size=2, db_table_name="facility"),
+        pool=mocker.MagicMock(),
+        payload=mock_payload,
+        storage=mock_fetcher,
+        saver=MagicMock(),
+        writer=mock_writer,
+    )
+
+    uploaded_files = []
+    result = await processor.handle(IdRange(1, 4), uploaded_files)
+
+    assert result is True
+    assert [call.args[0] for call in mock_writer.write.await_args_list] == [b"row1,row2", b"row3"]
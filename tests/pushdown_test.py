@@ -0,0 +1,78 @@
+import gzip
+import json
+import os
+
+import asyncpg
+import pytest
+
+from benchmarks.data import FACILITY_TABLE
+from src.chunk.domain.facility.storage import IdRange
+from src.chunk.infra.payload import ChunkPayload, PushdownPayload
+from src.chunk.infra.storage import PostgresJsonOperator, PostgresOperator
+
+TEST_DSN = os.environ.get("TEST_DSN")
+
+
+@pytest.mark.asyncio
+async def test_pushdown_payload_joins_encoded_entities():
+    records = ['{"entity_id": 1}', '{"entity_id": 2}']
+
+    data_str = await PushdownPayload().build_payload(records)
+    fragment = await PushdownPayload(fragment=True).build_payload(records)
+    compressed_data = await PushdownPayload().compress(data_str)
+
+    assert json.loads(data_str) == {"data": [{"entity_id": 1}, {"entity_id": 2}]}
+    assert fragment == '{"entity_id": 1}, {"entity_id": 2}'
+    assert gzip.decompress(compressed_data).decode("utf-8") == data_str
+
+
+@pytest.mark.skipif(not TEST_DSN, reason="TEST_DSN is not set")
+@pytest.mark.asyncio
+async def test_pushdown_matches_python_builder():
+    """Test that entities built by Postgres are equal to the ones built by `ChunkPayload`."""
+    rows = [
+        (
+            1,
+            "Facility «A»",
+            "123456789",
+            "https://example.com",
+            40.712895,
+            -74.00607,
+            "USA",
+            "New York",
+            "NY",
+            "10001",
+            "1 Main St",
+        ),
+        (
+            2,
+            'Quote "B"',
+            None,
+            "https://example.org",
+            -33.8688197,
+            151.2092955,
+            "AU",
+            "Sydney",
+            "NSW",
+            "2000",
+            "2 George St",
+        ),
+        (5, "Facility C", "", "", 0.5, -0.0000004, "DE", "Berlin", "BE", "10115", "3 Unter den Linden"),
+    ]
+    pool = await asyncpg.create_pool(dsn=TEST_DSN, min_size=1, max_size=1)
+    try:
+        async with pool.acquire() as conn:
+            await conn.execute(FACILITY_TABLE)
+            await conn.executemany(
+                "INSERT INTO facility VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)",
+                rows,
+            )
+        python_rows = await PostgresOperator(pool, columns=ChunkPayload.columns).fetch_data(IdRange(1, 6), "facility")
+        pushdown_rows = await PostgresJsonOperator(pool).fetch_data(IdRange(1, 6), "facility")
+    finally:
+        await pool.close()
+
+    python_document = json.loads(await ChunkPayload().build_payload(python_rows))
+    pushdown_document = json.loads(await PushdownPayload().build_payload(pushdown_rows))
+
+    assert pushdown_document == python_document
@@ -0,0 +1,107 @@
+from contextlib import asynccontextmanager
+
+import pytest
+
+from src.chunk.infra.metrics import REPLICA_FALLBACKS
+from src.chunk.infra.replica import Replica, ReplicaPool
+
+
+class FakePool:
+    """A node reporting its WAL position and lag, its connections are the pool itself."""
+
+    def __init__(self, position: int, lag: float, reachable: bool = True):
+        self.position = position
+        self.lag = lag
+        self.reachable = reachable
+        self.acquired = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        if not self.reachable:
+            raise ConnectionRefusedError("connection refused")
+        self.acquired += 1
+        yield self
+
+    async def fetchrow(self, query: str) -> tuple[int, float]:
+        return self.position, self.lag
+
+    def get_max_size(self) -> int:
+        return 4
+
+
+def replica_pool(*nodes: FakePool, max_lag: float = 10.0) -> ReplicaPool:
+    replicas = [Replica(pool=node, name=f"replica{index}") for index, node in enumerate(nodes)]
+    return ReplicaPool(primary=FakePool(position=500, lag=0.0), replicas=replicas, max_lag=max_lag)
+
+
+@pytest.mark.asyncio
+async def test_planner_is_the_least_advanced_replica_within_the_lag_limit():
+    ahead, behind, lagging = FakePool(300, 0.0), FakePool(200, 2.0), FakePool(100, 60.0)
+    pool = replica_pool(ahead, behind, lagging)
+
+    assert await pool.pin() is behind
+    assert pool.floor == behind.position
+
+    # Caught up in time, but still behind the planned state
+    lagging.lag = 0.0
+    await pool.refresh()
+    assert [replica.pool for replica in pool.usable()] == [ahead, behind]
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_the_replica_with_fewest_outstanding_requests():
+    first, second = FakePool(100, 0.0), FakePool(100, 0.0)
+    pool = replica_pool(first, second)
+    await pool.pin()
+
+    async with pool.acquire() as held:
+        async with pool.acquire() as other:
+            assert {held, other} == {first, second}
+        async with pool.acquire() as again:
+            assert again is other
+    assert [replica.outstanding for replica in pool.replicas] == [0, 0]
+    assert pool.get_max_size() == first.get_max_size() * 3
+
+
+@pytest.mark.asyncio
+async def test_primary_serves_reads_when_no_replica_is_usable():
+    pool = replica_pool(FakePool(100, 60.0))
+    fallbacks = REPLICA_FALLBACKS.value()
+
+    assert await pool.pin() is pool.primary
+    async with pool.acquire() as conn:
+        assert conn is pool.primary
+    assert REPLICA_FALLBACKS.value() == fallbacks + 1
+
+
+@pytest.mark.asyncio
+async def test_unreachable_replica_is_skipped_until_it_answers():
+    down, up = FakePool(100, 0.0), FakePool(100, 0.0)
+    pool = replica_pool(down, up)
+    await pool.pin()
+    down.reachable = False
+
+    with pytest.raises(ConnectionRefusedError):
+        async with pool.acquire():
+            pass
+    async with pool.acquire() as conn:
+        assert conn is up
+
+    await pool.refresh()
+    assert [replica.pool for replica in pool.usable()] == [up]
+    down.reachable = True
+    await pool.refresh()
+    assert [replica.pool for replica in pool.usable()] == [down, up]
+
+
+@pytest.mark.asyncio
+async def test_lag_is_measured_against_the_position_of_the_primary():
+    # Replayed everything up to the primary position, the last transaction is an hour old
+    caught_up = FakePool(500, 3600.0)
+    # WAL receiver disconnected, stuck at an old position
+    stale = FakePool(100, 3600.0)
+    pool = replica_pool(caught_up, stale)
+
+    assert await pool.pin() is caught_up
+    assert [replica.pool for replica in pool.usable()] == [caught_up]
+    assert pool.replicas[0].lag == 0.0
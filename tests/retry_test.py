@@ -0,0 +1,67 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.chunk.domain.facility.storage import Saver, Uploader
+from src.chunk.infra.retry import RetryingFetcher, RetryingSaver, RetryingUploader, RetryPolicy
+from src.chunk.infra.storage import PostgresOperator
+from src.chunk.infra.writer import RollingFileWriter
+
+POLICY = RetryPolicy(attempts=3, base_delay=0.0)
+
+
+@pytest.mark.asyncio
+async def test_failed_uploads_are_retried():
+    saver = AsyncMock(spec=Saver)
+    saver.save_data.side_effect = [TimeoutError("read timeout"), False, True]
+
+    assert await RetryingSaver(saver, POLICY).save_data(b"data", "facility_feed_1_1.json.gz")
+    assert saver.save_data.await_count == POLICY.attempts
+
+
+@pytest.mark.asyncio
+async def test_rolled_files_survive_a_failed_part_upload():
+    uploader = AsyncMock(spec=Uploader)
+    uploader.create_upload.return_value = "upload-1"
+    uploader.upload_part.side_effect = [ConnectionResetError("reset by peer"), "etag-1", "etag-2"]
+    uploader.complete_upload.return_value = True
+    writer = RollingFileWriter(saver=RetryingUploader(uploader, POLICY), target_size=1, part_size=1)
+
+    uploaded_files = []
+    assert await writer.write(b"fragment", uploaded_files)
+
+    assert len(uploaded_files) == 1
+    uploader.abort_upload.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_retries_end_with_the_last_error():
+    fetcher = AsyncMock(spec=PostgresOperator)
+    fetcher.fetch_data.side_effect = ConnectionResetError("reset by peer")
+
+    with pytest.raises(ConnectionResetError):
+        await RetryingFetcher(fetcher, POLICY).fetch_data((1, 100), "facility")
+    assert fetcher.fetch_data.await_count == POLICY.attempts
+
+
+@pytest.mark.asyncio
+async def test_slow_upload_is_hedged():
+    started = []
+
+    class StuckFirstSaver:
+        async def save_data(self, data: bytes | str, file_name: str) -> bool:
+            started.append(file_name)
+            await asyncio.sleep(10 if len(started) == 1 else 0)
+            return True
+
+    saver = RetryingSaver(StuckFirstSaver(), POLICY, hedge_percentile=95)
+    for _ in range(saver.latencies.min_samples):
+        saver.latencies.add(0.01)
+
+    start = time.perf_counter()
+    assert await saver.save_data(b"data", "facility_feed_1_1.json.gz")
+
+    assert time.perf_counter() - start < 1
+    assert started == ["facility_feed_1_1.json.gz"] * 2
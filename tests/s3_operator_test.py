@@ -0,0 +1,47 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.chunk.infra.s3 import AWSOperator, MetadataOperator, S3Client
+
+
+def mock_session() -> tuple[MagicMock, AsyncMock]:
+    s3_client = AsyncMock()
+    s3_client.put_object.return_value = {"ResponseMetadata": {"HTTPStatusCode": 200}}
+    session = MagicMock()
+    session.client.return_value.__aenter__.return_value = s3_client
+    return session, s3_client
+
+
+@pytest.mark.asyncio
+async def test_operator_reuses_one_client():
+    session, s3_client = mock_session()
+    max_pool_connections = 4
+    uploads = 10
+    operator = AWSOperator(session=session, bucket="bucket", max_pool_connections=max_pool_connections)
+
+    results = await asyncio.gather(*(operator.save_data(b"data", f"file_{index}.json.gz") for index in range(uploads)))
+    await operator.close()
+
+    assert all(results)
+    session.client.assert_called_once()
+    assert session.client.call_args.kwargs["config"].max_pool_connections == max_pool_connections
+    assert s3_client.put_object.await_count == uploads
+    session.client.return_value.__aexit__.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_operators_share_one_client_and_prefix_keys():
+    session, s3_client = mock_session()
+    s3 = S3Client(session, max_pool_connections=4)
+    facility = AWSOperator(bucket="feeds", prefix="facility/", s3=s3)
+    clinic = MetadataOperator(bucket="feeds", prefix="clinic/", s3=s3)
+
+    await facility.save_data(b"data", "facility_feed_1_1.json.gz")
+    await clinic.save_data("{}", "metadata_1.json")
+    await s3.close()
+
+    session.client.assert_called_once()
+    keys = [call.kwargs["Key"] for call in s3_client.put_object.await_args_list]
+    assert keys == ["facility/facility_feed_1_1.json.gz", "clinic/metadata_1.json"]
@@ -0,0 +1,59 @@
+import pytest
+from pydantic import ValidationError
+
+from src.chunk.main.settings import Settings
+from src.chunk.presentation.service import validated_feeds
+
+CREDENTIALS = {"_env_file": None, "db_user": "user", "db_password": "password", "db_name": "feeds"}
+
+
+def test_feeds_inherit_unset_fields():
+    settings = Settings(
+        **CREDENTIALS,
+        aws_bucket="feeds",
+        feeds=[
+            {"table": "facility", "prefix": "facility/"},
+            {"table": "clinic", "prefix": "clinic/", "columns": {"phone": "phone_number"}, "name": "clinic.entity"},
+        ],
+    )
+
+    facility, clinic = settings.feed_settings()
+
+    assert (facility.db_table_name, facility.aws_bucket, facility.s3_prefix) == ("facility", "feeds", "facility/")
+    assert facility.feed_name == "reservewithgoogle.entity"
+    assert (clinic.db_table_name, clinic.column_map, clinic.feed_name) == (
+        "clinic",
+        {"phone": "phone_number"},
+        "clinic.entity",
+    )
+
+
+def test_feeds_must_not_overwrite_each_other():
+    with pytest.raises(ValidationError, match="distinct locations"):
+        Settings(**CREDENTIALS, feeds=[{"table": "facility"}, {"table": "clinic"}])
+
+
+def test_a_table_is_required():
+    with pytest.raises(ValidationError, match="db_table_name or feeds"):
+        Settings(**CREDENTIALS)
+
+
+def test_a_split_export_is_labeled():
+    with pytest.raises(ValidationError, match="shard_run"):
+        Settings(**CREDENTIALS, db_table_name="facility", shard_index=1, shard_count=4)
+
+
+def test_snapshot_reads_stay_on_one_node():
+    with pytest.raises(ValidationError, match="snapshot_reads cannot be combined"):
+        Settings(**CREDENTIALS, db_table_name="facility", snapshot_reads=True, replica_dsns=["postgresql://replica"])
+
+
+def test_feeds_export_the_allowed_tables():
+    feeds = [{"table": "facility", "prefix": "facility/"}, {"table": "clinic", "prefix": "clinic/"}]
+
+    with pytest.raises(ValueError, match="Invalid table name: clinic"):
+        validated_feeds(Settings(**CREDENTIALS, feeds=feeds), finalize=False)
+    allowed = Settings(**CREDENTIALS, feeds=feeds, valid_tables=["facility", "clinic"])
+    assert [feed.db_table_name for feed in validated_feeds(allowed, finalize=False)] == ["facility", "clinic"]
+    with pytest.raises(ValidationError):
+        Settings(**CREDENTIALS, db_table_name="facility", valid_tables=["facility; DROP TABLE facility"])
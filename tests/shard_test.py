@@ -0,0 +1,46 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from benchmarks.data import synthetic_records
+from benchmarks.exports import exported_ids, finalize, run_shard
+from src.chunk.domain.facility.storage import IdRange, Shard
+from src.chunk.infra.storage import OffsetManager, PostgresOperator
+
+OVERRIDES = {"chunk_size": "40", "concurrency_limit": "2"}
+
+
+@pytest.mark.asyncio
+async def test_shards_export_every_row_exactly_once(tmp_path):
+    rows, shards = 200, 3
+    for shard in range(shards):
+        await run_shard(synthetic_records(rows), tmp_path, shard, shards, "test", overrides=OVERRIDES)
+
+    assert await finalize(tmp_path, shards, "test")
+    assert sorted(exported_ids(tmp_path)) == list(range(1, rows + 1))
+
+
+@pytest.mark.asyncio
+async def test_finalize_publishes_nothing_while_a_shard_is_missing(tmp_path):
+    shards = 3
+    for shard in range(shards - 1):
+        await run_shard(synthetic_records(100), tmp_path, shard, shards, "test", overrides=OVERRIDES)
+
+    assert not await finalize(tmp_path, shards, "test")
+    assert not list(tmp_path.glob("metadata_*.json"))
+
+
+@pytest.mark.asyncio
+async def test_shard_filter_restricts_fetched_and_planned_rows():
+    conn = AsyncMock()
+    conn.fetch.return_value = []
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__.return_value = conn
+    shard = Shard(index=1, count=4)
+
+    query, _ = PostgresOperator(pool, shard=shard).query("facility", IdRange(1, 100))
+    await OffsetManager(pool, shard=shard).plan_ranges("facility", 0, 100)
+
+    assert "id % 4 = 1" in query
+    assert "id % 4 = 1" in conn.fetch.await_args.args[0]
+    assert "%" not in PostgresOperator(pool).query("facility", IdRange(1, 100))[0]
@@ -0,0 +1,50 @@
+from unittest.mock import AsyncMock, MagicMock, call
+
+import pytest
+
+from src.chunk.domain.facility.storage import IdRange
+from src.chunk.infra.snapshot import SnapshotPool
+from src.chunk.infra.storage import PostgresOperator
+
+
+def mock_connection() -> AsyncMock:
+    conn = AsyncMock()
+    conn.transaction = MagicMock()
+    conn.fetchval.return_value = "00000003-0000001B-1"
+    return conn
+
+
+def mock_pool(*connections: AsyncMock) -> AsyncMock:
+    pool = AsyncMock()
+    pool.acquire = MagicMock()
+    pool.acquire.return_value.__aenter__.side_effect = connections
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_every_connection_reads_the_exported_snapshot():
+    holder, reader = mock_connection(), mock_connection()
+    pool = SnapshotPool(mock_pool(holder, reader))
+
+    snapshot = await pool.export()
+    await PostgresOperator(pool).fetch_data(IdRange(1, 100), "facility")
+    await pool.close()
+
+    holder.fetchval.assert_awaited_once_with("SELECT pg_export_snapshot()")
+    for conn in (holder, reader):
+        assert conn.transaction.call_args == call(isolation="repeatable_read", readonly=True)
+    reader.execute.assert_awaited_once_with(f"SET TRANSACTION SNAPSHOT '{snapshot}'")
+    reader.fetch.assert_awaited_once()
+    holder.transaction.return_value.__aexit__.assert_awaited_once()
+    pool.pool.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_connections_are_plain_before_export():
+    conn = mock_connection()
+    pool = SnapshotPool(mock_pool(conn))
+
+    async with pool.acquire() as acquired:
+        assert acquired is conn
+
+    conn.transaction.assert_not_called()
@@ -0,0 +1,115 @@
+import gzip
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from benchmarks.standins import MemorySaver, StageClock
+from src.chunk.application.services.feed import FeedService
+from src.chunk.domain.facility.processor import Processor
+from src.chunk.domain.facility.storage import IdRange, Saver
+from src.chunk.infra.retry import RetryPolicy
+from src.chunk.infra.spool import SPOOLING_SUFFIX, SpoolSaver, SpoolSync
+from src.chunk.infra.storage import OffsetManager
+from src.chunk.infra.writer import RollingFileWriter
+
+POLICY = RetryPolicy(attempts=2, base_delay=0.0)
+
+
+class CountingSaver(MemorySaver):
+    def __init__(self):
+        super().__init__(StageClock())
+        self.requests = 0
+
+    async def request(self, size: int = 0) -> None:
+        self.requests += 1
+        await super().request(size)
+
+
+@pytest.mark.asyncio
+async def test_spool_only_holds_complete_files(tmp_path):
+    spool = SpoolSaver(tmp_path)
+    writer = RollingFileWriter(saver=spool, target_size=10**6, part_size=16)
+
+    assert await spool.save_data(b"chunk", "facility_feed_1_1.json.gz")
+    assert await writer.write(gzip.compress(b'{"entity_id": 1}'), [])
+    # The open file and every part written so far
+    assert len([path for path in tmp_path.iterdir() if path.suffix == SPOOLING_SUFFIX]) == len(writer.file.parts) + 1
+    assert [spool.key(path) for path in spool.files()] == ["facility_feed_1_1.json.gz"]
+
+    uploaded_files = []
+    assert await writer.close(uploaded_files)
+    assert sorted(spool.key(path) for path in spool.files()) == sorted(["facility_feed_1_1.json.gz", *uploaded_files])
+    assert json.loads(gzip.decompress(spool.path(uploaded_files[0]).read_bytes())) == {"data": [{"entity_id": 1}]}
+    assert not [path for path in tmp_path.iterdir() if path.suffix == SPOOLING_SUFFIX]
+
+
+@pytest.mark.asyncio
+async def test_interrupted_files_are_discarded(tmp_path):
+    (tmp_path / f"facility_feed_1_1.json.gz.0f{SPOOLING_SUFFIX}").write_bytes(b"half")
+    (tmp_path / "facility_feed_1_2.json.gz").write_bytes(b"whole")
+
+    spool = SpoolSaver(tmp_path)
+
+    assert [spool.key(path) for path in spool.files()] == ["facility_feed_1_2.json.gz"]
+
+
+@pytest.mark.asyncio
+async def test_sync_uploads_and_removes_the_spool(tmp_path):
+    target = CountingSaver()
+    # Uploaded by an earlier sync that stopped before removing it
+    (tmp_path / "facility_feed_1_0.json.gz").write_bytes(b"left over")
+    target.objects["facility_feed_1_0.json.gz"] = len(b"left over")
+    spool = SpoolSaver(tmp_path)
+    await spool.save_data(b"small", "facility_feed_1_1.json.gz")
+    await spool.save_data(b"x" * 40, "facility_feed_1_2.json.gz")
+
+    assert await SpoolSync(spool, target, concurrency=4, part_size=16, policy=POLICY).sync()
+
+    assert target.objects == {
+        "facility_feed_1_0.json.gz": len(b"left over"),
+        "facility_feed_1_1.json.gz": len(b"small"),
+        "facility_feed_1_2.json.gz": 40,
+    }
+    # One existence check of the left over file, a PUT, and a multipart upload of three parts
+    assert target.requests == 1 + 1 + 5
+    assert spool.files() == []
+
+
+@pytest.mark.asyncio
+async def test_failed_uploads_stay_spooled(tmp_path):
+    class FailingSaver(CountingSaver):
+        async def save_data(self, data: bytes | str, file_name: str) -> bool:
+            return False
+
+    target = FailingSaver()
+    spool = SpoolSaver(tmp_path)
+    await spool.save_data(b"chunk", "facility_feed_1_1.json.gz")
+
+    assert not await SpoolSync(spool, target, concurrency=4, part_size=16, policy=POLICY).sync()
+    assert [spool.key(path) for path in spool.files()] == ["facility_feed_1_1.json.gz"]
+
+
+@pytest.mark.asyncio
+async def test_failed_sync_publishes_nothing(tmp_path):
+    class FailingSaver(CountingSaver):
+        async def save_data(self, data: bytes | str, file_name: str) -> bool:
+            return False
+
+    spool = SpoolSaver(tmp_path)
+    await spool.save_data(b"chunk", "facility_feed_1_1.json.gz")
+    metadata = AsyncMock(spec=Saver)
+    service = FeedService(
+        settings=MagicMock(concurrency_limit=2),
+        pool=MagicMock(),
+        processor=AsyncMock(spec=Processor),
+        metadata=metadata,
+        offset_manager=AsyncMock(spec=OffsetManager, fetch_offset=AsyncMock(return_value=0)),
+        spool=SpoolSync(spool, FailingSaver(), concurrency=4, part_size=16, policy=POLICY),
+    )
+    service.offset_manager.plan_ranges.return_value = [IdRange(1, 11)]
+
+    assert not await service.feed()
+
+    metadata.save_data.assert_not_awaited()
+    assert [spool.key(path) for path in spool.files()] == ["facility_feed_1_1.json.gz"]
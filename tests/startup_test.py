@@ -0,0 +1,62 @@
+import importlib
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.chunk.infra import startup
+from src.chunk.infra.backends import backend
+from src.chunk.infra.s3 import S3Client
+
+ROOT = Path(__file__).parent.parent
+
+# Seconds a cold interpreter may take to import the CLI, the service and the local backends.
+# They take about 0.4s, importing the S3 stack eagerly doubles that.
+STARTUP_BUDGET = 1.5
+
+COLD_START = """
+import json, sys, time
+start = time.perf_counter()
+import src.chunk.main.main, src.chunk.presentation.service, src.chunk.infra.spool, benchmarks.standins
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "modules": sorted(sys.modules)}))
+"""
+
+
+def test_cold_start_stays_within_budget_without_the_s3_stack():
+    command = [sys.executable, "-c", COLD_START]
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True, timeout=60)  # noqa: S603
+    report = json.loads(result.stdout)
+
+    assert not {"aioboto3", "aiobotocore", "botocore", "boto3"} & set(report["modules"])
+    assert report["seconds"] < STARTUP_BUDGET
+
+
+def test_backends_resolve_on_first_use():
+    assert backend("s3_client") is S3Client
+    with pytest.raises(ValueError, match="Unknown backend"):
+        backend("ftp")
+
+
+def test_profile_times_imports_and_first_events(tmp_path, monkeypatch):
+    (tmp_path / "startup_probe.py").write_text("import startup_probe_child\n")
+    (tmp_path / "startup_probe_child.py").write_text("VALUE = 1\n")
+    monkeypatch.syspath_prepend(tmp_path)
+    profile = startup.install()
+    try:
+        probe = importlib.import_module("startup_probe")
+        startup.mark("first fetch")
+        first = profile.events["first fetch"]
+        startup.mark("first fetch")
+    finally:
+        startup.uninstall()
+        sys.modules.pop("startup_probe", None)
+        sys.modules.pop("startup_probe_child", None)
+
+    assert {"startup_probe", "startup_probe_child"} <= set(profile.imports)
+    assert profile.events == {"first fetch": first}
+    assert "startup_probe" in profile.report()
+    # Loaded modules keep their own loader
+    assert not isinstance(probe.__loader__, startup.TimedLoader)
@@ -0,0 +1,133 @@
+import gzip
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from src.chunk.infra import payload
+from src.chunk.infra.payload import ChunkPayload, ProcessChunkPayload, UnknownSpecError
+from src.chunk.infra.storage import PostgresJsonOperator
+from src.chunk.infra.transform import FACILITY_SPEC, EntitySpec
+from src.chunk.main.settings import Settings
+from tests.chunk_payload_test import facility_records
+from tests.settings_test import CREDENTIALS
+
+CLINIC_SPEC = EntitySpec(
+    [
+        {"column": "id", "path": "id"},
+        {"column": "title", "path": "name"},
+        {"column": "beds", "path": "capacity.beds"},
+        {"column": "rating", "path": "capacity.rating", "format": ".1f"},
+    ]
+)
+CLINIC_RECORDS = [
+    {"id": 1, "title": "Clinic A", "beds": 12, "rating": 4.25, "notes": "not exported"},
+    {"id": 2, "title": "Clinic B", "beds": None, "rating": None, "notes": ""},
+]
+CLINIC_DOCUMENT = {
+    "data": [
+        {"id": 1, "name": "Clinic A", "capacity": {"beds": 12, "rating": "4.2"}},
+        {"id": 2, "name": "Clinic B", "capacity": {"beds": None, "rating": None}},
+    ]
+}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("streaming", [False, True])
+async def test_custom_spec_encodes_records_by_name_and_position(streaming):
+    payload = ChunkPayload(streaming=streaming, spec=CLINIC_SPEC)
+    rows = [tuple(rec[column] for column in payload.columns) for rec in CLINIC_RECORDS]
+
+    documents = []
+    for records in (CLINIC_RECORDS, rows):
+        data = await payload.build_payload(records)
+        documents.append(json.loads(b"".join(data) if streaming else data))
+
+    assert payload.columns == ("id", "title", "beds", "rating")
+    assert documents == [CLINIC_DOCUMENT, CLINIC_DOCUMENT]
+
+
+@pytest.mark.asyncio
+async def test_payload_for_another_spec_shares_the_workers():
+    process_payload = ProcessChunkPayload(workers=1)
+    try:
+        clinic_payload = process_payload.for_spec(CLINIC_SPEC)
+        compressed_data = await clinic_payload.compress(await clinic_payload.build_payload(CLINIC_RECORDS))
+        facility_document = await process_payload.build_payload(facility_records(2))
+    finally:
+        process_payload.close()
+
+    assert process_payload.for_spec(FACILITY_SPEC) is process_payload
+    assert clinic_payload.executor is process_payload.executor
+    assert json.loads(gzip.decompress(compressed_data)) == CLINIC_DOCUMENT
+    assert facility_document.spec == FACILITY_SPEC
+
+
+def test_workers_encode_batches_of_registered_specs_by_digest():
+    rows = [tuple(record.values()) for record in CLINIC_RECORDS]
+
+    with pytest.raises(UnknownSpecError):
+        payload._encode_rows(rows, False, 6, "unregistered")
+    compressed_data, _ = payload._register_and_encode(rows, False, 6, CLINIC_SPEC)
+    again, _ = payload._encode_rows(rows, False, 6, CLINIC_SPEC.digest)
+
+    assert json.loads(gzip.decompress(compressed_data)) == json.loads(gzip.decompress(again)) == CLINIC_DOCUMENT
+
+
+def test_spec_is_compiled_once():
+    spec = EntitySpec(FACILITY_SPEC.fields)
+
+    assert spec == FACILITY_SPEC
+    assert spec.digest == FACILITY_SPEC.digest != CLINIC_SPEC.digest
+    assert spec.compile() is FACILITY_SPEC.compile()
+    assert "r[4]" in FACILITY_SPEC.compile().source
+
+
+def test_spec_compiles_to_sql():
+    fetcher = PostgresJsonOperator(pool=None, column_map={"title": "clinic_name"}, spec=CLINIC_SPEC)
+
+    assert fetcher.select_list() == (
+        "json_build_object('id', id, 'name', clinic_name, 'capacity', json_build_object("
+        "'beds', beds, 'rating', to_char(rating, 'FM999999999999990.0')))::text"
+    )
+    with pytest.raises(ValueError, match="cannot be pushed down"):
+        EntitySpec([{"column": "rating", "path": "rating", "format": ">8"}]).sql(str)
+
+
+@pytest.mark.parametrize(
+    "fields, message",
+    [
+        ([{"column": "id", "path": "id"}, {"column": "name", "path": "id"}], "distinct paths"),
+        ([{"column": "id", "path": "id"}, {"column": "name", "path": "id.name"}], "runs through a value"),
+        ([{"column": "name", "path": "a.b"}, {"column": "id", "path": "a"}], "is also an object"),
+    ],
+)
+def test_conflicting_paths_are_rejected(fields, message):
+    with pytest.raises(ValueError, match=message):
+        EntitySpec(fields)
+
+
+@pytest.mark.parametrize(
+    "field",
+    [
+        {"column": "name; DROP TABLE facility", "path": "name"},
+        {"column": "name", "path": "name'"},
+        {"column": "latitude", "path": "latitude", "format": '}"'},
+    ],
+)
+def test_fields_only_hold_names_and_format_specs(field):
+    with pytest.raises(ValidationError, match="Invalid"):
+        Settings(**CREDENTIALS, db_table_name="facility", fields=[field])
+
+
+def test_feeds_inherit_the_entity_spec():
+    clinic_fields = [field.model_dump() for field in CLINIC_SPEC.fields]
+    settings = Settings(
+        **CREDENTIALS,
+        feeds=[{"table": "facility", "prefix": "facility/"}, {"table": "clinic", "fields": clinic_fields}],
+    )
+
+    facility, clinic = settings.feed_settings()
+
+    assert EntitySpec(facility.fields) == FACILITY_SPEC
+    assert EntitySpec(clinic.fields) == CLINIC_SPEC
@@ -0,0 +1,136 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from src.chunk.domain.facility.storage import IdRange
+from src.chunk.infra.payload import ChunkPayload
+from src.chunk.infra.writer import RollingFileWriter
+
+
+class MemoryMultipartSaver:
+    def __init__(self, fail_part: int | None = None):
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.objects: dict[str, bytes] = {}
+        self.aborted: list[str] = []
+        self.fail_part = fail_part
+
+    async def create_upload(self, file_name: str) -> str:
+        self.uploads[file_name] = {}
+        return f"upload-{file_name}"
+
+    async def upload_part(self, file_name: str, upload_id: str, part_number: int, data: bytes) -> str:
+        if part_number == self.fail_part:
+            raise ConnectionError("part upload failed")
+        self.uploads[file_name][part_number] = data
+        return f"etag-{part_number}"
+
+    async def complete_upload(self, file_name: str, upload_id: str, etags: list[str]) -> bool:
+        parts = self.uploads.pop(file_name)
+        self.objects[file_name] = b"".join(parts[int(etag.removeprefix("etag-"))] for etag in etags)
+        return True
+
+    async def abort_upload(self, file_name: str, upload_id: str) -> None:
+        self.uploads.pop(file_name)
+        self.aborted.append(file_name)
+
+
+def facility_record(index: int) -> dict:
+    return {
+        "id": index,
+        "name": f"Facility {index}",
+        "phone": "123456789",
+        "url": "https://example.com",
+        "latitude": 40.712895,
+        "longitude": -74.006070,
+        "country": "USA",
+        "locality": "New York",
+        "region": "NY",
+        "postal_code": "10001",
+        "street_address": "123 Main Street",
+    }
+
+
+@pytest.mark.asyncio
+async def test_rolling_writer_joins_fragments_into_sized_files():
+    saver = MemoryMultipartSaver()
+    writer = RollingFileWriter(saver=saver, target_size=1024, part_size=512)
+    payload = ChunkPayload(streaming=True, fragment=True)
+
+    uploaded_files = []
+    for lo in range(0, 100, 5):
+        records = [facility_record(index) for index in range(lo, lo + 5)]
+        fragment = await payload.compress(await payload.build_payload(records))
+        assert await writer.write(fragment, uploaded_files)
+    assert await writer.close(uploaded_files)
+
+    assert len(uploaded_files) > 1
+    assert sorted(saver.objects) == sorted(uploaded_files)
+    ids = []
+    for file_name in uploaded_files:
+        document = json.loads(gzip.decompress(saver.objects[file_name]))
+        ids.extend(entity["entity_id"] for entity in document["data"])
+    assert ids == list(range(100))
+
+
+@pytest.mark.asyncio
+async def test_rolling_writer_aborts_failed_upload():
+    saver = MemoryMultipartSaver(fail_part=1)
+    writer = RollingFileWriter(saver=saver, target_size=1024, part_size=1)
+    payload = ChunkPayload(fragment=True)
+
+    uploaded_files = []
+    fragment = await payload.compress(await payload.build_payload([facility_record(1)]))
+
+    assert not await writer.write(fragment, uploaded_files)
+    assert await writer.close(uploaded_files)
+    assert uploaded_files == []
+    assert len(saver.aborted) == 1
+
+
+@pytest.mark.asyncio
+async def test_rolling_writer_reports_ranges_discarded_with_a_failed_file():
+    saver = MemoryMultipartSaver(fail_part=1)
+    writer = RollingFileWriter(saver=saver, target_size=10**6, part_size=10**6)
+    payload = ChunkPayload(fragment=True)
+    fragment = await payload.compress(await payload.build_payload([facility_record(1)]))
+
+    assert await writer.write(fragment, [], IdRange(1, 11))
+    assert await writer.write(fragment, [], IdRange(11, 21))
+    uploaded_files = []
+    assert not await writer.close(uploaded_files)
+
+    assert uploaded_files == []
+    assert writer.discarded == {IdRange(1, 11), IdRange(11, 21)}
+
+
+class SlowMultipartSaver(MemoryMultipartSaver):
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.peak = 0
+
+    async def upload_part(self, file_name: str, upload_id: str, part_number: int, data: bytes) -> str:
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        # Later parts finish first
+        await asyncio.sleep(0.01 / part_number)
+        self.in_flight -= 1
+        return await super().upload_part(file_name, upload_id, part_number, data)
+
+
+@pytest.mark.asyncio
+async def test_rolling_writer_uploads_parts_of_concurrent_writes_concurrently():
+    saver = SlowMultipartSaver()
+    writer = RollingFileWriter(saver=saver, target_size=10**6, part_size=1)
+    payload = ChunkPayload(fragment=True)
+    fragments = [await payload.compress(await payload.build_payload([facility_record(index)])) for index in range(8)]
+
+    uploaded_files = []
+    assert all(await asyncio.gather(*(writer.write(fragment, uploaded_files) for fragment in fragments)))
+    assert await writer.close(uploaded_files)
+
+    assert saver.peak == len(fragments)
+    document = json.loads(gzip.decompress(saver.objects[uploaded_files[0]]))
+    assert [entity["entity_id"] for entity in document["data"]] == list(range(8))